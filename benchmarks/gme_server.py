@@ -0,0 +1,133 @@
+"""Server locale che simula l'endpoint di download dei prezzi MGP del GME.
+
+Restituisce archivi ZIP sintetici (vedi synthetic.py) per l'intervallo
+DataInizio..DataFine richiesto e può simulare i malfunzionamenti del sito.
+Per usarlo con l'integrazione, impostare nelle opzioni avanzate l'indirizzo
+di download http://<host>:<porta>/downloadzipfile
+
+Uso:
+    python benchmarks/gme_server.py --port 8099 --latency 0.5 --error-rate 0.2 --status 503
+"""
+
+import argparse
+import asyncio
+from datetime import date, datetime
+import logging
+import random
+
+from aiohttp import web
+from synthetic import build_archive
+
+_LOGGER = logging.getLogger("gme_server")
+
+
+def _parse_data(valore: str | None) -> date:
+    """Restituisce la data indicata da un parametro YYYYMMDD."""
+    if not valore:
+        raise web.HTTPBadRequest(text="Parametri DataInizio/DataFine mancanti")
+    try:
+        return datetime.strptime(valore, "%Y%m%d").date()
+    except ValueError as e:
+        raise web.HTTPBadRequest(text=f"Data non valida: {valore}") from e
+
+
+def create_app(args: argparse.Namespace) -> web.Application:
+    """Crea l'applicazione aiohttp con il comportamento richiesto."""
+    rng = random.Random(args.seed)
+    contatori = {"richieste": 0, "errori": 0, "non_modificati": 0}
+
+    async def download(request: web.Request) -> web.StreamResponse:
+        contatori["richieste"] += 1
+        inizio = _parse_data(request.query.get("DataInizio"))
+        fine = _parse_data(request.query.get("DataFine"))
+
+        # Latenza iniziale (con eventuale variabilità)
+        if args.latency > 0:
+            await asyncio.sleep(args.latency * rng.uniform(1 - args.jitter, 1 + args.jitter))
+
+        # Errore HTTP simulato
+        if args.error_rate > 0 and rng.random() < args.error_rate:
+            contatori["errori"] += 1
+            _LOGGER.info("Richiesta %s: errore %s simulato", contatori["richieste"], args.status)
+            return web.Response(status=args.status, text="Errore simulato")
+
+        # Richiesta condizionale: l'ETag dipende solo dai parametri
+        intestazioni = {}
+        if args.etag:
+            etag = f'"{inizio:%Y%m%d}-{fine:%Y%m%d}-{int(args.quarter)}-{args.seed}"'
+            intestazioni["ETag"] = etag
+            if request.headers.get("If-None-Match") == etag:
+                contatori["non_modificati"] += 1
+                return web.Response(status=304, headers=intestazioni)
+
+        # Contenuto: ZIP valido, troncato oppure non ZIP
+        if args.not_zip:
+            corpo = b"<html><body>Servizio non disponibile</body></html>"
+        else:
+            giorni = (fine - inizio).days + 1
+            corpo = build_archive(inizio, max(giorni, 0), args.quarter, args.seed)
+            if args.truncate > 0:
+                corpo = corpo[: max(len(corpo) - args.truncate, 0)]
+
+        _LOGGER.info(
+            "Richiesta %s: %s..%s, %s byte", contatori["richieste"], inizio, fine, len(corpo)
+        )
+
+        # Invio lento a blocchi, se richiesto
+        if args.slow > 0:
+            risposta = web.StreamResponse(
+                headers={
+                    "Content-Type": "application/zip",
+                    "Content-Length": str(len(corpo)),
+                    **intestazioni,
+                }
+            )
+            await risposta.prepare(request)
+            blocco = max(args.slow // 10, 1)
+            for i in range(0, len(corpo), blocco):
+                await risposta.write(corpo[i : i + blocco])
+                await asyncio.sleep(blocco / args.slow)
+            await risposta.write_eof()
+            return risposta
+
+        return web.Response(body=corpo, content_type="application/zip", headers=intestazioni)
+
+    async def stats(request: web.Request) -> web.Response:
+        return web.json_response(contatori)
+
+    app = web.Application()
+    app.router.add_get("/downloadzipfile", download)
+    app.router.add_get(
+        "/DesktopModules/GmeDownload/API/ExcelDownload/downloadzipfile", download
+    )
+    app.router.add_get("/stats", stats)
+    return app
+
+
+def parse_args(argv: list[str] | None = None) -> argparse.Namespace:
+    """Legge i parametri da riga di comando."""
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8099)
+    parser.add_argument("--latency", type=float, default=0, help="latenza prima della risposta (s)")
+    parser.add_argument("--jitter", type=float, default=0, help="variabilità della latenza (0.2 = ±20%%)")
+    parser.add_argument("--status", type=int, default=503, help="stato HTTP degli errori simulati")
+    parser.add_argument("--error-rate", type=float, default=0, help="frazione di richieste in errore (0-1)")
+    parser.add_argument("--truncate", type=int, default=0, help="byte rimossi dalla fine dello ZIP")
+    parser.add_argument("--not-zip", action="store_true", help="risponde con un contenuto non ZIP")
+    parser.add_argument("--slow", type=int, default=0, help="velocità di invio (byte/s, 0 = immediato)")
+    parser.add_argument("--quarter", action="store_true", help="prezzi al quarto d'ora")
+    parser.add_argument("--etag", action="store_true", help="invia l'ETag e risponde 304 alle richieste condizionali")
+    parser.add_argument("--seed", type=int, default=0)
+    return parser.parse_args(argv)
+
+
+def main() -> None:
+    """Avvia il server."""
+    args = parse_args()
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(message)s")
+    web.run_app(create_app(args), host=args.host, port=args.port)
+
+
+if __name__ == "__main__":
+    main()
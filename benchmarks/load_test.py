@@ -0,0 +1,153 @@
+"""Test di carico e latenza end-to-end verso l'endpoint GME (o il server locale).
+
+Per ogni aggiornamento riproduce il percorso di download del coordinator, senza
+Home Assistant: lettura a blocchi in un file temporaneo con le stesse soglie
+(DOWNLOAD_CHUNK_BYTES, DOWNLOAD_SPOOL_BYTES, DEFAULT_MAX_DOWNLOAD_MB) ed
+elaborazione con process_prices. Le richieste fallite vengono ripetute con le
+attese di get_backoff_delay, ridotte di --time-scale (le attese reali sono di
+minuti).
+
+Ogni aggiornamento simula il primo download dopo l'avvio: le richieste
+condizionali (ETag/Last-Modified) e la cache delle risposte del coordinator
+non vengono usate, quindi i risultati misurano il caso peggiore.
+
+Uso:
+    python benchmarks/gme_server.py --error-rate 0.3 &
+    python benchmarks/load_test.py --url http://127.0.0.1:8099/downloadzipfile --clients 20 --requests 200
+"""
+
+import argparse
+import asyncio
+from datetime import date, timedelta
+import importlib
+import logging
+import statistics
+import sys
+import tempfile
+import time
+from typing import IO
+
+from aiohttp import ClientSession, ClientTimeout
+from run import load_pzo_sensor
+
+
+async def download(session: ClientSession, url: str, const) -> IO[bytes]:
+    """Scarica l'archivio a blocchi in un file temporaneo, come il coordinator."""
+    massimo = const.DEFAULT_MAX_DOWNLOAD_MB * 1024 * 1024
+    async with session.get(url) as response:
+        if response.status != 200:
+            raise ValueError(f"stato {response.status}")
+        if (response.content_length or 0) > massimo:
+            raise ValueError(f"archivio troppo grande ({response.content_length} byte)")
+
+        archivio = tempfile.SpooledTemporaryFile(max_size=const.DOWNLOAD_SPOOL_BYTES)
+        dimensione = 0
+        in_sospeso: list[bytes] = []
+        byte_in_sospeso = 0
+        loop = asyncio.get_running_loop()
+        try:
+            async for blocco in response.content.iter_chunked(const.DOWNLOAD_CHUNK_BYTES):
+                dimensione += len(blocco)
+                if dimensione > massimo:
+                    raise ValueError(f"archivio oltre la dimensione massima ({massimo} byte)")
+                if dimensione <= const.DOWNLOAD_SPOOL_BYTES:
+                    archivio.write(blocco)
+                    continue
+                in_sospeso.append(blocco)
+                byte_in_sospeso += len(blocco)
+                if byte_in_sospeso >= const.DOWNLOAD_SPOOL_BYTES:
+                    await loop.run_in_executor(None, archivio.writelines, in_sospeso)
+                    in_sospeso = []
+                    byte_in_sospeso = 0
+            if in_sospeso:
+                await loop.run_in_executor(None, archivio.writelines, in_sospeso)
+        except BaseException:
+            archivio.close()
+            raise
+    return archivio
+
+
+async def refresh(session: ClientSession, utils, const, args: argparse.Namespace, esiti: dict) -> None:
+    """Esegue un aggiornamento completo (download + elaborazione) con i tentativi previsti."""
+    oggi = date.today()
+    inizio = oggi.replace(day=1)
+    fine = oggi + timedelta(days=1)
+    fine_media = utils.get_window(utils.WINDOW_MONTH, oggi)[1]
+    url = (
+        f"{args.url}?DataInizio={inizio:%Y%m%d}&DataFine={fine:%Y%m%d}&Date={fine:%Y%m%d}"
+        "&Mercato=MGP&Settore=Prezzi&FiltroDate=InizioFine"
+    )
+
+    partenza = time.perf_counter()
+    for tentativo in range(args.attempts):
+        if tentativo:
+            # Attesa esponenziale con jitter dell'integrazione, in scala
+            attesa = utils.get_backoff_delay(tentativo - 1).total_seconds() * args.time_scale
+            await asyncio.sleep(attesa)
+        try:
+            archivio = await download(session, url, const)
+            try:
+                await asyncio.get_running_loop().run_in_executor(
+                    None, utils.process_prices, archivio, {}, ["NORD"], inizio, fine, oggi, fine_media
+                )
+            finally:
+                archivio.close()
+        except Exception as e:  # noqa: BLE001
+            esiti["errori"][type(e).__name__] = esiti["errori"].get(type(e).__name__, 0) + 1
+            continue
+
+        esiti["latenze"].append((time.perf_counter() - partenza) * 1000)
+        esiti["tentativi"].append(tentativo + 1)
+        return
+
+    esiti["falliti"] += 1
+
+
+async def main_async(args: argparse.Namespace) -> int:
+    """Esegue il test e stampa le statistiche."""
+    utils = load_pzo_sensor()
+    const = importlib.import_module("pzo_sensor.const")
+    esiti: dict = {"latenze": [], "tentativi": [], "errori": {}, "falliti": 0}
+    semaforo = asyncio.Semaphore(args.clients)
+
+    async with ClientSession(timeout=ClientTimeout(total=args.timeout)) as session:
+        async def limitato() -> None:
+            async with semaforo:
+                await refresh(session, utils, const, args, esiti)
+
+        inizio = time.perf_counter()
+        await asyncio.gather(*(limitato() for _ in range(args.requests)))
+        durata = time.perf_counter() - inizio
+
+    latenze = sorted(esiti["latenze"])
+    print(f"Aggiornamenti riusciti: {len(latenze)}/{args.requests} in {durata:.1f} s")  # noqa: T201
+    if latenze:
+        print(  # noqa: T201
+            f"Latenza ms: mediana {statistics.median(latenze):.1f}, "
+            f"p95 {latenze[int(len(latenze) * 0.95) - 1 if len(latenze) > 1 else 0]:.1f}, "
+            f"max {latenze[-1]:.1f}"
+        )
+        print(f"Tentativi medi: {statistics.mean(esiti['tentativi']):.2f}")  # noqa: T201
+    print(f"Errori per tipo: {esiti['errori']}")  # noqa: T201
+    return 1 if esiti["falliti"] else 0
+
+
+def main() -> int:
+    """Punto di ingresso da riga di comando."""
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", default="http://127.0.0.1:8099/downloadzipfile")
+    parser.add_argument("--clients", type=int, default=10, help="richieste contemporanee")
+    parser.add_argument("--requests", type=int, default=100, help="aggiornamenti totali")
+    parser.add_argument("--timeout", type=float, default=60, help="timeout per richiesta (s)")
+    parser.add_argument("--attempts", type=int, default=4, help="tentativi per aggiornamento")
+    parser.add_argument(
+        "--time-scale", type=float, default=0.001,
+        help="fattore di scala delle attese tra i tentativi (1 = attese reali)",
+    )
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.WARNING)
+    return asyncio.run(main_async(args))
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,208 @@
+"""Benchmark offline della pipeline di estrazione e aggregazione dei prezzi.
+
+Non richiede Home Assistant: carica solo i moduli puri dell'integrazione
+(utils, interfaces, const) senza eseguire custom_components/pzo_sensor/__init__.py.
+
+Uso:
+    python benchmarks/run.py                  # esegue e confronta con baseline.json
+    python benchmarks/run.py --save-baseline  # esegue e salva i risultati come baseline
+"""
+
+import argparse
+from collections.abc import Callable
+from datetime import date, datetime, timedelta
+import importlib
+import io
+import json
+import logging
+from pathlib import Path
+import statistics
+import sys
+import time
+import tracemalloc
+import types
+import zipfile
+
+from synthetic import build_archive, time_zone
+
+ROOT = Path(__file__).resolve().parent
+PACKAGE_DIR = ROOT.parent / "custom_components" / "pzo_sensor"
+BASELINE_FILE = ROOT / "baseline.json"
+
+# Giorno di riferimento fisso per rendere i risultati confrontabili
+OGGI = date(2024, 10, 30)
+
+
+def load_pzo_sensor() -> types.ModuleType:
+    """Importa pzo_sensor.utils senza eseguire il modulo __init__ (che richiede Home Assistant)."""
+    package = types.ModuleType("pzo_sensor")
+    package.__path__ = [str(PACKAGE_DIR)]
+    sys.modules["pzo_sensor"] = package
+    return importlib.import_module("pzo_sensor.utils")
+
+
+def measure(funzione: Callable[[], object], ripetizioni: int) -> dict[str, float]:
+    """Misura tempo (mediana e minimo, in ms) e picco di memoria (in KiB) di una funzione."""
+    tempi = []
+    for _ in range(ripetizioni):
+        inizio = time.perf_counter()
+        funzione()
+        tempi.append((time.perf_counter() - inizio) * 1000)
+
+    # Misura la memoria in un'esecuzione separata (tracemalloc rallenta i tempi)
+    tracemalloc.start()
+    funzione()
+    _, picco = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return {
+        "median_ms": round(statistics.median(tempi), 3),
+        "min_ms": round(min(tempi), 3),
+        "peak_kib": round(picco / 1024, 1),
+    }
+
+
+def run(ripetizioni: int) -> dict[str, dict[str, float]]:
+    """Esegue tutti i benchmark e restituisce i risultati per nome."""
+    utils = load_pzo_sensor()
+    fine_media = utils.get_window(utils.WINDOW_MONTH, OGGI)[1]
+    risultati: dict[str, dict[str, float]] = {}
+
+    for giorni in (1, 33, 365):
+        for quarti in (False, True):
+            nome = f"{giorni}d_{'15min' if quarti else '60min'}"
+            archivio = build_archive(OGGI - timedelta(days=giorni - 2), giorni, quarti)
+            ripetizioni_caso = max(1, ripetizioni // (10 if giorni == 365 else 1))
+
+            # Estrazione completa dall'archivio (parsing + aggregazione di una zona)
+            def extract(archivio=archivio) -> None:
+                with zipfile.ZipFile(io.BytesIO(archivio)) as zip_file:
+                    utils.extract_xml(zip_file, {}, "NORD", True)
+
+            risultati[f"extract_xml_{nome}"] = measure(extract, ripetizioni_caso)
+            risultati[f"extract_xml_{nome}"]["files_per_s"] = round(
+                giorni / risultati[f"extract_xml_{nome}"]["median_ms"] * 1000, 1
+            )
+
+            # Aggregazione per fascia e medie (ex ciclo di mean in _async_update_data)
+            with zipfile.ZipFile(io.BytesIO(archivio)) as zip_file:
+                giorni_zona = {
+                    giorno: prezzi["NORD"]
+                    for giorno, prezzi in utils.parse_xml_archive(zip_file, ["NORD"]).items()
+                }
+
+            def aggregate(giorni_zona=giorni_zona) -> None:
+                pz_data = utils.aggregate_prices(giorni_zona, OGGI, fine_media)
+                for fascia in (utils.Fascia.MONO, utils.Fascia.F1, utils.Fascia.F2, utils.Fascia.F3, utils.Fascia.F23):
+                    pz_data.mean(fascia)
+
+            risultati[f"aggregate_{nome}"] = measure(aggregate, ripetizioni_caso)
+
+            # Aggiornamento incrementale: un giorno che entra ed esce dalle
+            # somme progressive già calcolate sugli altri giorni
+            medie = utils.RunningMeans()
+            utils.update_running_means(medie, giorni_zona, OGGI, fine_media)
+            ultimo = max(medie.giorni)
+            prezzi_ultimo = giorni_zona[ultimo]
+
+            def incremental(medie=medie, ultimo=ultimo, prezzi_ultimo=prezzi_ultimo) -> None:
+                medie.remove(ultimo)
+                medie.add(ultimo, utils.day_contribution(ultimo, prezzi_ultimo))
+                for fascia in (utils.Fascia.MONO, utils.Fascia.F1, utils.Fascia.F2, utils.Fascia.F3, utils.Fascia.F23):
+                    medie.mean(fascia)
+
+            risultati[f"aggregate_incremental_{nome}"] = measure(incremental, ripetizioni)
+
+            # Ricerca della finestra più economica (3 ore, contigua e non)
+            # da ciascun quarto d'ora di oggi e domani
+            previsioni = utils.build_forecast(giorni_zona, sorted(giorni_zona)[-2:][0])
+            quarti = len(previsioni.quarti)
+
+            def cheapest(previsioni=previsioni, quarti=quarti) -> None:
+                for primo in range(quarti):
+                    utils.find_cheapest_window(previsioni, primo, quarti, 12, True)
+                    utils.find_cheapest_window(previsioni, primo, quarti, 12, False)
+
+            risultati[f"cheapest_window_{nome}"] = measure(cheapest, ripetizioni)
+            risultati[f"cheapest_window_{nome}"]["queries_per_s"] = round(
+                2 * quarti / risultati[f"cheapest_window_{nome}"]["median_ms"] * 1000
+            )
+
+    # Calcolo della fascia per ogni ora di un anno
+    ore_anno = [
+        datetime(2024, 1, 1, tzinfo=time_zone) + timedelta(hours=h) for h in range(366 * 24)
+    ]
+    for contratto in (3, 2):
+        def fasce_anno(contratto=contratto) -> None:
+            for dataora in ore_anno:
+                utils.get_fascia(dataora, contratto)
+
+        def fasce_anno_cold(contratto=contratto) -> None:
+            utils.get_calendario_fasce.cache_clear()
+            utils.get_festivi.cache_clear()
+            fasce_anno(contratto)
+
+        risultati[f"get_fascia_year_c{contratto}"] = measure(fasce_anno, ripetizioni)
+        risultati[f"get_fascia_year_c{contratto}"]["calls_per_s"] = round(
+            len(ore_anno) / risultati[f"get_fascia_year_c{contratto}"]["median_ms"] * 1000
+        )
+        risultati[f"get_fascia_year_c{contratto}_cold"] = measure(
+            fasce_anno_cold, max(1, ripetizioni // 5)
+        )
+
+    return risultati
+
+
+def compare(risultati: dict, baseline: dict, soglia: float) -> list[str]:
+    """Restituisce i benchmark più lenti (o con più memoria) della baseline oltre la soglia."""
+    regressioni = []
+    for nome, valori in risultati.items():
+        if nome not in baseline:
+            continue
+        for metrica in ("median_ms", "peak_kib"):
+            prima = baseline[nome][metrica]
+            if prima > 0 and valori[metrica] > prima * (1 + soglia):
+                regressioni.append(
+                    f"{nome}: {metrica} {prima} -> {valori[metrica]} "
+                    f"(+{(valori[metrica] / prima - 1) * 100:.0f}%)"
+                )
+    return regressioni
+
+
+def main() -> int:
+    """Punto di ingresso da riga di comando."""
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeat", type=int, default=10, help="ripetizioni per benchmark")
+    parser.add_argument("--save-baseline", action="store_true", help="salva i risultati in baseline.json")
+    parser.add_argument("--threshold", type=float, default=0.25, help="regressione tollerata (0.25 = +25%%)")
+    parser.add_argument("--output", type=Path, help="salva i risultati anche in questo file JSON")
+    args = parser.parse_args()
+
+    # Silenzia i log di debug dell'integrazione
+    logging.basicConfig(level=logging.WARNING)
+
+    risultati = run(args.repeat)
+    larghezza = max(len(nome) for nome in risultati)
+    for nome, valori in risultati.items():
+        print(f"{nome:<{larghezza}}  " + "  ".join(f"{k}={v}" for k, v in valori.items()))  # noqa: T201
+
+    if args.output:
+        args.output.write_text(json.dumps(risultati, indent=2) + "\n")
+
+    if args.save_baseline:
+        BASELINE_FILE.write_text(json.dumps(risultati, indent=2) + "\n")
+        print(f"Baseline salvata in {BASELINE_FILE}")  # noqa: T201
+        return 0
+
+    if not BASELINE_FILE.exists():
+        print("Nessuna baseline presente, usa --save-baseline per crearla.")  # noqa: T201
+        return 0
+
+    regressioni = compare(risultati, json.loads(BASELINE_FILE.read_text()), args.threshold)
+    for regressione in regressioni:
+        print(f"REGRESSIONE {regressione}")  # noqa: T201
+    return 1 if regressioni else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
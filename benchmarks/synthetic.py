@@ -0,0 +1,67 @@
+"""Generazione di archivi ZIP sintetici nel formato GME (un XML per giorno)."""
+
+from datetime import date, datetime, time, timedelta, timezone
+import io
+import random
+import zipfile
+
+from zoneinfo import ZoneInfo
+
+time_zone = ZoneInfo("Europe/Rome")
+
+# Tutte le zone presenti nei file MGP Prezzi del GME
+ZONE_XML = [
+    "PUN", "AUST", "BSP", "CALA", "CNOR", "COAC", "CORS", "COUP", "CSUD", "FRAN",
+    "GREC", "MALT", "MONT", "NAT", "NORD", "SARD", "SICI", "SLOV", "SUD", "SVIZ",
+    "XAUS", "XFRA", "XGRE",
+]
+
+
+def _format_prezzo(prezzo: float) -> str:
+    """Formatta un prezzo in €/MWh come nei file GME (virgola decimale)."""
+    return f"{prezzo:.6f}".replace(".", ",")
+
+
+def build_xml(giorno: date, periodi: int, rng: random.Random) -> bytes:
+    """Crea il file XML di un giorno con tutte le zone.
+
+    Con 24 periodi (o 23/25) usa solo Ora, con 96 (o 92/100) aggiunge Periodo.
+    """
+    data = giorno.strftime("%Y%m%d")
+    quarti = periodi > 25
+    righe = ['<?xml version="1.0" encoding="utf-8"?>\n<NewDataSet>']
+    for p in range(1, periodi + 1):
+        ora = (p - 1) // 4 + 1 if quarti else p
+        riga = [f"<Prezzi><Data>{data}</Data><Mercato>MGP</Mercato><Ora>{ora}</Ora>"]
+        if quarti:
+            riga.append(f"<Periodo>{p}</Periodo>")
+        base = rng.uniform(60, 180)
+        riga.extend(
+            f"<{zona}>{_format_prezzo(base + rng.uniform(-5, 5))}</{zona}>"
+            for zona in ZONE_XML
+        )
+        riga.append("</Prezzi>")
+        righe.append("".join(riga))
+    righe.append("</NewDataSet>")
+    return "\n".join(righe).encode()
+
+
+def ore_giorno(giorno: date) -> int:
+    """Restituisce il numero di ore del giorno in Italia (23/24/25 al cambio d'ora)."""
+    inizio = datetime.combine(giorno, time(0), tzinfo=time_zone).astimezone(timezone.utc)
+    fine = datetime.combine(giorno + timedelta(days=1), time(0), tzinfo=time_zone).astimezone(timezone.utc)
+    return int((fine - inizio).total_seconds()) // 3600
+
+
+def build_archive(inizio: date, giorni: int, quarti: bool = False, seed: int = 0) -> bytes:
+    """Crea un archivio ZIP con un file XML per ciascun giorno a partire da inizio."""
+    rng = random.Random(seed)
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, "w", zipfile.ZIP_DEFLATED) as archivio:
+        for n in range(giorni):
+            giorno = inizio + timedelta(days=n)
+            archivio.writestr(
+                f"{giorno.strftime('%Y%m%d')}MGPPrezzi.xml",
+                build_xml(giorno, ore_giorno(giorno) * (4 if quarti else 1), rng),
+            )
+    return buffer.getvalue()
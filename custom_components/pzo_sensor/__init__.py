@@ -9,11 +9,31 @@ from holidays import country_holidays
 from homeassistant.config_entries import ConfigEntry
 from homeassistant.const import __version__ as HA_VERSION
 from homeassistant.core import HomeAssistant
-from homeassistant.helpers.event import async_call_later, async_track_point_in_time
-import homeassistant.util.dt as dt_util
-
-from .const import CONF_ACTUAL_DATA_ONLY, CONF_SCAN_HOUR, ZONE_CODES, CONF_ZONE, CONTRACTS, CONF_CONTRACT, CONF_MONTH_AVG, DOMAIN, WEB_RETRIES_MINUTES
+from homeassistant.helpers.event import async_call_later
+
+from .const import (
+    CONF_ACTUAL_DATA_ONLY,
+    CONF_BILLING_DAY,
+    CONF_CHEAP_HOURS,
+    CONF_CHEAPEST_HOURS,
+    CONF_CONTRACT,
+    CONF_ENDPOINT,
+    CONF_ENERGY_METER,
+    CONF_EXPENSIVE_HOURS,
+    CONF_MAX_DOWNLOAD_MB,
+    CONF_SCAN_HOUR,
+    CONF_WINDOW,
+    CONF_WINDOW_DAYS,
+    CONF_ZONE,
+    CONTRACTS,
+    COORD_EVENT,
+    DOMAIN,
+    EVENT_UPDATE_PREZZI,
+    WINDOWS,
+)
 from .coordinator import PricesDataUpdateCoordinator
+from .services import async_setup_services, async_unload_services
+from .utils import get_retail_tariff, get_zone_codes
 
 if AwesomeVersion(HA_VERSION) >= AwesomeVersion("2024.5.0"):
     from homeassistant.setup import SetupPhases, async_pause_setup
@@ -22,7 +42,7 @@ if AwesomeVersion(HA_VERSION) >= AwesomeVersion("2024.5.0"):
 _LOGGER = logging.getLogger(__name__)
 
 # Definisce i tipi di entità
-PLATFORMS: list[str] = ["sensor"]
+PLATFORMS: list[str] = ["sensor", "binary_sensor"]
 
 
 async def async_setup_entry(hass: HomeAssistant, config: ConfigEntry) -> bool:
@@ -37,6 +57,9 @@ async def async_setup_entry(hass: HomeAssistant, config: ConfigEntry) -> bool:
     coordinator = PricesDataUpdateCoordinator(hass, config)
     hass.data.setdefault(DOMAIN, {})[config.entry_id] = coordinator
 
+    # Ripristina i prezzi salvati in precedenza, prima di creare i sensori
+    dati_completi = await coordinator.async_restore()
+
     # Aggiorna immedianamente l'orario corrente
     await coordinator.update_orario()
 
@@ -46,10 +69,22 @@ async def async_setup_entry(hass: HomeAssistant, config: ConfigEntry) -> bool:
     # Crea i sensori con la configurazione specificata
     await hass.config_entries.async_forward_entry_setups(config, PLATFORMS)
 
-    # Schedula l'aggiornamento via web 10 secondi dopo l'avvio
-    coordinator.schedule_token = async_call_later(
-        hass, timedelta(seconds=10), coordinator.update_prezzi
-    )
+    # Notifica ai sensori i prezzi ripristinati
+    if coordinator.prezzi_giornalieri:
+        coordinator.async_set_updated_data({COORD_EVENT: EVENT_UPDATE_PREZZI})
+
+    if dati_completi:
+        # Prezzi già aggiornati: schedula il prossimo aggiornamento
+        # senza scaricare nulla
+        coordinator.schedule_prezzi()
+    else:
+        # Schedula l'aggiornamento via web 10 secondi dopo l'avvio
+        coordinator.schedule_token = async_call_later(
+            hass, timedelta(seconds=10), coordinator.update_prezzi
+        )
+
+    # Registra i servizi dell'archivio storico
+    async_setup_services(hass)
 
     # Registra il callback di modifica opzioni
     config.async_on_unload(config.add_update_listener(update_listener))
@@ -62,7 +97,12 @@ async def async_unload_entry(hass: HomeAssistant, config: ConfigEntry) -> bool:
     # Scarica i sensori (disabilitando di conseguenza il coordinator)
     unload_ok = await hass.config_entries.async_unload_platforms(config, PLATFORMS)
     if unload_ok:
-        hass.data[DOMAIN].pop(config.entry_id)
+        coordinator = hass.data[DOMAIN].pop(config.entry_id)
+
+        # Annulla le schedulazioni del coordinator prima di chiudere l'archivio
+        coordinator.shutdown()
+        await hass.async_add_executor_job(coordinator.archivio_storico.close)
+        async_unload_services(hass)
 
     return unload_ok
 
@@ -76,18 +116,29 @@ async def update_listener(hass: HomeAssistant, config: ConfigEntry) -> None:
 
     # Aggiorna le impostazioni del coordinator dalle opzioni
     if (CONF_ZONE in config.options) and (
-        config.options[CONF_ZONE] != coordinator.zone
+        get_zone_codes(config.options[CONF_ZONE]) != coordinator.zones
     ):
-        # Modificata la zona geografica nelle opzioni
-        coordinator.zone = ZONE_CODES[config.options[CONF_ZONE]]
-        reload = True
+        # Modificate le zone geografiche nelle opzioni: ricarica l'integrazione
+        # per creare i sensori delle nuove zone
+        _LOGGER.debug("Nuove zone: %s.", config.options[CONF_ZONE])
+        await hass.config_entries.async_reload(config.entry_id)
+        return
+
+    if config.options.get(CONF_ENERGY_METER) != coordinator.energy_meter:
+        # Modificato il contatore di energia: ricarica l'integrazione
+        # per creare (o rimuovere) il sensore del costo
+        _LOGGER.debug("Nuovo contatore di energia: %s.", config.options.get(CONF_ENERGY_METER))
+        await hass.config_entries.async_reload(config.entry_id)
+        return
 
     if (CONF_CONTRACT in config.options) and (
-        config.options[CONF_CONTRACT] != coordinator.contract
+        CONTRACTS[config.options[CONF_CONTRACT]] != coordinator.contract
     ):
-        # Modificata il tipo di contratto nelle opzioni
-        coordinator.contract = CONTRACTS[config.options[CONF_CONTRACT]]
-        reload = True
+        # Modificato il tipo di contratto nelle opzioni: ricarica l'integrazione
+        # per creare i sensori delle nuove fasce (e i relativi stati possibili)
+        _LOGGER.debug("Nuovo contratto: %s.", config.options[CONF_CONTRACT])
+        await hass.config_entries.async_reload(config.entry_id)
+        return
 
     if (CONF_SCAN_HOUR in config.options) and (
         config.options[CONF_SCAN_HOUR] != coordinator.scan_hour
@@ -100,32 +151,9 @@ async def update_listener(hass: HomeAssistant, config: ConfigEntry) -> None:
             hass=hass, config=config, new_minute=True
         )
 
-        # Calcola la data della prossima esecuzione (all'ora definita)
-        now = dt_util.now()
-        next_update = now.replace(
-            hour=coordinator.scan_hour,
-            minute=coordinator.scan_minute,
-            second=0,
-            microsecond=0,
-        )
-        if next_update <= now:
-            # Se l'evento è già trascorso, passa a domani alla stessa ora
-            next_update = next_update + timedelta(days=1)
-
-        # Annulla eventuali schedulazioni attive
-        if coordinator.schedule_token is not None:
-            coordinator.schedule_token()
-            coordinator.schedule_token = None
-
-        # Schedula la prossima esecuzione
-        coordinator.web_retries = WEB_RETRIES_MINUTES
-        coordinator.schedule_token = async_track_point_in_time(
-            coordinator.hass, coordinator.update_prezzi, next_update
-        )
-        _LOGGER.debug(
-            "Prossimo aggiornamento web: %s",
-            next_update.strftime("%d/%m/%Y %H:%M:%S %z"),
-        )
+        # Schedula la prossima esecuzione in base alla nuova ora
+        coordinator.poll_attempt = 0
+        coordinator.schedule_prezzi()
 
     if (CONF_ACTUAL_DATA_ONLY in config.options) and (
         config.options[CONF_ACTUAL_DATA_ONLY] != coordinator.actual_data_only
@@ -142,16 +170,75 @@ async def update_listener(hass: HomeAssistant, config: ConfigEntry) -> None:
             coordinator.schedule_token()
             coordinator.schedule_token = None
     
-    if (CONF_MONTH_AVG in config.options) and (
-        config.options[CONF_MONTH_AVG] != coordinator.month_average
+    if (CONF_WINDOW in config.options) and (
+        WINDOWS[config.options[CONF_WINDOW]] != coordinator.window
+    ):
+        # Modificata la finestra di calcolo delle medie nelle opzioni
+        coordinator.window = WINDOWS[config.options[CONF_WINDOW]]
+        _LOGGER.debug("Nuova finestra di calcolo delle medie: %s.", coordinator.window)
+        reload = True
+
+    if (CONF_WINDOW_DAYS in config.options) and (
+        config.options[CONF_WINDOW_DAYS] != coordinator.window_days
+    ):
+        # Modificato il numero di giorni della finestra mobile
+        coordinator.window_days = config.options[CONF_WINDOW_DAYS]
+        reload = True
+
+    if (CONF_BILLING_DAY in config.options) and (
+        config.options[CONF_BILLING_DAY] != coordinator.billing_day
+    ):
+        # Modificato il giorno di inizio del ciclo di fatturazione
+        coordinator.billing_day = config.options[CONF_BILLING_DAY]
+        reload = True
+
+    if (CONF_ENDPOINT in config.options) and (
+        config.options[CONF_ENDPOINT] != coordinator.endpoint
     ):
-        # Modificata il metodo di calcolo dei prezzi nelle opzioni
-        coordinator.month_average = config.options[CONF_MONTH_AVG]
+        # Modificato l'indirizzo di download nelle opzioni
+        coordinator.endpoint = config.options[CONF_ENDPOINT]
+        _LOGGER.debug("Nuovo indirizzo di download: %s.", coordinator.endpoint)
         reload = True
 
+    if (CONF_CHEAPEST_HOURS in config.options) and (
+        config.options[CONF_CHEAPEST_HOURS] != coordinator.cheapest_hours
+    ):
+        # Modificata la durata della finestra più economica (nessun download necessario)
+        coordinator.cheapest_hours = config.options[CONF_CHEAPEST_HOURS]
+        coordinator.async_set_updated_data({COORD_EVENT: EVENT_UPDATE_PREZZI})
+
+    if (
+        config.options.get(CONF_CHEAP_HOURS, coordinator.cheap_hours) != coordinator.cheap_hours
+        or config.options.get(CONF_EXPENSIVE_HOURS, coordinator.expensive_hours) != coordinator.expensive_hours
+    ):
+        # Modificate le soglie dei sensori di prezzo basso e alto (nessun download necessario)
+        coordinator.cheap_hours = config.options.get(CONF_CHEAP_HOURS, coordinator.cheap_hours)
+        coordinator.expensive_hours = config.options.get(CONF_EXPENSIVE_HOURS, coordinator.expensive_hours)
+        coordinator.async_set_updated_data({COORD_EVENT: EVENT_UPDATE_PREZZI})
+
+    if (tariffa := get_retail_tariff(config.options, config.data)) != coordinator.tariffa and (
+        (tariffa is None) != (coordinator.tariffa is None)
+    ):
+        # Attivato o disattivato il prezzo al dettaglio: ricarica l'integrazione
+        # per creare (o rimuovere) i relativi sensori
+        _LOGGER.debug("Nuovo modello del prezzo al dettaglio: %s.", tariffa)
+        await hass.config_entries.async_reload(config.entry_id)
+        return
+
+    if tariffa != coordinator.tariffa:
+        # Modificato il modello del prezzo al dettaglio (ricalcola medie e curve)
+        coordinator.tariffa = tariffa
+        _LOGGER.debug("Nuovo modello del prezzo al dettaglio: %s.", tariffa)
+        reload = True
+
+    if (CONF_MAX_DOWNLOAD_MB in config.options):
+        # Dimensione massima del download (usata dal prossimo aggiornamento)
+        coordinator.max_download_bytes = config.options[CONF_MAX_DOWNLOAD_MB] * 1024 * 1024
+
     if (reload):
         # Esegue un nuovo aggiornamento immediatamente
-        coordinator.web_retries = WEB_RETRIES_MINUTES
+        coordinator.poll_attempt = 0
+        coordinator.clean_tokens()
         coordinator.schedule_token = async_call_later(
             coordinator.hass, timedelta(seconds=5), coordinator.update_prezzi
         )
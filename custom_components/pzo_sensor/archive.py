@@ -0,0 +1,98 @@
+"""Archivio storico locale dei prezzi zonali giornalieri (SQLite)."""
+
+from array import array
+from collections.abc import Mapping, Sequence
+from datetime import date
+import logging
+import sqlite3
+import threading
+
+# Ottiene il logger
+_LOGGER = logging.getLogger(__name__)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS prezzi (
+    giorno TEXT NOT NULL,
+    zona TEXT NOT NULL,
+    prezzi BLOB NOT NULL,
+    PRIMARY KEY (giorno, zona)
+) WITHOUT ROWID
+"""
+
+
+class PricesArchive:
+    """Archivio dei prezzi di ogni giorno e zona, senza cancellazioni.
+
+    I prezzi di un giorno sono salvati come array di double (un valore per
+    periodo di mercato). Tutti i metodi eseguono I/O su disco e vanno
+    richiamati da un executor; l'accesso è serializzato da un lock.
+    """
+
+    def __init__(self, percorso: str) -> None:
+        """Inizializza l'archivio (il file viene aperto al primo utilizzo)."""
+        self.percorso = percorso
+        self._lock = threading.Lock()
+        self._conn: sqlite3.Connection | None = None
+        self._chiuso = False
+
+    def _connessione(self) -> sqlite3.Connection:
+        """Apre il database e crea la tabella, se necessario."""
+        if self._chiuso:
+            # Archivio chiuso alla rimozione dell'integrazione
+            raise sqlite3.ProgrammingError("Archivio storico chiuso.")
+        if self._conn is None:
+            self._conn = sqlite3.connect(self.percorso, check_same_thread=False)
+            self._conn.execute(_SCHEMA)
+            self._conn.commit()
+            _LOGGER.debug("Archivio storico aperto: %s", self.percorso)
+        return self._conn
+
+    def add_days(self, giorni: Mapping[date, Mapping[str, Sequence[float]]]) -> int:
+        """Aggiunge (o corregge) i prezzi dei giorni indicati; ritorna le righe scritte."""
+        righe = [
+            (giorno.isoformat(), zona, array("d", prezzi).tobytes())
+            for giorno, zone in giorni.items()
+            for zona, prezzi in zone.items()
+        ]
+        if not righe:
+            return 0
+
+        with self._lock:
+            conn = self._connessione()
+            with conn:
+                conn.executemany(
+                    "INSERT OR REPLACE INTO prezzi (giorno, zona, prezzi) VALUES (?, ?, ?)",
+                    righe,
+                )
+        return len(righe)
+
+    def get_days(self, inizio: date, fine: date, zona: str) -> dict[date, tuple[float, ...]]:
+        """Restituisce i prezzi della zona per ogni giorno presente nell'intervallo."""
+        with self._lock:
+            cursore = self._connessione().execute(
+                "SELECT giorno, prezzi FROM prezzi WHERE zona = ? AND giorno BETWEEN ? AND ? ORDER BY giorno",
+                (zona, inizio.isoformat(), fine.isoformat()),
+            )
+            righe = cursore.fetchall()
+
+        giorni: dict[date, tuple[float, ...]] = {}
+        for giorno, blob in righe:
+            prezzi = array("d")
+            prezzi.frombytes(blob)
+            giorni[date.fromisoformat(giorno)] = tuple(prezzi)
+        return giorni
+
+    def count_days(self) -> int:
+        """Restituisce il numero di giorni presenti nell'archivio."""
+        with self._lock:
+            return self._connessione().execute(
+                "SELECT COUNT(DISTINCT giorno) FROM prezzi"
+            ).fetchone()[0]
+
+    def close(self) -> None:
+        """Chiude il database."""
+        with self._lock:
+            self._chiuso = True
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
@@ -0,0 +1,108 @@
+"""Implementazione sensori binari di pzo_sensor."""
+
+from typing import Any
+
+from homeassistant.components.binary_sensor import ENTITY_ID_FORMAT, BinarySensorEntity
+from homeassistant.config_entries import ConfigEntry
+from homeassistant.core import HomeAssistant
+from homeassistant.helpers.entity_platform import AddEntitiesCallback
+from homeassistant.helpers.typing import DiscoveryInfoType
+from homeassistant.helpers.update_coordinator import CoordinatorEntity
+
+from . import PricesDataUpdateCoordinator
+from .const import (
+    DOMAIN,
+    EVENT_UPDATE_ORARIO,
+    EVENT_UPDATE_PREZZI,
+    EVENT_UPDATE_QUARTO_ORARIO,
+)
+from .sensor import is_update_for, zone_suffix
+from .utils import is_among_cheapest
+
+
+async def async_setup_entry(
+    hass: HomeAssistant,
+    config: ConfigEntry,
+    async_add_entities: AddEntitiesCallback,
+    discovery_info: DiscoveryInfoType | None = None,
+) -> None:
+    """Inizializza e crea i sensori binari."""
+
+    # Restituisce il coordinator
+    coordinator = hass.data[DOMAIN][config.entry_id]
+
+    # Crea i sensori del prezzo basso e alto di ciascuna zona
+    entities: list[BinarySensorEntity] = []
+    for zone in coordinator.zones:
+        entities.append(PrezzoRelativoBinarySensorEntity(coordinator, zone, costoso=False))
+        entities.append(PrezzoRelativoBinarySensorEntity(coordinator, zone, costoso=True))
+
+    async_add_entities(entities, update_before_add=False)
+
+
+class PrezzoRelativoBinarySensorEntity(CoordinatorEntity, BinarySensorEntity):
+    """Sensore binario attivo se il prezzo corrente è tra i più bassi (o alti) del giorno."""
+
+    # Eventi del coordinator che modificano il sensore
+    _eventi = frozenset({EVENT_UPDATE_ORARIO, EVENT_UPDATE_QUARTO_ORARIO, EVENT_UPDATE_PREZZI})
+
+    # Proprietà comuni
+    _attr_has_entity_name = True
+    _attr_should_poll = False
+
+    def __init__(self, coordinator: PricesDataUpdateCoordinator, zone: str, costoso: bool) -> None:
+        """Inizializza il sensore."""
+        super().__init__(coordinator)
+
+        # Inizializza coordinator, zona e tipo
+        self.coordinator = coordinator
+        self.zone = zone
+        self.costoso = costoso
+        id_suffix, name_suffix = zone_suffix(coordinator, zone)
+
+        # ID univoco sensore, nome e icona basati su un nome fisso
+        self.entity_id = ENTITY_ID_FORMAT.format(
+            ("prezzo_zonale_alto" if costoso else "prezzo_zonale_basso") + id_suffix
+        )
+        self._attr_unique_id = self.entity_id
+        self._attr_name = f"Prezzo zonale {'alto' if costoso else 'basso'}{name_suffix}"
+        self._attr_icon = "mdi:trending-up" if costoso else "mdi:trending-down"
+        self._attr_available = False
+        self._attr_is_on = None
+        self._attr_extra_state_attributes = {}
+
+    def _handle_coordinator_update(self) -> None:
+        """Gestisce l'aggiornamento dei dati dal coordinator."""
+
+        # Ignora gli aggiornamenti che non modificano il sensore
+        if not is_update_for(self.coordinator, self._eventi):
+            return
+
+        self._aggiorna_stato()
+        self.async_write_ha_state()
+
+    async def async_added_to_hass(self) -> None:
+        """Entità aggiunta ad Home Assistant."""
+        await super().async_added_to_hass()
+
+        # Stato iniziale dai dati già presenti nel coordinator
+        self._aggiorna_stato()
+
+    def _aggiorna_stato(self) -> None:
+        """Calcola stato e attributi dai dati del coordinator."""
+
+        # Stato e attributi calcolati una volta per evento
+        ore = self.coordinator.expensive_hours if self.costoso else self.coordinator.cheap_hours
+        attributi: dict[str, Any] = {"ore": ore}
+        rango_corrente = self.coordinator.current_rank(self.zone)
+        self._attr_available = rango_corrente is not None
+        if rango_corrente is None:
+            self._attr_is_on = None
+        else:
+            rango, periodi = rango_corrente
+            attributi["posizione"] = rango + 1
+            if self.costoso:
+                # Posizione a partire dal prezzo più alto
+                rango = periodi - 1 - rango
+            self._attr_is_on = is_among_cheapest(rango, periodi, ore)
+        self._attr_extra_state_attributes = attributi
@@ -3,11 +3,85 @@
 import voluptuous as vol
 
 from homeassistant import config_entries
+from homeassistant.components.sensor import SensorDeviceClass
 from homeassistant.core import callback
 from homeassistant.data_entry_flow import FlowResult
+from homeassistant.helpers import selector
 import homeassistant.helpers.config_validation as cv
 
-from .const import CONF_ACTUAL_DATA_ONLY, CONF_SCAN_HOUR, CONF_ZONE, DEFAULT_ZONE, CONF_CONTRACT, DEFAULT_CONTRACT, CONF_MONTH_AVG, ZONE_CODES, CONTRACTS, DOMAIN
+from .const import (
+    CONF_ACTUAL_DATA_ONLY,
+    CONF_BILLING_DAY,
+    CONF_CHEAP_HOURS,
+    CONF_CHEAPEST_HOURS,
+    CONF_CONTRACT,
+    CONF_ENDPOINT,
+    CONF_ENERGY_METER,
+    CONF_EXPENSIVE_HOURS,
+    CONF_MAX_DOWNLOAD_MB,
+    CONF_RETAIL_FIXED,
+    CONF_RETAIL_LOSSES,
+    CONF_RETAIL_SPREAD,
+    CONF_RETAIL_VAT,
+    CONF_SCAN_HOUR,
+    CONF_WINDOW,
+    CONF_WINDOW_DAYS,
+    CONF_ZONE,
+    CONTRACTS,
+    DEFAULT_CHEAP_HOURS,
+    DEFAULT_CHEAPEST_HOURS,
+    DEFAULT_CONTRACT,
+    DEFAULT_ENDPOINT,
+    DEFAULT_EXPENSIVE_HOURS,
+    DEFAULT_MAX_DOWNLOAD_MB,
+    DEFAULT_WINDOW_DAYS,
+    DEFAULT_ZONE,
+    DOMAIN,
+    WINDOW_MONTH,
+    WINDOW_NAMES,
+    WINDOWS,
+    ZONE_CODES,
+)
+from .interfaces import RetailTariff
+from .utils import get_retail_tariff, get_window_name
+
+
+def get_zone_names(zone: str | list[str]) -> list[str]:
+    """Restituisce le zone configurate come lista (accetta anche il vecchio formato a zona singola)."""
+    if isinstance(zone, str):
+        return [zone]
+    return list(zone)
+
+
+# Contatore di energia per il sensore del costo (opzionale)
+ENERGY_METER_SELECTOR = selector.EntitySelector(
+    selector.EntitySelectorConfig(domain="sensor", device_class=SensorDeviceClass.ENERGY)
+)
+
+
+def retail_schema(tariffa: RetailTariff | None) -> dict:
+    """Restituisce i campi del modello del prezzo al dettaglio.
+
+    I campi non hanno default (lasciandoli vuoti il prezzo al dettaglio non
+    viene calcolato) ma propongono i valori del modello indicato.
+    """
+    def proposto(campo: str) -> dict:
+        return {"suggested_value": None if tariffa is None else getattr(tariffa, campo)}
+
+    return {
+        vol.Optional(CONF_RETAIL_SPREAD, description=proposto("spread")): vol.All(
+            vol.Coerce(float), vol.Range(min=-1, max=1)
+        ),
+        vol.Optional(CONF_RETAIL_FIXED, description=proposto("fissi")): vol.All(
+            vol.Coerce(float), vol.Range(min=0, max=1)
+        ),
+        vol.Optional(CONF_RETAIL_LOSSES, description=proposto("perdite")): vol.All(
+            vol.Coerce(float), vol.Range(min=0, max=50)
+        ),
+        vol.Optional(CONF_RETAIL_VAT, description=proposto("iva")): vol.All(
+            vol.Coerce(float), vol.Range(min=0, max=100)
+        ),
+    }
 
 
 class OptionsFlow(config_entries.OptionsFlow):
@@ -28,10 +102,10 @@ class OptionsFlow(config_entries.OptionsFlow):
         data_schema = {
             vol.Required(
                 CONF_ZONE,
-                default=self.config_entry.options.get(
+                default=get_zone_names(self.config_entry.options.get(
                     CONF_ZONE, self.config_entry.data[CONF_ZONE]
-                )
-            ): vol.In(ZONE_CODES.keys()),
+                ))
+            ): vol.All(cv.multi_select(list(ZONE_CODES.keys())), vol.Length(min=1)),
             vol.Required(
                 CONF_CONTRACT,
                 default=self.config_entry.options.get(
@@ -44,20 +118,76 @@ class OptionsFlow(config_entries.OptionsFlow):
                     CONF_SCAN_HOUR, self.config_entry.data[CONF_SCAN_HOUR]
                 ),
             ): vol.All(cv.positive_int, vol.Range(min=0, max=23)),
+            vol.Required(
+                CONF_WINDOW,
+                default=get_window_name(self.config_entry.options, self.config_entry.data),
+            ): vol.In(WINDOWS.keys()),
             vol.Optional(
-                CONF_MONTH_AVG,
+                CONF_WINDOW_DAYS,
                 default=self.config_entry.options.get(
-                    CONF_MONTH_AVG, self.config_entry.data[CONF_MONTH_AVG]
+                    CONF_WINDOW_DAYS, self.config_entry.data.get(CONF_WINDOW_DAYS, DEFAULT_WINDOW_DAYS)
                 ),
-            ): cv.boolean,
+            ): vol.All(cv.positive_int, vol.Range(min=1, max=366)),
+            vol.Optional(
+                CONF_BILLING_DAY,
+                default=self.config_entry.options.get(
+                    CONF_BILLING_DAY, self.config_entry.data.get(CONF_BILLING_DAY, 1)
+                ),
+            ): vol.All(cv.positive_int, vol.Range(min=1, max=31)),
             vol.Optional(
                 CONF_ACTUAL_DATA_ONLY,
                 default=self.config_entry.options.get(
                     CONF_ACTUAL_DATA_ONLY, self.config_entry.data[CONF_ACTUAL_DATA_ONLY]
                 ),
             ): cv.boolean,
+            vol.Optional(
+                CONF_CHEAPEST_HOURS,
+                default=self.config_entry.options.get(
+                    CONF_CHEAPEST_HOURS, self.config_entry.data.get(CONF_CHEAPEST_HOURS, DEFAULT_CHEAPEST_HOURS)
+                ),
+            ): vol.All(cv.positive_int, vol.Range(min=1, max=24)),
+            vol.Optional(
+                CONF_CHEAP_HOURS,
+                default=self.config_entry.options.get(
+                    CONF_CHEAP_HOURS, self.config_entry.data.get(CONF_CHEAP_HOURS, DEFAULT_CHEAP_HOURS)
+                ),
+            ): vol.All(cv.positive_int, vol.Range(min=0, max=24)),
+            vol.Optional(
+                CONF_EXPENSIVE_HOURS,
+                default=self.config_entry.options.get(
+                    CONF_EXPENSIVE_HOURS, self.config_entry.data.get(CONF_EXPENSIVE_HOURS, DEFAULT_EXPENSIVE_HOURS)
+                ),
+            ): vol.All(cv.positive_int, vol.Range(min=0, max=24)),
+            **retail_schema(get_retail_tariff(self.config_entry.options, self.config_entry.data)),
+            vol.Optional(
+                CONF_ENERGY_METER,
+                description={
+                    "suggested_value": self.config_entry.options.get(CONF_ENERGY_METER)
+                    if self.config_entry.options
+                    else self.config_entry.data.get(CONF_ENERGY_METER)
+                },
+            ): ENERGY_METER_SELECTOR,
         }
 
+        # Indirizzo di download alternativo (es. server locale di test), solo in modalità avanzata
+        if self.show_advanced_options:
+            data_schema[
+                vol.Optional(
+                    CONF_ENDPOINT,
+                    default=self.config_entry.options.get(
+                        CONF_ENDPOINT, self.config_entry.data.get(CONF_ENDPOINT, DEFAULT_ENDPOINT)
+                    ),
+                )
+            ] = cv.url
+            data_schema[
+                vol.Optional(
+                    CONF_MAX_DOWNLOAD_MB,
+                    default=self.config_entry.options.get(
+                        CONF_MAX_DOWNLOAD_MB, self.config_entry.data.get(CONF_MAX_DOWNLOAD_MB, DEFAULT_MAX_DOWNLOAD_MB)
+                    ),
+                )
+            ] = vol.All(cv.positive_int, vol.Range(min=1, max=500))
+
         # Mostra la schermata di configurazione, con gli eventuali errori
         return self.async_show_form(
             step_id="init", data_schema=vol.Schema(data_schema), errors=errors
@@ -91,13 +221,32 @@ class ConfigFlow(config_entries.ConfigFlow, domain=DOMAIN):
 
         # Schema dati di configurazione (con default fissi)
         data_schema = {
-            vol.Required(CONF_ZONE, default=DEFAULT_ZONE): vol.In(ZONE_CODES.keys()),
+            vol.Required(CONF_ZONE, default=[DEFAULT_ZONE]): vol.All(
+                cv.multi_select(list(ZONE_CODES.keys())), vol.Length(min=1)
+            ),
             vol.Required(CONF_CONTRACT, default=DEFAULT_CONTRACT): vol.In(CONTRACTS.keys()),
             vol.Required(CONF_SCAN_HOUR, default=1): vol.All(
                 cv.positive_int, vol.Range(min=0, max=23)
             ),
-            vol.Optional(CONF_MONTH_AVG, default=True): cv.boolean,
+            vol.Required(CONF_WINDOW, default=WINDOW_NAMES[WINDOW_MONTH]): vol.In(WINDOWS.keys()),
+            vol.Optional(CONF_WINDOW_DAYS, default=DEFAULT_WINDOW_DAYS): vol.All(
+                cv.positive_int, vol.Range(min=1, max=366)
+            ),
+            vol.Optional(CONF_BILLING_DAY, default=1): vol.All(
+                cv.positive_int, vol.Range(min=1, max=31)
+            ),
             vol.Optional(CONF_ACTUAL_DATA_ONLY, default=False): cv.boolean,
+            vol.Optional(CONF_CHEAPEST_HOURS, default=DEFAULT_CHEAPEST_HOURS): vol.All(
+                cv.positive_int, vol.Range(min=1, max=24)
+            ),
+            vol.Optional(CONF_CHEAP_HOURS, default=DEFAULT_CHEAP_HOURS): vol.All(
+                cv.positive_int, vol.Range(min=0, max=24)
+            ),
+            vol.Optional(CONF_EXPENSIVE_HOURS, default=DEFAULT_EXPENSIVE_HOURS): vol.All(
+                cv.positive_int, vol.Range(min=0, max=24)
+            ),
+            **retail_schema(None),
+            vol.Optional(CONF_ENERGY_METER): ENERGY_METER_SELECTOR,
         }
 
         # Mostra la schermata di configurazione, con gli eventuali errori
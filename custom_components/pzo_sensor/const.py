@@ -1,16 +1,92 @@
 """Costanti utilizzate da pzo_sensor."""
 
+from datetime import time
+
 # Dominio HomeAssistant
 DOMAIN = "pzo_sensor"
 
-# Intervalli di tempo per i tentativi
-WEB_RETRIES_MINUTES = [1, 10, 30, 60, 120, 180, 240]
+# Archivio locale dei prezzi giornalieri (in .storage)
+STORAGE_KEY = f"{DOMAIN}.prezzi"
+STORAGE_VERSION = 1
+
+# Archivio storico dei prezzi (in .storage) e massimo numero di giorni
+# scaricabili con una sola richiesta di recupero
+ARCHIVE_FILE = f"{DOMAIN}.sqlite"
+BACKFILL_MAX_DAYS = 366
+
+# Servizi
+SERVICE_GET_PERIOD_PRICES = "get_period_prices"
+SERVICE_BACKFILL = "backfill"
+SERVICE_FIND_CHEAPEST_WINDOW = "find_cheapest_window"
+
+# Durata (ore) della finestra più economica mostrata dai sensori
+DEFAULT_CHEAPEST_HOURS = 3
+
+# Numero di ore più economiche (e più costose) del giorno segnalate
+# dai sensori binari
+DEFAULT_CHEAP_HOURS = 6
+DEFAULT_EXPENSIVE_HOURS = 6
+
+# Modello del prezzo al dettaglio: spread e componenti fisse (€/kWh),
+# perdite di rete e IVA (%)
+DEFAULT_RETAIL_SPREAD = 0.0
+DEFAULT_RETAIL_FIXED = 0.0
+DEFAULT_RETAIL_LOSSES = 0.0
+DEFAULT_RETAIL_VAT = 10.0
+
+# Orario (italiano) di pubblicazione degli esiti MGP del giorno successivo
+PUBLICATION_TIME = time(13, 0)
+
+# Tentativi di aggiornamento: attesa iniziale e massima (minuti), variabilità
+# casuale dell'attesa e ritardo casuale massimo dopo la pubblicazione
+POLL_BACKOFF_START_MINUTES = 5
+POLL_BACKOFF_MAX_MINUTES = 120
+POLL_JITTER = 0.2
+POLL_PUBLICATION_SPREAD_MINUTES = 10
+
+# Indirizzo di download dei prezzi MGP dal sito del GME
+DEFAULT_ENDPOINT = "https://gme.mercatoelettrico.org/DesktopModules/GmeDownload/API/ExcelDownload/downloadzipfile"
+
+# Dimensione massima dell'archivio scaricato (MB), dimensione dei blocchi letti
+# e soglia oltre la quale l'archivio viene spostato dalla memoria su disco
+DEFAULT_MAX_DOWNLOAD_MB = 20
+DOWNLOAD_CHUNK_BYTES = 64 * 1024
+DOWNLOAD_SPOOL_BYTES = 1024 * 1024
+
+# Numero di risposte HTTP ricordate per le richieste condizionali
+HTTP_CACHE_SIZE = 8
+
+# Numero massimo di ricerche della finestra più economica ricordate
+# fino al prossimo download
+CHEAPEST_CACHE_SIZE = 256
 
 # Tipi di aggiornamento
 COORD_EVENT = "coordinator_event"
 EVENT_UPDATE_FASCIA = "event_update_fascia"
 EVENT_UPDATE_PREZZI = "event_update_prezzi"
 EVENT_UPDATE_ORARIO = "event_update_orario"
+EVENT_UPDATE_QUARTO_ORARIO = "event_update_quarto_orario"
+EVENT_UPDATE_STATISTICHE = "event_update_statistiche"
+
+# Finestre di calcolo delle medie (nome visualizzato -> tipo)
+WINDOW_MONTH = "mese"
+WINDOW_DAY = "giorno"
+WINDOW_ROLLING = "rolling"
+WINDOW_WEEK = "settimana"
+WINDOW_BILLING = "fatturazione"
+WINDOWS = {
+    "Mese corrente": WINDOW_MONTH,
+    "Giorno corrente": WINDOW_DAY,
+    "Ultimi N giorni": WINDOW_ROLLING,
+    "Settimana corrente": WINDOW_WEEK,
+    "Ciclo di fatturazione": WINDOW_BILLING,
+}
+WINDOW_NAMES = {tipo: nome for nome, tipo in WINDOWS.items()}
+DEFAULT_WINDOW_DAYS = 30
+
+# Giorni precedenti inclusi all'inizio di una finestra di calendario
+# (salvo CONF_ACTUAL_DATA_ONLY)
+PAD_DAYS = 3
 
 # Parametri configurabili da configuration.yaml
 CONF_ZONE = "zone"
@@ -18,6 +94,19 @@ CONF_CONTRACT = "contract"
 CONF_SCAN_HOUR = "scan_hour"
 CONF_ACTUAL_DATA_ONLY = "actual_data_only"
 CONF_MONTH_AVG = "month_average"
+CONF_WINDOW = "window"
+CONF_WINDOW_DAYS = "window_days"
+CONF_BILLING_DAY = "billing_day"
+CONF_ENDPOINT = "endpoint"
+CONF_MAX_DOWNLOAD_MB = "max_download_mb"
+CONF_CHEAPEST_HOURS = "cheapest_hours"
+CONF_CHEAP_HOURS = "cheap_hours"
+CONF_EXPENSIVE_HOURS = "expensive_hours"
+CONF_RETAIL_SPREAD = "retail_spread"
+CONF_RETAIL_FIXED = "retail_fixed"
+CONF_RETAIL_LOSSES = "retail_losses"
+CONF_RETAIL_VAT = "retail_vat"
+CONF_ENERGY_METER = "energy_meter"
 
 # Parametri interni
 CONF_SCAN_MINUTE = "scan_minute"
@@ -1,10 +1,14 @@
 """Coordinator per pzo_sensor."""
 
+from collections.abc import Mapping, Sequence
 from datetime import date, datetime, timedelta
-import io
+import hashlib
 import logging
+from math import ceil
 import random
-from statistics import mean
+import tempfile
+import time
+from typing import IO, Any
 import zipfile
 
 from aiohttp import ClientSession, ServerConnectionError
@@ -13,30 +17,78 @@ from zoneinfo import ZoneInfo
 from homeassistant.config_entries import ConfigEntry
 from homeassistant.core import HomeAssistant, callback
 from homeassistant.helpers.aiohttp_client import async_get_clientsession
-from homeassistant.helpers.event import async_call_later, async_track_point_in_time
+from homeassistant.helpers.event import async_track_point_in_time
+from homeassistant.helpers.storage import STORAGE_DIR, Store
 from homeassistant.helpers.update_coordinator import DataUpdateCoordinator, UpdateFailed
 import homeassistant.util.dt as dt_util
 
+from .archive import PricesArchive
 from .const import (
-    CONF_ZONE,
-    ZONE_CODES,
-    DEFAULT_ZONE,
-    CONTRACTS,
-    CONF_CONTRACT,
-    DEFAULT_CONTRACT,
+    ARCHIVE_FILE,
+    BACKFILL_MAX_DAYS,
+    CHEAPEST_CACHE_SIZE,
     CONF_ACTUAL_DATA_ONLY,
-    CONF_MONTH_AVG,
+    CONF_BILLING_DAY,
+    CONF_CHEAP_HOURS,
+    CONF_CHEAPEST_HOURS,
+    CONF_CONTRACT,
+    CONF_ENDPOINT,
+    CONF_ENERGY_METER,
+    CONF_EXPENSIVE_HOURS,
+    CONF_MAX_DOWNLOAD_MB,
     CONF_SCAN_HOUR,
     CONF_SCAN_MINUTE,
+    CONF_WINDOW_DAYS,
+    CONF_ZONE,
+    CONTRACTS,
     COORD_EVENT,
+    DEFAULT_CHEAP_HOURS,
+    DEFAULT_CHEAPEST_HOURS,
+    DEFAULT_CONTRACT,
+    DEFAULT_ENDPOINT,
+    DEFAULT_EXPENSIVE_HOURS,
+    DEFAULT_MAX_DOWNLOAD_MB,
+    DEFAULT_WINDOW_DAYS,
+    DEFAULT_ZONE,
     DOMAIN,
+    DOWNLOAD_CHUNK_BYTES,
+    DOWNLOAD_SPOOL_BYTES,
     EVENT_UPDATE_FASCIA,
-    EVENT_UPDATE_PREZZI,
     EVENT_UPDATE_ORARIO,
-    WEB_RETRIES_MINUTES,
+    EVENT_UPDATE_PREZZI,
+    EVENT_UPDATE_QUARTO_ORARIO,
+    EVENT_UPDATE_STATISTICHE,
+    HTTP_CACHE_SIZE,
+    POLL_PUBLICATION_SPREAD_MINUTES,
+    STORAGE_KEY,
+    STORAGE_VERSION,
+    WINDOW_DAY,
+    WINDOWS,
+)
+from .interfaces import (
+    CheapestWindow,
+    Fascia,
+    PriceForecast,
+    PricesData,
+    PricesResult,
+    PricesValues,
+    RetailTariff,
+    RunningMeans,
+)
+from .utils import (
+    extract_days,
+    find_cheapest_window,
+    get_backoff_delay,
+    get_fascia,
+    get_next_date,
+    get_period_means,
+    get_publication_time,
+    get_retail_tariff,
+    get_window,
+    get_window_name,
+    get_zone_codes,
+    process_prices,
 )
-from .interfaces import Fascia, PricesData, PricesValues
-from .utils import extract_xml, get_fascia, get_next_date
 
 # Ottiene il logger
 _LOGGER = logging.getLogger(__name__)
@@ -63,10 +115,41 @@ class PricesDataUpdateCoordinator(DataUpdateCoordinator):
         # Salva la sessione client e la configurazione
         self.session = async_get_clientsession(hass)
 
+        # Archivio locale dei prezzi giornalieri di tutte le zone
+        self.store: Store = Store(hass, STORAGE_VERSION, STORAGE_KEY)
+        self.prezzi_giornalieri: dict[date, Mapping[str, Sequence[float]]] | None = None
+
+        # Archivio storico di tutti i giorni scaricati (non viene mai svuotato)
+        self.archivio_storico = PricesArchive(hass.config.path(STORAGE_DIR, ARCHIVE_FILE))
+
+        # Cache delle risposte HTTP (ETag, Last-Modified e hash del contenuto
+        # dell'ultimo archivio elaborato) indicizzata per URL della richiesta
+        self.http_cache: dict[str, dict[str, str | None]] = {}
+        self.cache_hits = 0
+        self.cache_misses = 0
+
+        # Statistiche degli aggiornamenti (tempi delle singole fasi e contatori)
+        self.statistiche: dict[str, Any] = {
+            "durata_ms": 0.0,
+            "download_byte": 0,
+            "download_ms": 0.0,
+            "file_zip": 0,
+            "parse_ms": 0.0,
+            "parse_ms_file": 0.0,
+            "aggregazione_ms": 0.0,
+            "ritardo_schedulazione_s": 0.0,
+            "ultimo_successo": None,
+            "ultimo_errore": None,
+            "aggiornamenti_riusciti": 0,
+            "aggiornamenti_falliti": 0,
+            "fallimenti_consecutivi": 0,
+        }
+        self.prossimo_aggiornamento: datetime | None = None
+
         # Inizializza i valori di configurazione (dalle opzioni o dalla configurazione iniziale)
-        self.zone = ZONE_CODES[config.options.get(
-            CONF_ZONE, config.data.get(CONF_ZONE, ZONE_CODES[DEFAULT_ZONE])
-        )]
+        self.zones: list[str] = get_zone_codes(config.options.get(
+            CONF_ZONE, config.data.get(CONF_ZONE, [DEFAULT_ZONE])
+        ))
         self.contract = CONTRACTS[config.options.get(
             CONF_CONTRACT, config.data.get(CONF_CONTRACT, CONTRACTS[DEFAULT_CONTRACT])
         )]
@@ -76,8 +159,34 @@ class PricesDataUpdateCoordinator(DataUpdateCoordinator):
         self.scan_hour = config.options.get(
             CONF_SCAN_HOUR, config.data.get(CONF_SCAN_HOUR, 1)
         )
-        self.month_average = config.options.get(
-            CONF_MONTH_AVG, config.data.get(CONF_MONTH_AVG, True)
+        self.window = WINDOWS[get_window_name(config.options, config.data)]
+        self.window_days = config.options.get(
+            CONF_WINDOW_DAYS, config.data.get(CONF_WINDOW_DAYS, DEFAULT_WINDOW_DAYS)
+        )
+        self.billing_day = config.options.get(
+            CONF_BILLING_DAY, config.data.get(CONF_BILLING_DAY, 1)
+        )
+        self.endpoint = config.options.get(
+            CONF_ENDPOINT, config.data.get(CONF_ENDPOINT, DEFAULT_ENDPOINT)
+        )
+        self.max_download_bytes = config.options.get(
+            CONF_MAX_DOWNLOAD_MB, config.data.get(CONF_MAX_DOWNLOAD_MB, DEFAULT_MAX_DOWNLOAD_MB)
+        ) * 1024 * 1024
+        self.cheapest_hours = config.options.get(
+            CONF_CHEAPEST_HOURS, config.data.get(CONF_CHEAPEST_HOURS, DEFAULT_CHEAPEST_HOURS)
+        )
+        self.cheap_hours = config.options.get(
+            CONF_CHEAP_HOURS, config.data.get(CONF_CHEAP_HOURS, DEFAULT_CHEAP_HOURS)
+        )
+        self.expensive_hours = config.options.get(
+            CONF_EXPENSIVE_HOURS, config.data.get(CONF_EXPENSIVE_HOURS, DEFAULT_EXPENSIVE_HOURS)
+        )
+        self.tariffa: RetailTariff | None = get_retail_tariff(config.options, config.data)
+        # Contatore di energia opzionale (rimuovibile dalle opzioni)
+        self.energy_meter: str | None = (
+            config.options.get(CONF_ENERGY_METER)
+            if config.options
+            else config.data.get(CONF_ENERGY_METER)
         )
 
         # Carica il minuto di esecuzione dalla configurazione (o lo crea se non esiste)
@@ -85,10 +194,26 @@ class PricesDataUpdateCoordinator(DataUpdateCoordinator):
         self.update_scan_minutes_from_config(hass=hass, config=config, new_minute=False)
 
         # Inizializza i valori di default
-        self.web_retries = WEB_RETRIES_MINUTES
+        self.poll_attempt = 0
         self.schedule_token = None
-        self.pz_data: PricesData = PricesData()
-        self.pz_values: PricesValues = PricesValues()
+        self.token_orario = None
+        self.token_fascia = None
+        self.chiuso = False
+        self.pz_data: dict[str, PricesData] = {z: PricesData() for z in self.zones}
+        self.pz_values: dict[str, PricesValues] = {z: PricesValues() for z in self.zones}
+        self.previsioni: dict[str, PriceForecast] = {z: PriceForecast() for z in self.zones}
+
+        # Prezzi al dettaglio per fascia e curva dei prezzi al dettaglio
+        self.dettaglio: dict[str, dict[Fascia, float]] = {z: {} for z in self.zones}
+        self.previsioni_dettaglio: dict[str, PriceForecast] = {z: PriceForecast() for z in self.zones}
+
+        # Risultati delle ricerche della finestra più economica
+        # (validi fino alla prossima elaborazione dei prezzi)
+        self.cache_finestre: dict[tuple, CheapestWindow | None] = {}
+
+        # Somme progressive dei giorni inclusi nelle medie di ogni zona
+        # (sostituite da quelle aggiornate da ogni elaborazione)
+        self.medie: dict[str, RunningMeans] = {z: RunningMeans() for z in self.zones}
         self.fascia_corrente: Fascia | None = None
         self.fascia_successiva: Fascia | None = None
         self.prossimo_cambio_fascia: datetime | None = None
@@ -104,6 +229,21 @@ class PricesDataUpdateCoordinator(DataUpdateCoordinator):
         if self.schedule_token is not None:
             self.schedule_token()
             self.schedule_token = None
+        self.prossimo_aggiornamento = None
+
+    def shutdown(self) -> None:
+        """Annulla tutte le schedulazioni (rimozione o ricaricamento dell'integrazione).
+
+        Dopo la chiusura il coordinator non schedula più aggiornamenti e
+        un eventuale aggiornamento in corso non salva i propri risultati.
+        """
+        self.chiuso = True
+        self.clean_tokens()
+        for token in (self.token_orario, self.token_fascia):
+            if token is not None:
+                token()
+        self.token_orario = None
+        self.token_fascia = None
 
     def update_scan_minutes_from_config(
         self, hass: HomeAssistant, config: ConfigEntry, new_minute: bool = False
@@ -135,23 +275,78 @@ class PricesDataUpdateCoordinator(DataUpdateCoordinator):
             # Carica i minuti dalla configurazione
             self.scan_minute = config.data.get(CONF_SCAN_MINUTE, 0)
 
-    async def _async_update_data(self):
-        """Aggiornamento dati a intervalli prestabiliti."""
+    async def _async_load_store(self) -> None:
+        """Carica i prezzi giornalieri salvati in precedenza (una sola volta)."""
+        if self.prezzi_giornalieri is not None:
+            return
 
-        # Calcola l'intervallo di date per il mese corrente
-        date_end = dt_util.now().date() + timedelta(days=1)
-        date_start = date(date_end.year, date_end.month, 1) if self.month_average else date_end
+        self.prezzi_giornalieri = {}
+        stored = await self.store.async_load()
+        if not stored:
+            return
 
-        # All'inizio del mese, aggiunge i valori del mese precedente
-        # a meno che CONF_ACTUAL_DATA_ONLY non sia impostato
-        if (not self.actual_data_only) and (date_end.day < 4):
-            date_start = date_start - timedelta(days=3)
+        for giorno, prezzi in stored.get("giorni", {}).items():
+            self.prezzi_giornalieri[datetime.strptime(giorno, "%Y%m%d").date()] = prezzi
+        self.http_cache = stored.get("http_cache", {})
+        _LOGGER.debug(
+            "%s giorni caricati dall'archivio locale.", len(self.prezzi_giornalieri)
+        )
+
+    async def _async_save_store(self) -> None:
+        """Salva i prezzi giornalieri e la cache HTTP nell'archivio locale."""
+        await self.store.async_save(
+            {
+                "giorni": {
+                    giorno.strftime("%Y%m%d"): {z: list(p) for z, p in prezzi.items()}
+                    for giorno, prezzi in self.prezzi_giornalieri.items()
+                },
+                "http_cache": self.http_cache,
+            }
+        )
+
+    def get_window(self) -> tuple[date, date]:
+        """Restituisce il primo e l'ultimo giorno della finestra di calcolo delle medie."""
+        return get_window(
+            self.window,
+            dt_util.now().date(),
+            self.window_days,
+            self.billing_day,
+            self.actual_data_only,
+        )
+
+    def in_window(self, giorno: date) -> bool:
+        """Indica se il giorno è incluso nelle medie correnti."""
+        inizio, fine = self.get_window()
+        return inizio <= giorno <= fine
+
+    def _get_date_range(self) -> tuple[date, date]:
+        """Restituisce l'intervallo di date necessario per il calcolo delle medie (fino a domani)."""
+        date_start, _ = self.get_window()
+        return date_start, dt_util.now().date() + timedelta(days=1)
+
+    async def _async_download_archive(
+        self, date_start: date, date_end: date, condizionale: bool = True
+    ) -> tuple[IO[bytes] | None, tuple[str, dict[str, str | None]] | None]:
+        """Scarica l'archivio ZIP con gli XML dei prezzi per l'intervallo indicato.
+
+        Il contenuto viene letto a blocchi in un file temporaneo (in memoria fino
+        a DOWNLOAD_SPOOL_BYTES, poi su disco, scritto a lotti in un executor) e
+        interrotto oltre la dimensione massima.
+
+        Se condizionale, la richiesta è condizionale rispetto all'ultima
+        risposta elaborata per lo stesso URL: se il server risponde 304, o il
+        contenuto ha lo stesso hash, restituisce None come archivio (nulla da
+        elaborare). Restituisce anche la nuova voce di cache, da salvare solo
+        dopo l'elaborazione (None con il 304, che non la modifica).
+        Altrimenti scarica sempre l'archivio, senza usare né modificare la
+        cache e le relative statistiche.
+        """
 
         start_date_param = date_start.strftime("%Y%m%d")
         end_date_param = date_end.strftime("%Y%m%d")
 
-        # URL del sito Mercato elettrico
-        download_url = f"https://gme.mercatoelettrico.org/DesktopModules/GmeDownload/API/ExcelDownload/downloadzipfile?DataInizio={start_date_param}&DataFine={end_date_param}&Date={end_date_param}&Mercato=MGP&Settore=Prezzi&FiltroDate=InizioFine"
+        # URL del sito Mercato elettrico (o di quello configurato)
+        download_url = f"{self.endpoint}?DataInizio={start_date_param}&DataFine={end_date_param}&Date={end_date_param}&Mercato=MGP&Settore=Prezzi&FiltroDate=InizioFine"
 
         # Imposta gli header della richiesta per i prezzi
         heads = {
@@ -167,11 +362,26 @@ class PricesDataUpdateCoordinator(DataUpdateCoordinator):
             "userid": "-1",
         }
 
+        # Aggiunge gli header condizionali dell'ultima risposta elaborata
+        cache = self.http_cache.get(download_url, {}) if condizionale else {}
+        if cache.get("etag"):
+            heads["If-None-Match"] = cache["etag"]
+        if cache.get("last_modified"):
+            heads["If-Modified-Since"] = cache["last_modified"]
+
         # Effettua il download dello ZIP con i file XML
-        _LOGGER.debug(f"Inizio download file ZIP con XML.")
+        _LOGGER.debug(
+            "Inizio download file ZIP con XML (dal %s al %s).",
+            start_date_param,
+            end_date_param,
+        )
         async with self.session.get(download_url, headers=heads) as response:
-            # Aspetta la request
-            bytes_response = await response.read()
+            # Archivio non modificato dall'ultima elaborazione
+            if response.status == 304:
+                self.cache_hits += 1
+                self.statistiche["download_byte"] = 0
+                _LOGGER.debug("Archivio non modificato (304), elaborazione saltata.")
+                return None, None
 
             # Se la richiesta NON e' andata a buon fine ritorna l'errore subito
             if response.status != 200:
@@ -180,58 +390,363 @@ class PricesDataUpdateCoordinator(DataUpdateCoordinator):
                     f"Richiesta fallita con errore {response.status}"
                 )
 
-            # La richiesta e' andata a buon fine, tenta l'estrazione
-            try:
-                archive = zipfile.ZipFile(io.BytesIO(bytes_response), "r")
-
-            # Ritorna error se l'output non è uno ZIP, o ha un errore IO
-            except (zipfile.BadZipfile, OSError) as e:  # not a zip:
-                _LOGGER.error(
-                    "Download fallito con URL: %s, lunghezza %s, risposta %s",
-                    download_url,
-                    response.content_length,
-                    response.status,
+            # Verifica subito la dimensione dichiarata
+            if (response.content_length or 0) > self.max_download_bytes:
+                raise UpdateFailed(
+                    f"Archivio troppo grande ({response.content_length} byte)."
                 )
-                raise UpdateFailed("Archivio ZIP scaricato dal sito non valido.") from e
 
-            # Mostra i file nell'archivio
-            nFile = archive.namelist()
-            _LOGGER.debug(
-                "%s file trovati nell'archivio (%s)",
-                len(nFile),
-                ", ".join(str(fn) for fn in nFile),
+            # Legge la risposta a blocchi, senza tenerla tutta in memoria
+            archivio = tempfile.SpooledTemporaryFile(max_size=DOWNLOAD_SPOOL_BYTES)
+            dimensione = 0
+            impronta = hashlib.sha256()
+            in_sospeso: list[bytes] = []
+            byte_in_sospeso = 0
+            try:
+                async for blocco in response.content.iter_chunked(DOWNLOAD_CHUNK_BYTES):
+                    dimensione += len(blocco)
+                    if dimensione > self.max_download_bytes:
+                        raise UpdateFailed(
+                            f"Archivio oltre la dimensione massima ({self.max_download_bytes} byte)."
+                        )
+                    impronta.update(blocco)
+                    if dimensione <= DOWNLOAD_SPOOL_BYTES:
+                        # File ancora in memoria: scrittura diretta, senza I/O su disco
+                        archivio.write(blocco)
+                        continue
+
+                    # Oltre la soglia il file passa su disco: scrive a lotti
+                    # in un executor per non bloccare il loop di Home Assistant
+                    in_sospeso.append(blocco)
+                    byte_in_sospeso += len(blocco)
+                    if byte_in_sospeso >= DOWNLOAD_SPOOL_BYTES:
+                        await self.hass.async_add_executor_job(archivio.writelines, in_sospeso)
+                        in_sospeso = []
+                        byte_in_sospeso = 0
+                if in_sospeso:
+                    await self.hass.async_add_executor_job(archivio.writelines, in_sospeso)
+            except BaseException:
+                archivio.close()
+                raise
+
+            voce = {
+                "etag": response.headers.get("ETag"),
+                "last_modified": response.headers.get("Last-Modified"),
+                "hash": impronta.hexdigest(),
+            }
+
+        _LOGGER.debug("Scaricati %s byte.", dimensione)
+        if not condizionale:
+            return archivio, None
+        self.statistiche["download_byte"] = dimensione
+
+        # Contenuto identico all'ultimo elaborato: non serve decodificarlo, ma
+        # la voce di cache viene aggiornata con i nuovi ETag e Last-Modified
+        # perché le prossime richieste possano ricevere un 304
+        if voce["hash"] == cache.get("hash"):
+            archivio.close()
+            self.cache_hits += 1
+            _LOGGER.debug("Archivio identico al precedente, elaborazione saltata.")
+            return None, (download_url, voce)
+
+        self.cache_misses += 1
+        return archivio, (download_url, voce)
+
+    def _get_giorni_mancanti(self, date_start: date, date_end: date) -> tuple[list[date], date]:
+        """Restituisce i giorni dell'intervallo da scaricare e l'ultimo giorno richiedibile.
+
+        Prima della pubblicazione degli esiti MGP non richiede i prezzi di domani.
+        """
+        oggi = date_end - timedelta(days=1)
+        fine_download = date_end
+        if dt_util.now(time_zone=time_zone) < get_publication_time(oggi):
+            fine_download = oggi
+
+        # Determina i giorni dell'intervallo non ancora presenti nell'archivio locale
+        giorni_mancanti = [
+            date_start + timedelta(days=n)
+            for n in range((fine_download - date_start).days + 1)
+            if any(
+                z not in (self.prezzi_giornalieri or {}).get(date_start + timedelta(days=n), {})
+                for z in self.zones
             )
+        ]
+        return giorni_mancanti, fine_download
+
+    def _apply_result(self, risultato: PricesResult) -> None:
+        """Aggiorna i prezzi per fascia di ogni zona con quelli elaborati."""
+        for zone in self.zones:
+            self.pz_data[zone] = risultato.data[zone]
+            self.pz_values[zone].value.update(risultato.value[zone])
+            self.previsioni[zone] = risultato.previsioni[zone]
+            self.dettaglio[zone] = dict(risultato.dettaglio.get(zone, {}))
+            self.previsioni_dettaglio[zone] = risultato.previsioni_dettaglio.get(zone, PriceForecast())
+            if zone in risultato.medie:
+                self.medie[zone] = risultato.medie[zone]
+        self.cache_finestre.clear()
+        self.update_periodo_corrente()
+
+    async def async_restore(self) -> bool:
+        """Ripristina i prezzi dall'archivio locale, senza accedere al sito.
+
+        Ricalcola le medie dai prezzi giornalieri salvati (pochi millisecondi)
+        e restituisce True se l'archivio contiene già tutti i giorni necessari,
+        cioè se non serve alcun download.
+        """
+        await self._async_load_store()
+        if not self.prezzi_giornalieri:
+            return False
+
+        # Riporta nell'archivio storico i giorni salvati (anche quelli
+        # scaricati prima che l'archivio esistesse)
+        await self.hass.async_add_executor_job(
+            self.archivio_storico.add_days, self.prezzi_giornalieri
+        )
 
-        # Estrae i dati dall'archivio
-        self.pz_data.data = extract_xml(archive, self.pz_data.data, self.zone, self.month_average)
-        archive.close()
-        
-        # Per ogni fascia, calcola il valore dei prezzi zonali
-        for fascia, pz_list in self.pz_data.data.items():
-            # Calcola le fasce facendo la media dei prezzi orari che le compongono
-            if fascia == Fascia.ORARIA:
-                self.pz_values.value[fascia] = pz_list[datetime.now().hour]
-                self.pz_values.value[Fascia.MONO] = mean(self.pz_data.data[fascia])
-            else:
-                if len(self.pz_data.data[fascia]) > 0:
-                    self.pz_values.value[fascia] = mean(self.pz_data.data[fascia])
-                else:
-                    self.pz_values.value[fascia] = 0
+        date_start, date_end = self._get_date_range()
+        risultato = await self.hass.async_add_executor_job(
+            process_prices,
+            None,
+            self.prezzi_giornalieri,
+            self.zones,
+            date_start,
+            date_end,
+            date_end - timedelta(days=1),
+            self.get_window()[1],
+            dict(self.medie),
+            self.tariffa,
+        )
+        self._apply_result(risultato)
+
+        giorni_mancanti, _ = self._get_giorni_mancanti(date_start, date_end)
+        _LOGGER.debug(
+            "Prezzi ripristinati dall'archivio locale (%s giorni mancanti).",
+            len(giorni_mancanti),
+        )
+        return not giorni_mancanti
 
-        # Calcola la fascia F23
-        self.pz_values.value[Fascia.F23] = self.pz_values.value[Fascia.F2] * 0.46 + self.pz_values.value[Fascia.F3] * 0.54
+    async def _async_update_data(self):
+        """Aggiornamento dati a intervalli prestabiliti."""
 
-        # Logga i dati
+        # Carica i prezzi già scaricati in precedenza
+        await self._async_load_store()
+
+        date_start, date_end = self._get_date_range()
+        oggi = date_end - timedelta(days=1)
+        giorni_mancanti, fine_download = self._get_giorni_mancanti(date_start, date_end)
+
+        # Scarica solo i giorni mancanti (includendo sempre oggi, che è
+        # sicuramente pubblicato, per non richiedere un intervallo vuoto)
+        archivio: IO[bytes] | None = None
+        nuova_cache = None
+        inizio_richiesta = min([*giorni_mancanti, oggi])
+        inizio_download = time.perf_counter()
+        self.statistiche["download_byte"] = 0
+        if giorni_mancanti:
+            archivio, nuova_cache = await self._async_download_archive(
+                inizio_richiesta, fine_download
+            )
+        else:
+            _LOGGER.debug("Tutti i giorni richiesti sono già presenti nell'archivio locale.")
+        self.statistiche["download_ms"] = (time.perf_counter() - inizio_download) * 1000
+
+        # Decodifica l'archivio e calcola le medie fuori dal loop di Home Assistant
+        inizio_elaborazione = time.perf_counter()
+        try:
+            risultato = await self.hass.async_add_executor_job(
+                process_prices,
+                archivio,
+                self.prezzi_giornalieri,
+                self.zones,
+                date_start,
+                date_end,
+                oggi,
+                self.get_window()[1],
+                dict(self.medie),
+                self.tariffa,
+            )
+
+        # Ritorna error se l'output non è uno ZIP, o ha un errore IO
+        except (zipfile.BadZipfile, OSError) as e:  # not a zip:
+            _LOGGER.error(
+                "Download fallito dal %s al %s",
+                inizio_richiesta,
+                fine_download,
+            )
+            raise UpdateFailed("Archivio ZIP scaricato dal sito non valido.") from e
+
+        # Libera subito il file temporaneo
+        finally:
+            if archivio is not None:
+                archivio.close()
+
+        self.statistiche.update(risultato.statistiche)
+        self.statistiche["durata_ms"] = (time.perf_counter() - inizio_download) * 1000
         _LOGGER.debug(
-            f"Valori prezzi zonali ({self.zone}): " + "%s",
-            ", ".join(
-                f"{prezzo} ({fascia.value})"
-                for fascia, prezzo in self.pz_values.value.items()
-            ),
+            "Elaborazione prezzi completata in %.1f ms (%s giorni estratti).",
+            (time.perf_counter() - inizio_elaborazione) * 1000,
+            len(risultato.giorni),
+        )
+
+        if nuova_cache is not None:
+            # Ricorda l'archivio elaborato (solo le richieste più recenti)
+            url, voce = nuova_cache
+            self.http_cache.pop(url, None)
+            self.http_cache[url] = voce
+            while len(self.http_cache) > HTTP_CACHE_SIZE:
+                del self.http_cache[next(iter(self.http_cache))]
+
+        if self.chiuso:
+            # Integrazione rimossa durante il download: i risultati
+            # appartengono al nuovo coordinator
+            raise UpdateFailed("Integrazione rimossa durante l'aggiornamento.")
+
+        if risultato.giorni:
+            # Aggiunge i nuovi giorni all'archivio storico
+            await self.hass.async_add_executor_job(
+                self.archivio_storico.add_days, risultato.giorni
+            )
+
+        if risultato.giorni or nuova_cache is not None:
+            # Unisce i nuovi giorni a quelli salvati, rimuove quelli non più
+            # necessari e salva l'archivio locale
+            self.prezzi_giornalieri.update(risultato.giorni)
+            for giorno in [g for g in self.prezzi_giornalieri if g < date_start]:
+                del self.prezzi_giornalieri[giorno]
+            await self._async_save_store()
+
+        # Aggiorna i prezzi per fascia di ogni zona
+        self._apply_result(risultato)
+
+        # Logga i dati
+        for zone in self.zones:
+            _LOGGER.debug(
+                f"Valori prezzi zonali ({zone}): " + "%s",
+                ", ".join(
+                    f"{prezzo} ({fascia.value})"
+                    for fascia, prezzo in self.pz_values[zone].value.items()
+                ),
+            )
+
+    async def async_query_period(self, inizio: date, fine: date, zona: str) -> dict[str, Any]:
+        """Calcola le medie per fascia di un periodo qualsiasi dall'archivio storico."""
+        giorni = await self.hass.async_add_executor_job(
+            self.archivio_storico.get_days, inizio, fine, zona
+        )
+        medie = await self.hass.async_add_executor_job(
+            get_period_means, giorni, inizio, fine
+        )
+        return {
+            "zona": zona,
+            "inizio": inizio.isoformat(),
+            "fine": fine.isoformat(),
+            "giorni": len(giorni),
+            "giorni_mancanti": [
+                giorno.isoformat()
+                for giorno in (
+                    inizio + timedelta(days=n) for n in range((fine - inizio).days + 1)
+                )
+                if giorno not in giorni
+            ],
+            "prezzi": {fascia.value: medie[fascia] for fascia in medie},
+        }
+
+    def current_rank(self, zona: str) -> tuple[int, int] | None:
+        """Restituisce la posizione del prezzo corrente nella classifica del giorno e il numero di periodi.
+
+        La classifica è calcolata una volta per download (vedi build_forecast).
+        """
+        return self.previsioni[zona].rank_at(dt_util.utcnow().timestamp())
+
+    def cheapest_window(
+        self,
+        zona: str,
+        durata: timedelta,
+        inizio: datetime | None = None,
+        scadenza: datetime | None = None,
+        contigua: bool = True,
+    ) -> CheapestWindow | None:
+        """Cerca il periodo più economico di oggi e domani per la zona indicata.
+
+        La ricerca parte dal primo quarto d'ora successivo a inizio (default:
+        adesso) e termina a scadenza (default: fine dei prezzi disponibili);
+        la durata è arrotondata per eccesso al quarto d'ora. I risultati
+        sono memorizzati fino alla prossima elaborazione dei prezzi.
+        """
+        previsioni = self.previsioni[zona]
+        primo = previsioni.quarter_index(
+            (inizio or dt_util.now()).timestamp(), successivo=True
+        )
+        ultimo = (
+            len(previsioni.quarti)
+            if scadenza is None
+            else previsioni.quarter_index(scadenza.timestamp())
+        )
+        numero = ceil(durata.total_seconds() / 900)
+
+        chiave = (zona, primo, ultimo, numero, contigua)
+        if chiave not in self.cache_finestre:
+            if len(self.cache_finestre) >= CHEAPEST_CACHE_SIZE:
+                self.cache_finestre.clear()
+            self.cache_finestre[chiave] = find_cheapest_window(
+                previsioni, primo, ultimo, numero, contigua
+            )
+        return self.cache_finestre[chiave]
+
+    async def async_backfill(self, inizio: date, fine: date) -> int:
+        """Scarica i prezzi di un intervallo con una sola richiesta e li aggiunge all'archivio storico.
+
+        Restituisce il numero di giorni aggiunti.
+        """
+        if fine < inizio or (fine - inizio).days >= BACKFILL_MAX_DAYS:
+            raise ValueError(
+                f"Intervallo non valido (massimo {BACKFILL_MAX_DAYS} giorni)."
+            )
+
+        # Richiesta non condizionale: l'archivio storico potrebbe non contenere
+        # i giorni di un archivio già elaborato per le medie
+        archivio, _ = await self._async_download_archive(inizio, fine, condizionale=False)
+        try:
+            giorni = await self.hass.async_add_executor_job(extract_days, archivio)
+        except zipfile.BadZipFile as e:
+            _LOGGER.error("Recupero dei prezzi fallito dal %s al %s", inizio, fine)
+            raise UpdateFailed("Archivio ZIP scaricato dal sito non valido.") from e
+        finally:
+            archivio.close()
+
+        await self.hass.async_add_executor_job(self.archivio_storico.add_days, giorni)
+        _LOGGER.info(
+            "Archivio storico: aggiunti %s giorni (dal %s al %s).", len(giorni), inizio, fine
         )
+        return len(giorni)
+
+    def update_periodo_corrente(self) -> None:
+        """Imposta i prezzi dell'ora e del quarto d'ora correnti per ogni zona.
+
+        Il periodo corrente è individuato dall'istante UTC. Con la finestra
+        del giorno corrente i prezzi sono quelli del periodo di mercato (distinti
+        anche nell'ora ripetuta del cambio d'ora); con le altre finestre sono
+        le medie della posizione del periodo nel giorno.
+        """
+        istante = dt_util.utcnow()
+        locale = istante.astimezone(time_zone)
+        quarto = locale.hour * 4 + locale.minute // 15
+        for zone in self.zones:
+            orario = quarto_orario = None
+            if self.window == WINDOW_DAY:
+                orario = self.previsioni[zone].hour_price_at(istante.timestamp())
+                quarto_orario = self.previsioni[zone].price_at(istante.timestamp())
+            self.pz_values[zone].value[Fascia.ORARIA] = (
+                orario if orario is not None else self.pz_data[zone].orario[locale.hour]
+            )
+            self.pz_values[zone].value[Fascia.QUARTO_ORARIA] = (
+                quarto_orario if quarto_orario is not None else self.pz_data[zone].quarti[quarto]
+            )
 
     async def update_orario(self, now=None):
-        """Aggiorna i dati orari."""
+        """Aggiorna i dati orari e al quarto d'ora."""
+
+        adesso = dt_util.now(time_zone=time_zone)
 
         # Solo quando l'intergrazione non è appena stata avviata
         if self.fascia_corrente:
@@ -242,21 +757,32 @@ class PricesDataUpdateCoordinator(DataUpdateCoordinator):
             )
             _LOGGER.debug(
                 "Ora corrente fuso orario italiano: %s",
-                dt_util.now(time_zone=time_zone).strftime("%a %d/%m/%Y %H:%M:%S %z"),
+                adesso.strftime("%a %d/%m/%Y %H:%M:%S %z"),
             )
 
-            # Modifica il valore corrente
-            self.pz_values.value[Fascia.ORARIA] = self.pz_data.data[Fascia.ORARIA][datetime.now().hour]
-
-            # Notifica che i dati sono stati aggiornati (orario)
-            self.async_set_updated_data({COORD_EVENT: EVENT_UPDATE_ORARIO})
+            # Modifica il valore corrente di ogni zona
+            self.update_periodo_corrente()
+
+            # Notifica che i dati sono stati aggiornati (orario allo scoccare
+            # dell'ora, altrimenti solo quarto d'ora)
+            self.async_set_updated_data(
+                {
+                    COORD_EVENT: EVENT_UPDATE_ORARIO
+                    if adesso.minute < 15
+                    else EVENT_UPDATE_QUARTO_ORARIO
+                }
+            )
 
-        # Schedula la prossima esecuzione
-        time = datetime.now(tz = time_zone)
-        time = time.replace(hour = (time.hour + 1) % 24, minute = 0, second = 0)
-        async_track_point_in_time(
-            self.hass, self.update_orario, time
-        )
+        # Schedula la prossima esecuzione al prossimo quarto d'ora, calcolato
+        # in UTC per non saltare o ripetere periodi al cambio dell'ora legale
+        adesso_utc = dt_util.utcnow()
+        prossimo_quarto = adesso_utc.replace(
+            minute=adesso_utc.minute // 15 * 15, second=0, microsecond=0
+        ) + timedelta(minutes=15)
+        if not self.chiuso:
+            self.token_orario = async_track_point_in_time(
+                self.hass, self.update_orario, prossimo_quarto
+            )
 
     async def update_fascia(self, now=None):
         """Aggiorna la fascia oraria corrente."""
@@ -291,76 +817,70 @@ class PricesDataUpdateCoordinator(DataUpdateCoordinator):
         self.async_set_updated_data({COORD_EVENT: EVENT_UPDATE_FASCIA})
 
         # Schedula la prossima esecuzione
-        async_track_point_in_time(
-            self.hass, self.update_fascia, self.prossimo_cambio_fascia
+        if not self.chiuso:
+            self.token_fascia = async_track_point_in_time(
+                self.hass, self.update_fascia, self.prossimo_cambio_fascia
+            )
+
+    def domani_disponibile(self) -> bool:
+        """Indica se i prezzi di domani sono già presenti per tutte le zone."""
+        domani = self._get_date_range()[1]
+        return all(
+            z in (self.prezzi_giornalieri or {}).get(domani, {}) for z in self.zones
         )
 
-    async def update_prezzi(self, now=None):
-        """Aggiorna i prezzi da Internet (funziona solo se schedulata)."""
-        # Aggiorna i dati da web
-        try:
-            # Esegue l'aggiornamento
-            await self._async_update_data()
+    def schedule_prezzi(self, errore: Exception | None = None) -> None:
+        """Schedula il prossimo aggiornamento web.
 
-            # Se non ci sono eccezioni, ha avuto successo
-            # Ricarica i tentativi per la prossima esecuzione
-            self.web_retries = WEB_RETRIES_MINUTES
+        Se i prezzi di domani sono già disponibili non effettua altri tentativi
+        fino al ricalcolo giornaliero (all'ora configurata); prima della
+        pubblicazione degli esiti MGP attende l'orario di pubblicazione,
+        dopo (o in caso di errore) riprova con attesa esponenziale.
+        """
+        if self.chiuso:
+            # Integrazione rimossa: nessun altro aggiornamento
+            return
 
-        # Errore nel fetch dei dati se la response non e' 200
-        # pylint: disable=broad-exception-caught
-        except (Exception, UpdateFailed, ServerConnectionError) as e:
-            # Errori durante l'esecuzione dell'aggiornamento, riprova dopo
-            # Annulla eventuali schedulazioni attive
-            self.clean_tokens()
+        adesso = dt_util.now(time_zone=time_zone)
 
-            # Prepara la schedulazione
-            if self.web_retries:
-                # Minuti dopo
-                retry_in_minutes = self.web_retries.pop(0)
+        # Ricalcolo giornaliero delle medie all'ora configurata
+        giornaliero = get_next_date(
+            dataora=adesso, ora=self.scan_hour, minuto=self.scan_minute
+        )
+        if giornaliero <= adesso:
+            # Se l'evento è già trascorso, passa a domani alla stessa ora
+            giornaliero = get_next_date(
+                dataora=adesso, ora=self.scan_hour, minuto=self.scan_minute, offset=1
+            )
+
+        pubblicazione = get_publication_time(adesso.date())
+        if errore is None and self.domani_disponibile():
+            # Dati completi: nessun tentativo fino al giorno dopo
+            self.poll_attempt = 0
+            next_update = giornaliero
+        elif errore is None and adesso < pubblicazione:
+            # Esiti di domani non ancora pubblicati: attende la pubblicazione
+            # (con un ritardo casuale per non sovraccaricare il sito)
+            self.poll_attempt = 0
+            next_update = pubblicazione + timedelta(
+                minutes=random.uniform(0, POLL_PUBLICATION_SPREAD_MINUTES)
+            )
+        else:
+            # Errore o prezzi di domani non ancora presenti: riprova più tardi
+            attesa = get_backoff_delay(self.poll_attempt)
+            self.poll_attempt += 1
+            if errore is not None:
                 _LOGGER.warning(
-                    "Errore durante l'aggiornamento dei dati, nuovo tentativo tra %s minut%s.",
-                    retry_in_minutes,
-                    "o" if retry_in_minutes == 1 else "i",
-                    exc_info=e,
-                )
-                self.schedule_token = async_call_later(
-                    self.hass, timedelta(minutes=retry_in_minutes), self.update_prezzi
+                    "Errore durante l'aggiornamento dei dati, nuovo tentativo tra %s minuti.",
+                    round(attesa.total_seconds() / 60),
+                    exc_info=errore,
                 )
             else:
-                # Tentativi esauriti, passa al giorno dopo
-                _LOGGER.error(
-                    "Errore durante l'aggiornamento via web, tentativi esauriti.",
-                    exc_info=e,
-                )
-                next_update = get_next_date(
-                    dataora=dt_util.now(time_zone=time_zone),
-                    ora=self.scan_hour,
-                    minuto=self.scan_minute,
-                    offset=1,
-                )
-                self.schedule_token = async_track_point_in_time(
-                    self.hass, self.update_prezzi, next_update
-                )
                 _LOGGER.debug(
-                    "Prossimo aggiornamento web: %s",
-                    next_update.strftime("%d/%m/%Y %H:%M:%S %z"),
+                    "Prezzi di domani non ancora disponibili, nuovo tentativo tra %s minuti.",
+                    round(attesa.total_seconds() / 60),
                 )
-
-            # Esce e attende la prossima schedulazione
-            return
-
-        # Notifica che i dati PUN sono stati aggiornati con successo
-        self.async_set_updated_data({COORD_EVENT: EVENT_UPDATE_PREZZI})
-
-        # Calcola la data della prossima esecuzione
-        next_update = get_next_date(
-            dataora=dt_util.now(time_zone=time_zone),
-            ora=self.scan_hour,
-            minuto=self.scan_minute,
-        )
-        if next_update <= dt_util.now():
-            # Se l'evento è già trascorso, passa a domani alla stessa ora
-            next_update = next_update + timedelta(days=1)
+            next_update = min(adesso + attesa, giornaliero)
 
         # Annulla eventuali schedulazioni attive
         self.clean_tokens()
@@ -369,7 +889,48 @@ class PricesDataUpdateCoordinator(DataUpdateCoordinator):
         self.schedule_token = async_track_point_in_time(
             self.hass, self.update_prezzi, next_update
         )
+        self.prossimo_aggiornamento = next_update
         _LOGGER.debug(
             "Prossimo aggiornamento web: %s",
             next_update.strftime("%d/%m/%Y %H:%M:%S %z"),
         )
+
+    async def update_prezzi(self, now=None):
+        """Aggiorna i prezzi da Internet (funziona solo se schedulata)."""
+
+        # Ritardo rispetto all'orario schedulato
+        if self.prossimo_aggiornamento is not None:
+            self.statistiche["ritardo_schedulazione_s"] = (
+                dt_util.utcnow() - self.prossimo_aggiornamento
+            ).total_seconds()
+
+        # Aggiorna i dati da web
+        try:
+            # Esegue l'aggiornamento
+            await self._async_update_data()
+
+        # Errore nel fetch dei dati se la response non e' 200
+        # pylint: disable=broad-exception-caught
+        except (Exception, UpdateFailed, ServerConnectionError) as e:
+            self.statistiche["aggiornamenti_falliti"] += 1
+            self.statistiche["fallimenti_consecutivi"] += 1
+            self.statistiche["ultimo_errore"] = f"{type(e).__name__}: {e}"
+
+            # Errori durante l'esecuzione dell'aggiornamento, riprova dopo
+            self.schedule_prezzi(errore=e)
+
+            # Notifica solo l'aggiornamento delle statistiche
+            self.async_set_updated_data({COORD_EVENT: EVENT_UPDATE_STATISTICHE})
+
+            # Esce e attende la prossima schedulazione
+            return
+
+        self.statistiche["aggiornamenti_riusciti"] += 1
+        self.statistiche["fallimenti_consecutivi"] = 0
+        self.statistiche["ultimo_successo"] = dt_util.now()
+
+        # Notifica che i dati PUN sono stati aggiornati con successo
+        self.async_set_updated_data({COORD_EVENT: EVENT_UPDATE_PREZZI})
+
+        # Schedula la prossima esecuzione
+        self.schedule_prezzi()
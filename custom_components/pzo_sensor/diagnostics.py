@@ -0,0 +1,33 @@
+"""Diagnostica dell'integrazione prezzi zonali."""
+
+from typing import Any
+
+from homeassistant.config_entries import ConfigEntry
+from homeassistant.core import HomeAssistant
+
+from .const import DOMAIN
+from .coordinator import PricesDataUpdateCoordinator
+
+
+async def async_get_config_entry_diagnostics(
+    hass: HomeAssistant, config: ConfigEntry
+) -> dict[str, Any]:
+    """Restituisce i dati diagnostici della configurazione."""
+
+    coordinator: PricesDataUpdateCoordinator = hass.data[DOMAIN][config.entry_id]
+
+    return {
+        "zone": coordinator.zones,
+        "giorni_salvati": len(coordinator.prezzi_giornalieri or {}),
+        "giorni_archivio_storico": await hass.async_add_executor_job(
+            coordinator.archivio_storico.count_days
+        ),
+        "statistiche": coordinator.statistiche,
+        "prossimo_aggiornamento": coordinator.prossimo_aggiornamento,
+        "tentativi": coordinator.poll_attempt,
+        "cache_http": {
+            "hit": coordinator.cache_hits,
+            "miss": coordinator.cache_misses,
+            "voci": coordinator.http_cache,
+        },
+    }
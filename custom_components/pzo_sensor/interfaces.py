@@ -1,6 +1,15 @@
 """Interfacce di gestione di pzo_sensor."""
 
+from array import array
+from bisect import bisect_right
+from collections.abc import Iterator, Mapping, Sequence
+from datetime import date, datetime
 from enum import Enum
+from itertools import compress
+from math import ceil, floor
+from types import MappingProxyType
+from typing import Any, NamedTuple
+
 
 class Fascia(Enum):
     """Enumerazione con i tipi di fascia oraria."""
@@ -12,29 +21,500 @@ class Fascia(Enum):
     F23 = "F23"
     ORARIA = "ORARIA"
     ORARIA_NEXT = "ORARIA_NEXT"
+    QUARTO_ORARIA = "QUARTO_ORARIA"
+
+
+# Codici delle fasce nell'array delle etichette di PricesData
+CODICI_FASCE: dict[Fascia, int] = {Fascia.F1: 1, Fascia.F2: 2, Fascia.F3: 3, Fascia.F23: 4}
+FASCE_DA_CODICE: dict[int, Fascia] = {codice: fascia for fascia, codice in CODICI_FASCE.items()}
+
+# Tabelle di traduzione etichetta -> maschera (1 = prezzo della fascia, 0 = altro)
+_MASCHERE_FASCE: dict[Fascia, bytes] = {
+    fascia: bytes(1 if i == codice else 0 for i in range(256))
+    for fascia, codice in CODICI_FASCE.items()
+}
+
+
+def hourly_means(profilo: Sequence[float]) -> array:
+    """Riduce un profilo giornaliero (24 o 96 periodi) alle 24 medie orarie."""
+    fattore = 4 if len(profilo) > 25 else 1
+    return array(
+        "d", (sum(profilo[ora * fattore : (ora + 1) * fattore]) / fattore for ora in range(24))
+    )
+
+
+def quarter_values(profilo: Sequence[float]) -> array:
+    """Espande un profilo giornaliero (24 o 96 periodi) ai 96 quarti d'ora."""
+    if len(profilo) > 25:
+        return array("d", profilo)
+    return array("d", (prezzo for prezzo in profilo for _ in range(4)))
+
+
+def slot_profile(prezzi: Sequence[float], slot: bytes, periodi: int) -> array:
+    """Calcola la media dei prezzi per posizione nel giorno (0 se non ci sono dati).
+
+    Nei giorni di 25 ore l'ora ripetuta viene mediata, in quelli di 23 ore
+    l'ora mancante non contribuisce.
+    """
+    somme = [0.0] * periodi
+    conteggi = [0] * periodi
+    for prezzo, posizione in zip(prezzi, slot, strict=True):
+        somme[posizione] += prezzo
+        conteggi[posizione] += 1
+    return array(
+        "d", (somma / n if n else 0.0 for somma, n in zip(somme, conteggi, strict=True))
+    )
 
 
 class PricesData:
-    """Classe che contiene i valori del prezzi orari per ciascuna fascia."""
+    """Classe che contiene i valori del prezzi per ciascuna fascia.
+
+    Le medie correnti delle zone sono calcolate con RunningMeans e qui
+    sono riportati solo i profili orari e al quarto d'ora. Per le
+    aggregazioni una tantum (aggregate_prices, ad esempio le medie di un
+    periodo dell'archivio storico) i prezzi dei giorni inclusi sono salvati
+    in un unico array contiguo di float, un valore per periodo di mercato
+    (24 all'ora o 96 al quarto d'ora per giorno, 23/25 o 92/100 nei giorni
+    del cambio d'ora), affiancato da un array della stessa forma con il
+    codice della fascia di ciascun prezzo. Le medie per fascia e il profilo
+    giornaliero sono calcolati con riduzioni mascherate sugli array.
+    """
+
+    def __init__(self, periodi: int = 24):
+        """Inizializza i prezzi vuoti con il numero di periodi per giorno indicato."""
+        self.periodi = periodi
+        self.giorni: list[date] = []
+        self.prezzi: array = array("d")
+        self.fasce: bytearray = bytearray()
+
+        # Posizione nel giorno (ora locale) di ciascun periodo di mercato
+        self.slot: bytearray = bytearray()
+
+        # Media di ciascun periodo sui giorni inclusi e prezzi di domani,
+        # sia per ora che per quarto d'ora
+        self.orario: array = array("d", bytes(8 * 24))
+        self.domani: array = array("d", bytes(8 * 24))
+        self.quarti: array = array("d", bytes(8 * 96))
+        self.quarti_domani: array = array("d", bytes(8 * 96))
+
+    def add_day(self, giorno: date, prezzi: Sequence[float], fasce: bytes, slot: bytes) -> None:
+        """Aggiunge i prezzi di un giorno con i relativi codici fascia e posizioni."""
+        self.giorni.append(giorno)
+        self.prezzi.extend(prezzi)
+        self.fasce.extend(fasce)
+        self.slot.extend(slot)
+
+    def values(self, fascia: Fascia) -> Iterator[float]:
+        """Restituisce i prezzi appartenenti alla fascia indicata."""
+        return compress(self.prezzi, self.fasce.translate(_MASCHERE_FASCE[fascia]))
+
+    def count(self, fascia: Fascia) -> int:
+        """Restituisce il numero di prezzi appartenenti alla fascia indicata."""
+        return self.fasce.count(CODICI_FASCE[fascia])
+
+    def mean(self, fascia: Fascia) -> float:
+        """Restituisce la media dei prezzi della fascia indicata (0 se non ci sono dati)."""
+        if fascia == Fascia.MONO:
+            return sum(self.orario) / 24
+        if fascia == Fascia.F23:
+            return self.mean(Fascia.F2) * 0.46 + self.mean(Fascia.F3) * 0.54
+        if (count := self.count(fascia)) == 0:
+            return 0
+        return sum(self.values(fascia)) / count
+
+    def has_prices(self, fascia: Fascia) -> bool:
+        """Indica se ci sono prezzi per la fascia indicata."""
+        if fascia == Fascia.MONO:
+            return len(self.giorni) > 0
+        if fascia == Fascia.F23:
+            return self.has_prices(Fascia.F2) and self.has_prices(Fascia.F3)
+        return self.count(fascia) > 0
+
+    def profile(self) -> array:
+        """Calcola la media di ciascun periodo del giorno (ora locale) sui giorni presenti."""
+        giorni = len(self.giorni)
+        if giorni == 0:
+            return array("d", bytes(8 * self.periodi))
+
+        if len(self.prezzi) == giorni * self.periodi:
+            # Tutti i giorni hanno lo stesso numero di periodi: somme con passo fisso
+            prezzi = memoryview(self.prezzi)
+            return array(
+                "d", (sum(prezzi[p :: self.periodi]) / giorni for p in range(self.periodi))
+            )
+
+        # Giorni del cambio d'ora: raggruppa per posizione nel giorno
+        return slot_profile(self.prezzi, self.slot, self.periodi)
+
+
+    @property
+    def data(self) -> dict[Fascia, list[float]]:
+        """Restituisce i prezzi raggruppati per fascia (formato a liste)."""
+        return {
+            Fascia.ORARIA: list(self.orario),
+            Fascia.F1: list(self.values(Fascia.F1)),
+            Fascia.F2: list(self.values(Fascia.F2)),
+            Fascia.F3: list(self.values(Fascia.F3)),
+            Fascia.ORARIA_NEXT: list(self.domani),
+        }
+
+
+class DayContribution(NamedTuple):
+    """Contributo di un giorno alle somme per fascia e per quarto d'ora."""
+
+    # Prezzi del giorno (per riconoscere eventuali correzioni)
+    prezzi: tuple[float, ...]
+
+    # Somma e numero dei prezzi di ciascuna fascia (indicizzati per codice fascia)
+    somme_fasce: tuple[float, ...]
+    conteggi_fasce: tuple[int, ...]
+
+    # Somma e numero dei prezzi di ciascuno dei 96 quarti d'ora del giorno
+    somme_slot: array
+    conteggi_slot: array
+
+
+class RunningMeans:
+    """Somme e conteggi progressivi dei prezzi dei giorni inclusi nelle medie.
+
+    Aggiungere o togliere un giorno costa O(96) invece di ricalcolare
+    le medie su tutti i giorni; i totali sono sempre alla risoluzione
+    del quarto d'ora (i giorni orari contano quattro volte ogni prezzo,
+    quindi le medie restano pesate sul tempo).
+    """
+
+    def __init__(self):
+        """Inizializza somme e conteggi vuoti."""
+        self.giorni: dict[date, DayContribution] = {}
+        self.somme_fasce: list[float] = [0.0] * 5
+        self.conteggi_fasce: list[int] = [0] * 5
+        self.somme_slot: array = array("d", bytes(8 * 96))
+        self.conteggi_slot: array = array("l", bytes(array("l").itemsize * 96))
+
+    def copy(self) -> "RunningMeans":
+        """Restituisce una copia indipendente dei totali (i contributi, immutabili, sono condivisi)."""
+        copia = RunningMeans()
+        copia.giorni = dict(self.giorni)
+        copia.somme_fasce = list(self.somme_fasce)
+        copia.conteggi_fasce = list(self.conteggi_fasce)
+        copia.somme_slot = array("d", self.somme_slot)
+        copia.conteggi_slot = array("l", self.conteggi_slot)
+        return copia
+
+    def add(self, giorno: date, contributo: DayContribution) -> None:
+        """Aggiunge (o sostituisce) il contributo di un giorno."""
+        if giorno in self.giorni:
+            self.remove(giorno)
+        self.giorni[giorno] = contributo
+        self._applica(contributo, 1)
+
+    def remove(self, giorno: date) -> None:
+        """Toglie il contributo di un giorno."""
+        if (contributo := self.giorni.pop(giorno, None)) is not None:
+            self._applica(contributo, -1)
+
+    def _applica(self, contributo: DayContribution, segno: int) -> None:
+        """Somma (segno 1) o sottrae (segno -1) un contributo dai totali."""
+        for codice in range(5):
+            self.somme_fasce[codice] += segno * contributo.somme_fasce[codice]
+            self.conteggi_fasce[codice] += segno * contributo.conteggi_fasce[codice]
+        for posizione in range(96):
+            self.somme_slot[posizione] += segno * contributo.somme_slot[posizione]
+            self.conteggi_slot[posizione] += segno * contributo.conteggi_slot[posizione]
+
+    def profile(self) -> array:
+        """Restituisce la media di ciascun quarto d'ora (0 se non ci sono dati)."""
+        return array(
+            "d",
+            (
+                somma / n if n else 0.0
+                for somma, n in zip(self.somme_slot, self.conteggi_slot, strict=True)
+            ),
+        )
+
+    def mean(self, fascia: Fascia) -> float:
+        """Restituisce la media dei prezzi della fascia indicata (0 se non ci sono dati)."""
+        if fascia == Fascia.MONO:
+            return sum(hourly_means(self.profile())) / 24
+        if fascia == Fascia.F23:
+            return self.mean(Fascia.F2) * 0.46 + self.mean(Fascia.F3) * 0.54
+        codice = CODICI_FASCE[fascia]
+        if self.conteggi_fasce[codice] == 0:
+            return 0
+        return self.somme_fasce[codice] / self.conteggi_fasce[codice]
+
+    def has_prices(self, fascia: Fascia) -> bool:
+        """Indica se ci sono prezzi per la fascia indicata."""
+        if fascia == Fascia.MONO:
+            return any(self.conteggi_slot)
+        if fascia == Fascia.F23:
+            return self.has_prices(Fascia.F2) and self.has_prices(Fascia.F3)
+        return self.conteggi_fasce[CODICI_FASCE[fascia]] > 0
+
+
+# Una lettura inferiore a questa frazione della precedente indica un azzeramento
+# del contatore (stessa regola dei sensori total_increasing di Home Assistant)
+SOGLIA_AZZERAMENTO = 0.9
+
+# Giorni conservati nello storico dei totali giornalieri
+GIORNI_STORICO_COSTI = 31
+
+
+class CostAccumulator:
+    """Costo ed energia consumata accumulati dalle letture di un contatore.
+
+    I totali sono tenuti complessivamente e per fascia (F1, F2, F3) dalla
+    creazione del sensore, oltre che per ciascuno degli ultimi
+    GIORNI_STORICO_COSTI giorni (anche per fascia); ogni lettura li
+    aggiorna con un numero fisso di operazioni. Lo stato può essere
+    salvato e ripristinato come dizionario.
+
+    L'energia consumata quando il prezzo del periodo non è disponibile
+    viene contata a parte e non viene valorizzata successivamente.
+    """
 
     def __init__(self):
-        self.data: dict[Fascia, list[float]] = {
-            Fascia.ORARIA: [0] * 24,
-            Fascia.F1: [],
-            Fascia.F2: [],
-            Fascia.F3: [],
-            Fascia.ORARIA_NEXT: [0] * 24
+        """Inizializza i totali a zero, senza letture."""
+        self.costo = 0.0
+        self.energia = 0.0
+        self.costo_fasce: dict[Fascia, float] = {Fascia.F1: 0.0, Fascia.F2: 0.0, Fascia.F3: 0.0}
+        self.energia_fasce: dict[Fascia, float] = {Fascia.F1: 0.0, Fascia.F2: 0.0, Fascia.F3: 0.0}
+
+        # Totali di ciascun giorno (chiavi "costo", "energia", "costo_f1", ...)
+        self.storico: dict[date, dict[str, float]] = {}
+
+        # Energia consumata in periodi senza prezzo disponibile
+        self.energia_senza_prezzo = 0.0
+
+        # Ultima lettura del contatore (kWh)
+        self.ultima_lettura: float | None = None
+
+    def _totali_giorno(self, giorno: date) -> dict[str, float]:
+        """Restituisce i totali del giorno, creandoli se necessario."""
+        if (totali := self.storico.get(giorno)) is None:
+            totali = self.storico[giorno] = dict.fromkeys(
+                ("costo", "energia", "costo_f1", "energia_f1", "costo_f2",
+                 "energia_f2", "costo_f3", "energia_f3"),
+                0.0,
+            )
+            # Mantiene solo i giorni più recenti (in ordine cronologico)
+            if len(self.storico) > GIORNI_STORICO_COSTI or giorno < next(iter(self.storico)):
+                self.storico = dict(sorted(self.storico.items())[-GIORNI_STORICO_COSTI:])
+                totali = self.storico.get(giorno, totali)
+        return totali
+
+    def add(self, lettura: float, prezzo: float | None, fascia: Fascia, giorno: date) -> None:
+        """Registra una lettura del contatore (kWh) con il prezzo e la fascia del periodo.
+
+        Il consumo è la differenza con la lettura precedente. Una forte
+        diminuzione indica che il contatore è stato azzerato e il consumo è
+        la lettura stessa; le piccole diminuzioni (arrotondamenti, rumore)
+        spostano solo la lettura di riferimento.
+        """
+        if self.ultima_lettura is None:
+            self.ultima_lettura = lettura
+            return
+
+        if lettura >= self.ultima_lettura:
+            energia = lettura - self.ultima_lettura
+        elif lettura < self.ultima_lettura * SOGLIA_AZZERAMENTO:
+            energia = lettura
+        else:
+            energia = 0.0
+        self.ultima_lettura = lettura
+        if energia == 0.0:
+            return
+
+        if prezzo is None:
+            self.energia_senza_prezzo += energia
+            return
+
+        costo = energia * prezzo
+        self.costo += costo
+        self.energia += energia
+        self.costo_fasce[fascia] += costo
+        self.energia_fasce[fascia] += energia
+
+        totali = self._totali_giorno(giorno)
+        totali["costo"] += costo
+        totali["energia"] += energia
+        totali[f"costo_{fascia.value.lower()}"] += costo
+        totali[f"energia_{fascia.value.lower()}"] += energia
+
+    def as_dict(self) -> dict[str, Any]:
+        """Restituisce lo stato da salvare."""
+        return {
+            "costo": self.costo,
+            "energia": self.energia,
+            "costo_fasce": {fascia.value: valore for fascia, valore in self.costo_fasce.items()},
+            "energia_fasce": {fascia.value: valore for fascia, valore in self.energia_fasce.items()},
+            "storico": {giorno.isoformat(): totali for giorno, totali in self.storico.items()},
+            "energia_senza_prezzo": self.energia_senza_prezzo,
+            "ultima_lettura": self.ultima_lettura,
         }
 
+    @classmethod
+    def from_dict(cls, dati: Mapping[str, Any]) -> "CostAccumulator":
+        """Ripristina lo stato salvato con as_dict."""
+        accumulatore = cls()
+        accumulatore.costo = dati.get("costo", 0.0)
+        accumulatore.energia = dati.get("energia", 0.0)
+        for fascia in accumulatore.costo_fasce:
+            accumulatore.costo_fasce[fascia] = dati.get("costo_fasce", {}).get(fascia.value, 0.0)
+            accumulatore.energia_fasce[fascia] = dati.get("energia_fasce", {}).get(fascia.value, 0.0)
+        for giorno, totali in sorted(dati.get("storico", {}).items()):
+            accumulatore._totali_giorno(date.fromisoformat(giorno)).update(totali)
+        if not accumulatore.storico and dati.get("giorno"):
+            # Stato salvato prima dello storico: solo i totali del giorno
+            totali = accumulatore._totali_giorno(date.fromisoformat(dati["giorno"]))
+            totali["costo"] = dati.get("costo_giorno", 0.0)
+            totali["energia"] = dati.get("energia_giorno", 0.0)
+        accumulatore.energia_senza_prezzo = dati.get("energia_senza_prezzo", 0.0)
+        accumulatore.ultima_lettura = dati.get("ultima_lettura")
+        return accumulatore
+
 
 class PricesValues:
     """Classe che contiene il prezzi attuale di ciascuna fascia."""
 
-    value: dict[Fascia, float] = {
-        Fascia.MONO: 0.0,
-        Fascia.F1: 0.0,
-        Fascia.F2: 0.0,
-        Fascia.F3: 0.0,
-        Fascia.F23: 0.0,
-        Fascia.ORARIA: 0.0
-    }
\ No newline at end of file
+    def __init__(self):
+        self.value: dict[Fascia, float] = {
+            Fascia.MONO: 0.0,
+            Fascia.F1: 0.0,
+            Fascia.F2: 0.0,
+            Fascia.F3: 0.0,
+            Fascia.F23: 0.0,
+            Fascia.ORARIA: 0.0,
+            Fascia.QUARTO_ORARIA: 0.0
+        }
+
+class PriceForecast(NamedTuple):
+    """Curva dei prezzi di oggi e domani, un valore per periodo di mercato.
+
+    I periodi sono consecutivi (orari o al quarto d'ora, secondo quanto
+    pubblicato per ciascun giorno); la lista per gli attributi viene
+    costruita una sola volta, quando i prezzi vengono elaborati.
+    """
+
+    # Istanti di inizio (timestamp UTC) e prezzi di ciascun periodo
+    istanti: tuple[float, ...] = ()
+    prezzi: tuple[float, ...] = ()
+
+    # Istante di fine dell'ultimo periodo (timestamp UTC)
+    fine: float = 0.0
+
+    # Periodi nel formato degli attributi ({"start": ..., "price": ...})
+    voci: tuple[Mapping[str, str | float], ...] = ()
+
+    # Prezzi al quarto d'ora (i giorni orari ripetuti su 4 periodi) a partire
+    # dal primo istante e relative somme cumulative (somme[i] = quarti[:i])
+    quarti: array = array("d")
+    somme: array = array("d", (0.0,))
+
+    # Per ogni quarto d'ora: posizione del periodo nella classifica dei
+    # prezzi del suo giorno (0 = il più economico) e numero di periodi del giorno
+    ranghi: array = array("H")
+    periodi: array = array("H")
+
+    def quarter_index(self, istante: float, successivo: bool = False) -> int:
+        """Restituisce l'indice del quarto d'ora che contiene l'istante.
+
+        Con successivo=True restituisce il primo quarto d'ora che inizia
+        non prima dell'istante; il risultato è limitato alla curva.
+        """
+        if not self.istanti:
+            return 0
+        posizione = (istante - self.istanti[0]) / 900
+        indice = ceil(posizione) if successivo else floor(posizione)
+        return min(max(indice, 0), len(self.quarti))
+
+    def rank_at(self, istante: float) -> tuple[int, int] | None:
+        """Restituisce la posizione del periodo corrente nel suo giorno e il numero di periodi."""
+        if not self.istanti or istante < self.istanti[0] or istante >= self.fine:
+            return None
+        indice = self.quarter_index(istante)
+        return self.ranghi[indice], self.periodi[indice]
+
+    def price_at(self, istante: float) -> float | None:
+        """Restituisce il prezzo del periodo che contiene l'istante indicato."""
+        indice = bisect_right(self.istanti, istante) - 1
+        if indice < 0 or istante >= self.fine:
+            return None
+        return self.prezzi[indice]
+
+    def hour_price_at(self, istante: float) -> float | None:
+        """Restituisce la media dei prezzi dell'ora che contiene l'istante indicato.
+
+        La curva inizia alla mezzanotte italiana, quindi ogni gruppo di 4
+        quarti d'ora corrisponde a un'ora UTC (anche nei giorni del cambio d'ora).
+        """
+        if not self.istanti or istante < self.istanti[0] or istante >= self.fine:
+            return None
+        inizio = self.quarter_index(istante) // 4 * 4
+        return sum(self.quarti[inizio : inizio + 4]) / 4
+
+
+class RetailTariff(NamedTuple):
+    """Modello del prezzo al dettaglio a partire dal prezzo all'ingrosso.
+
+    prezzo = (ingrosso × (1 + perdite) + spread + componenti fisse) × (1 + IVA)
+    """
+
+    # Spread del fornitore e componenti fisse per kWh (€/kWh)
+    spread: float = 0.0
+    fissi: float = 0.0
+
+    # Perdite di rete e IVA (%)
+    perdite: float = 0.0
+    iva: float = 0.0
+
+    def apply(self, prezzo: float) -> float:
+        """Restituisce il prezzo al dettaglio corrispondente al prezzo all'ingrosso."""
+        return (prezzo * (1 + self.perdite / 100) + self.spread + self.fissi) * (1 + self.iva / 100)
+
+    def apply_all(self, prezzi: Sequence[float]) -> array:
+        """Applica il modello a un'intera curva di prezzi (coefficienti calcolati una volta)."""
+        fattore = (1 + self.perdite / 100) * (1 + self.iva / 100)
+        costante = (self.spread + self.fissi) * (1 + self.iva / 100)
+        return array("d", (prezzo * fattore + costante for prezzo in prezzi))
+
+
+class CheapestWindow(NamedTuple):
+    """Periodo (o insieme di periodi) più economico trovato sulla curva dei prezzi."""
+
+    # Inizio del primo e fine dell'ultimo periodo scelto
+    inizio: datetime
+    fine: datetime
+
+    # Prezzo medio dei quarti d'ora scelti
+    prezzo_medio: float
+
+    # Intervalli consecutivi scelti (uno solo per una finestra contigua)
+    intervalli: tuple[tuple[datetime, datetime], ...]
+
+
+class PricesResult(NamedTuple):
+    """Risultato immutabile dell'elaborazione di un archivio di prezzi."""
+
+    # Prezzi orari di tutte le zone per ciascun giorno estratto dall'archivio
+    giorni: Mapping[date, Mapping[str, tuple[float, ...]]]
+
+    # Prezzi orari di ciascuna zona richiesta
+    data: Mapping[str, PricesData]
+
+    # Prezzo medio di ciascuna fascia di ciascuna zona richiesta
+    value: Mapping[str, Mapping[Fascia, float]]
+
+    # Statistiche dell'elaborazione (numero di file, tempi in ms)
+    statistiche: Mapping[str, float] = MappingProxyType({})
+
+    # Curva dei prezzi di oggi e domani di ciascuna zona richiesta
+    previsioni: Mapping[str, PriceForecast] = MappingProxyType({})
+
+    # Prezzi al dettaglio per fascia e curva al dettaglio di ciascuna zona
+    # (solo se è indicato un modello di prezzo al dettaglio)
+    dettaglio: Mapping[str, Mapping[Fascia, float]] = MappingProxyType({})
+    previsioni_dettaglio: Mapping[str, PriceForecast] = MappingProxyType({})
+
+    # Somme progressive aggiornate di ciascuna zona (solo se indicate in ingresso)
+    medie: Mapping[str, RunningMeans] = MappingProxyType({})
@@ -1,10 +1,11 @@
 """Implementazione sensori di pzo_sensor."""
 
+from collections.abc import Mapping
+from datetime import date, datetime, timedelta, timezone
 from typing import Any
-from zoneinfo import ZoneInfo
-from datetime import datetime, timedelta
 
 from awesomeversion.awesomeversion import AwesomeVersion
+from zoneinfo import ZoneInfo
 
 from homeassistant.components.sensor import (
     ENTITY_ID_FORMAT,
@@ -13,9 +14,20 @@ from homeassistant.components.sensor import (
     SensorStateClass,
 )
 from homeassistant.config_entries import ConfigEntry
-from homeassistant.const import CURRENCY_EURO, UnitOfEnergy, __version__ as HA_VERSION
-from homeassistant.core import HomeAssistant
+from homeassistant.const import (
+    ATTR_UNIT_OF_MEASUREMENT,
+    CURRENCY_EURO,
+    PERCENTAGE,
+    STATE_UNAVAILABLE,
+    STATE_UNKNOWN,
+    UnitOfEnergy,
+    UnitOfTime,
+    __version__ as HA_VERSION,
+)
+from homeassistant.core import Event, HomeAssistant, callback
+from homeassistant.helpers.entity import EntityCategory
 from homeassistant.helpers.entity_platform import AddEntitiesCallback
+from homeassistant.helpers.event import async_track_state_change_event
 from homeassistant.helpers.restore_state import (
     ExtraStoredData,
     RestoredExtraData,
@@ -25,10 +37,31 @@ from homeassistant.helpers.typing import DiscoveryInfoType
 from homeassistant.helpers.update_coordinator import CoordinatorEntity
 
 from . import PricesDataUpdateCoordinator
-from .const import DOMAIN
-from .interfaces import Fascia, PricesValues
+from .const import (
+    COORD_EVENT,
+    DOMAIN,
+    EVENT_UPDATE_FASCIA,
+    EVENT_UPDATE_ORARIO,
+    EVENT_UPDATE_PREZZI,
+    EVENT_UPDATE_QUARTO_ORARIO,
+    EVENT_UPDATE_STATISTICHE,
+)
+from .interfaces import CheapestWindow, CostAccumulator, Fascia, PricesValues
+from .utils import get_fascia, rank_percentile
 
 ATTR_ROUNDED_DECIMALS = "rounded_decimals"
+ATTR_PREVISIONI = "previsioni"
+ATTR_STORICO = "storico"
+
+# Conversione in kWh delle letture dei contatori di energia
+FATTORI_ENERGIA = {
+    UnitOfEnergy.WATT_HOUR: 0.001,
+    UnitOfEnergy.KILO_WATT_HOUR: 1.0,
+    UnitOfEnergy.MEGA_WATT_HOUR: 1000.0,
+}
+
+# Unità di misura dei prezzi
+UNITA_PREZZO = f"{CURRENCY_EURO}/{UnitOfEnergy.KILO_WATT_HOUR}"
 
 time_zone = ZoneInfo("Europe/Rome")
 
@@ -56,29 +89,70 @@ async def async_setup_entry(
 
     # Crea i sensori dei valori dei prezzi zonali (legati al coordinator)
     entities: list[SensorEntity] = []
-    match coordinator.contract:
-        case 3:
-            entities.append(PrezzoSensorEntity(coordinator, Fascia.F1))
-            entities.append(PrezzoSensorEntity(coordinator, Fascia.F2))
-            entities.append(PrezzoSensorEntity(coordinator, Fascia.F3))
-        case 2:
-            entities.append(PrezzoSensorEntity(coordinator, Fascia.F1))
-            entities.append(PrezzoSensorEntity(coordinator, Fascia.F23))
-        case 1:
-            entities.append(PrezzoSensorEntity(coordinator, Fascia.MONO))
+    for zone in coordinator.zones:
+        match coordinator.contract:
+            case 3:
+                fasce = (Fascia.F1, Fascia.F2, Fascia.F3)
+            case 2:
+                fasce = (Fascia.F1, Fascia.F23)
+            case _:
+                fasce = (Fascia.MONO,)
+        entities.extend(PrezzoSensorEntity(coordinator, fascia, zone) for fascia in fasce)
+
+        if coordinator.contract != 1:
+            entities.append(PrezzoFasciaSensorEntity(coordinator, zone))
+
+        entities.append(PrezzoOrarioSensorEntity(coordinator, zone))
+        entities.append(PrezzoQuartoOrarioSensorEntity(coordinator, zone))
+        entities.append(PrevisioniSensorEntity(coordinator, zone))
+
+        if coordinator.tariffa is not None:
+            # Prezzi al dettaglio (solo se è configurato il modello del contratto)
+            entities.extend(
+                PrezzoDettaglioSensorEntity(coordinator, fascia, zone) for fascia in fasce
+            )
+            if coordinator.contract != 1:
+                entities.append(PrezzoDettaglioSensorEntity(coordinator, None, zone))
+            entities.append(PrevisioniSensorEntity(coordinator, zone, dettaglio=True))
+        entities.append(FinestraEconomicaSensorEntity(coordinator, zone))
+        entities.append(PercentileSensorEntity(coordinator, zone))
 
     # Crea sensori aggiuntivi
     if coordinator.contract != 1:
         entities.append(FasciaSensorEntity(coordinator))
-        entities.append(PrezzoFasciaSensorEntity(coordinator))
-
-    entities.append(PrezzoOrarioSensorEntity(coordinator))
+    if coordinator.energy_meter:
+        entities.append(
+            CostoEnergiaSensorEntity(coordinator, coordinator.zones[0], coordinator.energy_meter)
+        )
+    entities.append(StatisticheSensorEntity(coordinator))
 
     # Aggiunge i sensori ma non aggiorna automaticamente via web
     # per lasciare il tempo ad Home Assistant di avviarsi
     async_add_entities(entities, update_before_add=False)
 
 
+def zone_suffix(coordinator: PricesDataUpdateCoordinator, zone: str) -> tuple[str, str]:
+    """Restituisce i suffissi di ID e nome per i sensori di una zona.
+
+    La prima zona configurata mantiene gli ID originali, le altre
+    vengono distinte dal codice della zona.
+    """
+    if zone == coordinator.zones[0]:
+        return "", ""
+    return f"_{zone.lower()}", f" ({zone})"
+
+
+def is_update_for(coordinator: PricesDataUpdateCoordinator, eventi: frozenset[str]) -> bool:
+    """Verifica se l'ultimo aggiornamento del coordinator riguarda il sensore.
+
+    Gli aggiornamenti senza evento (es. aggiornamento manuale) riguardano
+    tutti i sensori.
+    """
+    if not coordinator.data:
+        return True
+    return coordinator.data.get(COORD_EVENT) in eventi
+
+
 def fmt_float(num: float) -> float:
     """Formatta adeguatamente il numero decimale."""
     if CommonSettings.has_suggested_display_precision:
@@ -90,69 +164,103 @@ def fmt_float(num: float) -> float:
     return round(num, 6)
 
 
+def fmt_attr(num: float, precisione: int = 6) -> str:
+    """Formatta un prezzo come attributo di stato."""
+    return str(format(round(num, precisione), f".{precisione}g"))
+
+
+def rounded_attributes(attributi: dict[str, Any], valore: float, precisione: int = 6) -> dict[str, Any]:
+    """Aggiunge agli attributi il valore arrotondato, se necessario.
+
+    Nelle versioni precedenti di Home Assistant che non supportano
+    l'attributo 'suggested_display_precision' il valore arrotondato
+    viene restituito anche come attributo.
+    """
+    if CommonSettings.has_suggested_display_precision:
+        return attributi
+    return {ATTR_ROUNDED_DECIMALS: fmt_attr(valore, precisione)} | attributi
+
+
 class PrezzoSensorEntity(CoordinatorEntity, SensorEntity, RestoreEntity):
     """Sensore relativo al prezzo per fasce."""
 
-    def __init__(self, coordinator: PricesDataUpdateCoordinator, fascia: Fascia) -> None:
+    # Eventi del coordinator che modificano il sensore
+    _eventi = frozenset({EVENT_UPDATE_PREZZI})
+
+    # Proprietà comuni
+    _attr_has_entity_name = True
+    _attr_should_poll = False
+    _attr_state_class = SensorStateClass.MEASUREMENT
+    _attr_suggested_display_precision = 6
+    _attr_native_unit_of_measurement = UNITA_PREZZO
+    _attr_icon = "mdi:chart-line"
+
+    def __init__(self, coordinator: PricesDataUpdateCoordinator, fascia: Fascia, zone: str) -> None:
         """Inizializza il sensore."""
         super().__init__(coordinator)
 
-        # Inizializza coordinator e tipo
+        # Inizializza coordinator, tipo e zona
         self.coordinator = coordinator
         self.fascia = fascia
+        self.zone = zone
+        id_suffix, name_suffix = zone_suffix(coordinator, zone)
 
-        # ID univoco sensore basato su un nome fisso
+        # ID univoco sensore e nome basati su un nome fisso
         match self.fascia:
             case Fascia.MONO:
-                self.entity_id = ENTITY_ID_FORMAT.format("prezzo_zonale_mono_orario")
-            case Fascia.F1:
-                self.entity_id = ENTITY_ID_FORMAT.format("prezzo_zonale_fascia_f1")
-            case Fascia.F2:
-                self.entity_id = ENTITY_ID_FORMAT.format("prezzo_zonale_fascia_f2")
-            case Fascia.F3:
-                self.entity_id = ENTITY_ID_FORMAT.format("prezzo_zonale_fascia_f3")
-            case Fascia.F23:
-                self.entity_id = ENTITY_ID_FORMAT.format("prezzo_zonale_fascia_f23")
+                self.entity_id = ENTITY_ID_FORMAT.format("prezzo_zonale_mono_orario" + id_suffix)
+                self._attr_name = f"Prezzo zonale mono-orario{name_suffix}"
+            case Fascia.F1 | Fascia.F2 | Fascia.F3 | Fascia.F23:
+                self.entity_id = ENTITY_ID_FORMAT.format(
+                    f"prezzo_zonale_fascia_{self.fascia.value.lower()}" + id_suffix
+                )
+                self._attr_name = f"Prezzo zonale fascia {self.fascia.value}{name_suffix}"
             case _:
                 self.entity_id = None
+                self._attr_name = None
         self._attr_unique_id = self.entity_id
-        self._attr_has_entity_name = True
 
-        # Inizializza le proprietà comuni
-        self._attr_state_class = SensorStateClass.MEASUREMENT
-        self._attr_suggested_display_precision = 6
         self._available = False
         self._native_value = 0
-
+        self._attr_extra_state_attributes = {}
 
     def _handle_coordinator_update(self) -> None:
         """Gestisce l'aggiornamento dei dati dal coordinator."""
 
+        # Ignora gli aggiornamenti che non modificano il sensore
+        if not is_update_for(self.coordinator, self._eventi):
+            return
+
+        self._aggiorna_stato()
+        self.async_write_ha_state()
+
+    def _aggiorna_stato(self) -> None:
+        """Calcola stato e attributi dai dati del coordinator."""
         if self.fascia != Fascia.F23:
             # Tutte le fasce tranne F23
-            if self.coordinator.pz_values.value[self.fascia] > 0:
+            if self.coordinator.pz_values[self.zone].value[self.fascia] > 0:
                 # Ci sono dati, sensore disponibile
                 self._available = True
-                self._native_value = self.coordinator.pz_values.value[self.fascia]
+                self._native_value = self.coordinator.pz_values[self.zone].value[self.fascia]
             else:
                 # Non ci sono dati, sensore non disponibile
                 self._available = False
 
         elif (
-            self.coordinator.pz_values.value[Fascia.F2] > 0
-            and self.coordinator.pz_values.value[Fascia.F3] > 0
+            self.coordinator.pz_values[self.zone].value[Fascia.F2] > 0
+            and self.coordinator.pz_values[self.zone].value[Fascia.F3] > 0
         ) > 0:
             # Caso speciale per fascia F23: affinché sia disponibile devono
             # esserci dati sia sulla fascia F2 che sulla F3,
             # visto che è calcolata a partire da questi
             self._available = True
-            self._native_value = self.coordinator.pz_values.value[self.fascia]
+            self._native_value = self.coordinator.pz_values[self.zone].value[self.fascia]
         else:
             # Non ci sono dati, sensore non disponibile
             self._available = False
 
-        # Aggiorna lo stato di Home Assistant
-        self.async_write_ha_state()
+        # Aggiorna gli attributi
+        self._attr_extra_state_attributes = rounded_attributes({}, self._native_value)
 
     @property
     def extra_restore_state_data(self) -> ExtraStoredData:
@@ -165,16 +273,17 @@ class PrezzoSensorEntity(CoordinatorEntity, SensorEntity, RestoreEntity):
         """Entità aggiunta ad Home Assistant."""
         await super().async_added_to_hass()
 
+        # Prezzi già presenti nel coordinator: non serve lo stato precedente
+        if self.coordinator.prezzi_giornalieri:
+            self._aggiorna_stato()
+            return
+
         # Recupera lo stato precedente, se esiste
         if (old_data := await self.async_get_last_extra_data()) is not None:
             if (old_native_value := old_data.as_dict().get("native_value")) is not None:
                 self._available = True
                 self._native_value = old_native_value
-
-    @property
-    def should_poll(self) -> bool:
-        """Determina l'aggiornamento automatico."""
-        return False
+                self._attr_extra_state_attributes = rounded_attributes({}, old_native_value)
 
     @property
     def available(self) -> bool:
@@ -186,41 +295,20 @@ class PrezzoSensorEntity(CoordinatorEntity, SensorEntity, RestoreEntity):
         """Valore corrente del sensore."""
         return fmt_float(self._native_value)
 
-    @property
-    def native_unit_of_measurement(self) -> str:
-        """Unita' di misura."""
-        return f"{CURRENCY_EURO}/{UnitOfEnergy.KILO_WATT_HOUR}"
-
-    @property
-    def icon(self) -> str:
-        """Icona da usare nel frontend."""
-        return "mdi:chart-line"
-
-    @property
-    def name(self) -> str | None:
-        """Restituisce il nome del sensore."""
-        if self.fascia == Fascia.MONO:
-            return f"Prezzo zonale mono-orario"
-        elif self.fascia == Fascia.ORARIA:
-            return f"Prezzo zonale orario ({datetime.now().hour})"
-        if self.fascia:
-            return f"Prezzo zonale fascia {self.fascia.value}"
-        return None
-
-    @property
-    def extra_state_attributes(self) -> dict[str, Any]:
-        """Restituisce gli attributi di stato."""
-        if CommonSettings.has_suggested_display_precision:
-            return {}
-
-        # Nelle versioni precedenti di Home Assistant
-        # restituisce un valore arrotondato come attributo
-        return {ATTR_ROUNDED_DECIMALS: str(format(round(self.native_value, self._attr_suggested_display_precision), f".{self._attr_suggested_display_precision}g"))}
-
 
 class FasciaSensorEntity(CoordinatorEntity, SensorEntity):
     """Sensore che rappresenta il nome la fascia oraria corrente."""
 
+    # Eventi del coordinator che modificano il sensore
+    _eventi = frozenset({EVENT_UPDATE_FASCIA, EVENT_UPDATE_PREZZI})
+
+    # Proprietà comuni
+    _attr_has_entity_name = True
+    _attr_should_poll = False
+    _attr_device_class = SensorDeviceClass.ENUM
+    _attr_icon = "mdi:timeline-clock-outline"
+    _attr_name = "Fascia corrente"
+
     def __init__(self, coordinator: PricesDataUpdateCoordinator) -> None:
         """Inizializza il sensore."""
         super().__init__(coordinator)
@@ -231,99 +319,111 @@ class FasciaSensorEntity(CoordinatorEntity, SensorEntity):
         # ID univoco sensore basato su un nome fisso
         self.entity_id = ENTITY_ID_FORMAT.format("gme_fascia_corrente")
         self._attr_unique_id = self.entity_id
-        self._attr_has_entity_name = True
 
-    def _handle_coordinator_update(self) -> None:
-        """Gestisce l'aggiornamento dei dati dal coordinator."""
-        self.async_write_ha_state()
+        # Possibili stati del sensore (un cambio di contratto ricarica l'integrazione)
+        match self.coordinator.contract:
+            case 3: self._attr_options = [Fascia.F1.value, Fascia.F2.value, Fascia.F3.value]
+            case 2: self._attr_options = [Fascia.F1.value, Fascia.F23.value]
 
-    @property
-    def should_poll(self) -> bool:
-        """Determina l'aggiornamento automatico."""
-        return False
+        self._attr_native_value = None
+        self._attr_extra_state_attributes = {}
 
-    @property
-    def available(self) -> bool:
-        """Determina se il valore è disponibile."""
-        return self.coordinator.fascia_corrente is not None
+    async def async_added_to_hass(self) -> None:
+        """Entità aggiunta ad Home Assistant."""
+        await super().async_added_to_hass()
 
-    @property
-    def device_class(self) -> SensorDeviceClass | None:
-        """Classe del sensore."""
-        return SensorDeviceClass.ENUM
+        # Stato iniziale dai dati già presenti nel coordinator
+        self._aggiorna_stato()
 
-    @property
-    def options(self) -> list[str] | None:
-        """Possibili stati del sensore."""
-        match self.coordinator.contract:
-            case 3: return [Fascia.F1.value, Fascia.F2.value, Fascia.F3.value]
-            case 2: return [Fascia.F1.value, Fascia.F23.value]
+    def _handle_coordinator_update(self) -> None:
+        """Gestisce l'aggiornamento dei dati dal coordinator."""
 
-    @property
-    def native_value(self) -> str | None:
-        """Restituisce la fascia corrente come stato."""
-        if not self.coordinator.fascia_corrente:
-            return None
+        # Ignora gli aggiornamenti che non modificano il sensore
+        if not is_update_for(self.coordinator, self._eventi):
+            return
 
-        return self.coordinator.fascia_corrente.value
+        self._aggiorna_stato()
+        self.async_write_ha_state()
 
-    @property
-    def extra_state_attributes(self) -> dict[str, Any] | None:
-        """Attributi aggiuntivi del sensore."""
-        return {
+    def _aggiorna_stato(self) -> None:
+        """Calcola stato e attributi dai dati del coordinator."""
+
+        # Fascia corrente come stato e fascia successiva come attributi
+        fascia_corrente = self.coordinator.fascia_corrente
+        self._attr_native_value = fascia_corrente.value if fascia_corrente else None
+        self._attr_extra_state_attributes = {
             "fascia_successiva": self.coordinator.fascia_successiva.value if self.coordinator.fascia_successiva else None,
             "inizio_fascia_successiva": self.coordinator.prossimo_cambio_fascia,
             "termine_fascia_successiva": self.coordinator.termine_prossima_fascia,
         }
 
     @property
-    def icon(self) -> str:
-        """Icona da usare nel frontend."""
-        return "mdi:timeline-clock-outline"
-
-    @property
-    def name(self) -> str:
-        """Restituisce il nome del sensore."""
-        return "Fascia corrente"
+    def available(self) -> bool:
+        """Determina se il valore è disponibile."""
+        return self.coordinator.fascia_corrente is not None
 
 
 class PrezzoFasciaSensorEntity(CoordinatorEntity, SensorEntity, RestoreEntity):
     """Sensore che rappresenta il prezzo zonale della fascia corrente."""
 
-    def __init__(self, coordinator: PricesDataUpdateCoordinator) -> None:
+    # Eventi del coordinator che modificano il sensore
+    _eventi = frozenset({EVENT_UPDATE_FASCIA, EVENT_UPDATE_PREZZI})
+
+    # Proprietà comuni
+    _attr_has_entity_name = True
+    _attr_should_poll = False
+    _attr_state_class = SensorStateClass.MEASUREMENT
+    _attr_suggested_display_precision = 6
+    _attr_native_unit_of_measurement = UNITA_PREZZO
+    _attr_icon = "mdi:currency-eur"
+
+    def __init__(self, coordinator: PricesDataUpdateCoordinator, zone: str) -> None:
         """Inizializza il sensore."""
         super().__init__(coordinator)
 
-        # Inizializza coordinator
+        # Inizializza coordinator e zona
         self.coordinator = coordinator
+        self.zone = zone
+        id_suffix, self._name_suffix = zone_suffix(coordinator, zone)
 
         # ID univoco sensore basato su un nome fisso
-        self.entity_id = ENTITY_ID_FORMAT.format("prezzo_zonale_fascia_corrente")
+        self.entity_id = ENTITY_ID_FORMAT.format("prezzo_zonale_fascia_corrente" + id_suffix)
         self._attr_unique_id = self.entity_id
-        self._attr_has_entity_name = True
 
-        # Inizializza le proprietà comuni
-        self._attr_state_class = SensorStateClass.MEASUREMENT
-        self._attr_suggested_display_precision = 6
         self._available = False
         self._native_value = 0
-        self._friendly_name = "Prezzo zonale fascia corrente"
+        self._friendly_name = f"Prezzo zonale fascia corrente{self._name_suffix}"
+        self._attr_extra_state_attributes = {}
 
     def _handle_coordinator_update(self) -> None:
         """Gestisce l'aggiornamento dei dati dal coordinator."""
 
-        if self.coordinator.fascia_corrente is not None and self.coordinator.pz_values.value[self.coordinator.fascia_corrente] > 0:
+        # Ignora gli aggiornamenti che non modificano il sensore
+        if not is_update_for(self.coordinator, self._eventi):
+            return
+
+        self._aggiorna_stato()
+        self.async_write_ha_state()
+
+    def _aggiorna_stato(self) -> None:
+        """Calcola stato e attributi dai dati del coordinator."""
+        valori = self.coordinator.pz_values[self.zone].value
+        if self.coordinator.fascia_corrente is not None and valori[self.coordinator.fascia_corrente] > 0:
 
-            self._available = self.coordinator.pz_values.value[self.coordinator.fascia_corrente] > 0
-            self._native_value = self.coordinator.pz_values.value[self.coordinator.fascia_corrente]
-            self._friendly_name = f"Prezzo zonale fascia corrente ({self.coordinator.fascia_corrente.value})"
+            self._available = valori[self.coordinator.fascia_corrente] > 0
+            self._native_value = valori[self.coordinator.fascia_corrente]
+            self._friendly_name = f"Prezzo zonale fascia corrente ({self.coordinator.fascia_corrente.value}){self._name_suffix}"
 
         else:
             self._available = False
             self._native_value = 0
-            self._friendly_name = "Prezzo zonale fascia corrente"
+            self._friendly_name = f"Prezzo zonale fascia corrente{self._name_suffix}"
 
-        self.async_write_ha_state()
+        # Prezzo della fascia successiva (formattato una sola volta)
+        attributi = {}
+        if self.coordinator.fascia_successiva is not None:
+            attributi["fascia_successiva"] = fmt_attr(valori[self.coordinator.fascia_successiva])
+        self._attr_extra_state_attributes = rounded_attributes(attributi, self._native_value)
 
     @property
     def extra_restore_state_data(self) -> ExtraStoredData:
@@ -339,21 +439,22 @@ class PrezzoFasciaSensorEntity(CoordinatorEntity, SensorEntity, RestoreEntity):
         """Entità aggiunta ad Home Assistant."""
         await super().async_added_to_hass()
 
+        # Prezzi già presenti nel coordinator: non serve lo stato precedente
+        if self.coordinator.prezzi_giornalieri:
+            self._aggiorna_stato()
+            return
+
         # Recupera lo stato precedente, se esiste
         if (old_data := await self.async_get_last_extra_data()) is not None:
             if (old_native_value := old_data.as_dict().get("native_value")) is not None:
                 self._available = True
                 self._native_value = old_native_value
+                self._attr_extra_state_attributes = rounded_attributes({}, old_native_value)
             if (
                 old_friendly_name := old_data.as_dict().get("friendly_name")
             ) is not None:
                 self._friendly_name = old_friendly_name
 
-    @property
-    def should_poll(self) -> bool:
-        """Determina l'aggiornamento automatico."""
-        return False
-
     @property
     def available(self) -> bool:
         """Determina se il valore è disponibile."""
@@ -364,71 +465,82 @@ class PrezzoFasciaSensorEntity(CoordinatorEntity, SensorEntity, RestoreEntity):
         """Restituisce il prezzo della fascia corrente."""
         return fmt_float(self._native_value)
 
-    @property
-    def native_unit_of_measurement(self) -> str:
-        """Unita' di misura."""
-        return f"{CURRENCY_EURO}/{UnitOfEnergy.KILO_WATT_HOUR}"
-
-    @property
-    def icon(self) -> str:
-        """Icona da usare nel frontend."""
-        return "mdi:currency-eur"
-
     @property
     def name(self) -> str:
         """Restituisce il nome del sensore."""
         return self._friendly_name
 
-    @property
-    def extra_state_attributes(self) -> dict[str, Any]:
-        """Restituisce gli attributi di stato."""
-
-        attributi = {
-                "fascia_successiva":  str(format(round(self.coordinator.pz_values.value[self.coordinator.fascia_successiva], self._attr_suggested_display_precision), f".{self._attr_suggested_display_precision}g"))
-            }
-        
-        if CommonSettings.has_suggested_display_precision:
-            return attributi
-
-        # Nelle versioni precedenti di Home Assistant
-        # restituisce un valore arrotondato come attributo
-        return {ATTR_ROUNDED_DECIMALS: str(format(round(self.native_value, self._attr_suggested_display_precision), f".{self._attr_suggested_display_precision}g"))} | attributi
 
 class PrezzoOrarioSensorEntity(CoordinatorEntity, SensorEntity, RestoreEntity):
     """Sensore che rappresenta il prezzo zonale orario."""
 
-    def __init__(self, coordinator: PricesDataUpdateCoordinator) -> None:
+    # Eventi del coordinator che modificano il sensore
+    _eventi = frozenset({EVENT_UPDATE_ORARIO, EVENT_UPDATE_PREZZI})
+
+    # Proprietà comuni
+    _attr_has_entity_name = True
+    _attr_should_poll = False
+    _attr_state_class = SensorStateClass.MEASUREMENT
+    _attr_suggested_display_precision = 6
+    _attr_native_unit_of_measurement = UNITA_PREZZO
+    _attr_icon = "mdi:currency-eur"
+
+    def __init__(self, coordinator: PricesDataUpdateCoordinator, zone: str) -> None:
         """Inizializza il sensore."""
         super().__init__(coordinator)
 
-        # Inizializza coordinator
+        # Inizializza coordinator e zona
         self.coordinator = coordinator
+        self.zone = zone
+        id_suffix, self._name_suffix = zone_suffix(coordinator, zone)
 
         # ID univoco sensore basato su un nome fisso
-        self.entity_id = ENTITY_ID_FORMAT.format("prezzo_zonale_orario")
+        self.entity_id = ENTITY_ID_FORMAT.format("prezzo_zonale_orario" + id_suffix)
         self._attr_unique_id = self.entity_id
-        self._attr_has_entity_name = True
 
-        # Inizializza le proprietà comuni
-        self._attr_state_class = SensorStateClass.MEASUREMENT
-        self._attr_suggested_display_precision = 6
         self._available = False
         self._native_value = 0
-        self._friendly_name = "Prezzo zonale orario"
+        self._friendly_name = f"Prezzo zonale orario{self._name_suffix}"
+        self._attr_extra_state_attributes = {}
 
     def _handle_coordinator_update(self) -> None:
         """Gestisce l'aggiornamento dei dati dal coordinator."""
 
-        if self.coordinator.pz_values.value[Fascia.ORARIA] > 0:
-            self._available = len(self.coordinator.pz_data.data[Fascia.ORARIA]) > 0
-            self._native_value = self.coordinator.pz_values.value[Fascia.ORARIA]
-            self._friendly_name = f"Prezzo zonale orario ({datetime.now().hour})"
+        # Ignora gli aggiornamenti che non modificano il sensore
+        if not is_update_for(self.coordinator, self._eventi):
+            return
+
+        self._aggiorna_stato()
+        self.async_write_ha_state()
+
+    def _aggiorna_stato(self) -> None:
+        """Calcola stato e attributi dai dati del coordinator."""
+        data_corrente = datetime.now(tz=time_zone)
+        if self.coordinator.pz_values[self.zone].value[Fascia.ORARIA] > 0:
+            self._available = len(self.coordinator.pz_data[self.zone].orario) > 0
+            self._native_value = self.coordinator.pz_values[self.zone].value[Fascia.ORARIA]
+            self._friendly_name = f"Prezzo zonale orario ({data_corrente.hour}){self._name_suffix}"
         else:
             self._available = False
             self._native_value = 0
-            self._friendly_name = "Prezzo zonale orario"
+            self._friendly_name = f"Prezzo zonale orario{self._name_suffix}"
 
-        self.async_write_ha_state()
+        self._attr_extra_state_attributes = self._build_attributes(data_corrente)
+
+    def _build_attributes(self, data_corrente: datetime) -> dict[str, Any]:
+        """Costruisce gli attributi di stato per l'ora corrente."""
+        prossima_ora = (data_corrente.astimezone(timezone.utc) + timedelta(hours=1)).astimezone(time_zone)
+        stesso_giorno = data_corrente.day == prossima_ora.day
+        pz_data = self.coordinator.pz_data[self.zone]
+        attributi = {
+                "ora_corrente": data_corrente.hour,
+                "ora_successiva": prossima_ora.hour,
+                "prezzo_successivo": fmt_attr(pz_data.orario[prossima_ora.hour]
+                    if stesso_giorno or self.coordinator.in_window(prossima_ora.date())
+                    else pz_data.domani[prossima_ora.hour]),
+                "prezzo_medio": fmt_attr(self.coordinator.pz_values[self.zone].value[Fascia.MONO])
+            }
+        return rounded_attributes(attributi, self._native_value)
 
     @property
     def extra_restore_state_data(self) -> ExtraStoredData:
@@ -444,21 +556,22 @@ class PrezzoOrarioSensorEntity(CoordinatorEntity, SensorEntity, RestoreEntity):
         """Entità aggiunta ad Home Assistant."""
         await super().async_added_to_hass()
 
+        # Prezzi già presenti nel coordinator: non serve lo stato precedente
+        if self.coordinator.prezzi_giornalieri:
+            self._aggiorna_stato()
+            return
+
         # Recupera lo stato precedente, se esiste
         if (old_data := await self.async_get_last_extra_data()) is not None:
             if (old_native_value := old_data.as_dict().get("native_value")) is not None:
                 self._available = True
                 self._native_value = old_native_value
+                self._attr_extra_state_attributes = rounded_attributes({}, old_native_value)
             if (
                 old_friendly_name := old_data.as_dict().get("friendly_name")
             ) is not None:
                 self._friendly_name = old_friendly_name
 
-    @property
-    def should_poll(self) -> bool:
-        """Determina l'aggiornamento automatico."""
-        return False
-
     @property
     def available(self) -> bool:
         """Determina se il valore è disponibile."""
@@ -470,40 +583,558 @@ class PrezzoOrarioSensorEntity(CoordinatorEntity, SensorEntity, RestoreEntity):
         return fmt_float(self._native_value)
 
     @property
-    def native_unit_of_measurement(self) -> str:
-        """Unita' di misura."""
-        return f"{CURRENCY_EURO}/{UnitOfEnergy.KILO_WATT_HOUR}"
+    def name(self) -> str:
+        """Restituisce il nome del sensore."""
+        return self._friendly_name
+
+
+class PrezzoQuartoOrarioSensorEntity(PrezzoOrarioSensorEntity):
+    """Sensore che rappresenta il prezzo zonale del quarto d'ora corrente."""
+
+    # Eventi del coordinator che modificano il sensore
+    _eventi = frozenset({EVENT_UPDATE_ORARIO, EVENT_UPDATE_QUARTO_ORARIO, EVENT_UPDATE_PREZZI})
+
+    def __init__(self, coordinator: PricesDataUpdateCoordinator, zone: str) -> None:
+        """Inizializza il sensore."""
+        super().__init__(coordinator, zone)
+
+        # ID univoco sensore basato su un nome fisso
+        id_suffix, _ = zone_suffix(coordinator, zone)
+        self.entity_id = ENTITY_ID_FORMAT.format("prezzo_zonale_quarto_orario" + id_suffix)
+        self._attr_unique_id = self.entity_id
+        self._friendly_name = f"Prezzo zonale quarto d'ora{self._name_suffix}"
+
+    def _aggiorna_stato(self) -> None:
+        """Calcola stato e attributi dai dati del coordinator."""
+        adesso = datetime.now(tz=time_zone)
+        if self.coordinator.pz_values[self.zone].value[Fascia.QUARTO_ORARIA] > 0:
+            self._available = True
+            self._native_value = self.coordinator.pz_values[self.zone].value[Fascia.QUARTO_ORARIA]
+            self._friendly_name = f"Prezzo zonale quarto d'ora ({adesso.hour}:{adesso.minute // 15 * 15:02d}){self._name_suffix}"
+        else:
+            self._available = False
+            self._native_value = 0
+            self._friendly_name = f"Prezzo zonale quarto d'ora{self._name_suffix}"
+
+        self._attr_extra_state_attributes = self._build_attributes(adesso)
+
+    def _build_attributes(self, data_corrente: datetime) -> dict[str, Any]:
+        """Costruisce gli attributi di stato per il quarto d'ora corrente."""
+        prossimo_quarto = (data_corrente.astimezone(timezone.utc) + timedelta(minutes=15)).astimezone(time_zone)
+        indice = prossimo_quarto.hour * 4 + prossimo_quarto.minute // 15
+        stesso_giorno = data_corrente.day == prossimo_quarto.day
+        pz_data = self.coordinator.pz_data[self.zone]
+        attributi = {
+                "quarto_corrente": f"{data_corrente.hour}:{data_corrente.minute // 15 * 15:02d}",
+                "quarto_successivo": f"{prossimo_quarto.hour}:{prossimo_quarto.minute // 15 * 15:02d}",
+                "prezzo_successivo": fmt_attr(pz_data.quarti[indice]
+                    if stesso_giorno or self.coordinator.in_window(prossimo_quarto.date())
+                    else pz_data.quarti_domani[indice]),
+                "prezzo_medio": fmt_attr(self.coordinator.pz_values[self.zone].value[Fascia.MONO])
+            }
+        return rounded_attributes(attributi, self._native_value)
+
+
+class PrevisioniSensorEntity(CoordinatorEntity, SensorEntity):
+    """Sensore con il prezzo del periodo corrente e la curva dei prezzi di oggi e domani.
+
+    Con dettaglio=True usa la curva dei prezzi al dettaglio.
+    """
+
+    # Eventi del coordinator che modificano il sensore
+    _eventi = frozenset({EVENT_UPDATE_ORARIO, EVENT_UPDATE_QUARTO_ORARIO, EVENT_UPDATE_PREZZI})
+
+    # La curva cambia solo una volta al giorno: non viene salvata nel recorder
+    _unrecorded_attributes = frozenset({ATTR_PREVISIONI})
+
+    # Proprietà comuni
+    _attr_has_entity_name = True
+    _attr_should_poll = False
+    _attr_state_class = SensorStateClass.MEASUREMENT
+    _attr_suggested_display_precision = 6
+    _attr_native_unit_of_measurement = UNITA_PREZZO
+    _attr_icon = "mdi:chart-line"
+
+    def __init__(self, coordinator: PricesDataUpdateCoordinator, zone: str, dettaglio: bool = False) -> None:
+        """Inizializza il sensore."""
+        super().__init__(coordinator)
+
+        # Inizializza coordinator, zona e curva dei prezzi
+        self.coordinator = coordinator
+        self.zone = zone
+        self._curve = coordinator.previsioni_dettaglio if dettaglio else coordinator.previsioni
+        id_suffix, name_suffix = zone_suffix(coordinator, zone)
+
+        # ID univoco sensore e nome basati su un nome fisso
+        self.entity_id = ENTITY_ID_FORMAT.format(
+            ("prezzo_dettaglio_previsioni" if dettaglio else "prezzo_zonale_previsioni") + id_suffix
+        )
+        self._attr_unique_id = self.entity_id
+        self._attr_name = (
+            f"Previsioni prezzo al dettaglio{name_suffix}"
+            if dettaglio
+            else f"Previsioni prezzo zonale{name_suffix}"
+        )
+        self._native_value: float | None = None
+
+        # Attributi costruiti solo quando cambia la curva dei prezzi
+        self._previsioni = self._curve[zone]
+        self._attr_extra_state_attributes = {ATTR_PREVISIONI: self._previsioni.voci}
+
+    async def async_added_to_hass(self) -> None:
+        """Entità aggiunta ad Home Assistant."""
+        await super().async_added_to_hass()
+
+        # Stato iniziale dai dati già presenti nel coordinator
+        self._aggiorna_stato()
+
+    def _handle_coordinator_update(self) -> None:
+        """Gestisce l'aggiornamento dei dati dal coordinator."""
+
+        # Ignora gli aggiornamenti che non modificano il sensore
+        if not is_update_for(self.coordinator, self._eventi):
+            return
+
+        self._aggiorna_stato()
+        self.async_write_ha_state()
+
+    def _aggiorna_stato(self) -> None:
+        """Calcola stato e attributi dai dati del coordinator."""
+        if (previsioni := self._curve[self.zone]) is not self._previsioni:
+            self._previsioni = previsioni
+            self._attr_extra_state_attributes = {ATTR_PREVISIONI: previsioni.voci}
+
+        self._native_value = self._previsioni.price_at(datetime.now(tz=timezone.utc).timestamp())
+
+    @property
+    def available(self) -> bool:
+        """Determina se il valore è disponibile."""
+        return self._native_value is not None
 
     @property
-    def icon(self) -> str:
-        """Icona da usare nel frontend."""
-        return "mdi:currency-eur"
+    def native_value(self) -> float | None:
+        """Restituisce il prezzo del periodo corrente."""
+        return None if self._native_value is None else fmt_float(self._native_value)
+
+
+class PrezzoDettaglioSensorEntity(CoordinatorEntity, SensorEntity):
+    """Sensore con il prezzo al dettaglio di una fascia (o della fascia corrente)."""
+
+    # Proprietà comuni
+    _attr_has_entity_name = True
+    _attr_should_poll = False
+    _attr_state_class = SensorStateClass.MEASUREMENT
+    _attr_suggested_display_precision = 6
+    _attr_native_unit_of_measurement = UNITA_PREZZO
+    _attr_icon = "mdi:currency-eur"
+
+    def __init__(self, coordinator: PricesDataUpdateCoordinator, fascia: Fascia | None, zone: str) -> None:
+        """Inizializza il sensore."""
+        super().__init__(coordinator)
+
+        # Inizializza coordinator, fascia (None = fascia corrente) e zona
+        self.coordinator = coordinator
+        self.fascia = fascia
+        self.zone = zone
+        id_suffix, self._name_suffix = zone_suffix(coordinator, zone)
+
+        # Eventi del coordinator che modificano il sensore
+        self._eventi = (
+            frozenset({EVENT_UPDATE_FASCIA, EVENT_UPDATE_PREZZI})
+            if fascia is None
+            else frozenset({EVENT_UPDATE_PREZZI})
+        )
+
+        # ID univoco sensore e nome basati su un nome fisso
+        if fascia is None:
+            self.entity_id = ENTITY_ID_FORMAT.format("prezzo_dettaglio_fascia_corrente" + id_suffix)
+            self._attr_name = f"Prezzo al dettaglio fascia corrente{self._name_suffix}"
+        elif fascia == Fascia.MONO:
+            self.entity_id = ENTITY_ID_FORMAT.format("prezzo_dettaglio_mono_orario" + id_suffix)
+            self._attr_name = f"Prezzo al dettaglio mono-orario{self._name_suffix}"
+        else:
+            self.entity_id = ENTITY_ID_FORMAT.format(
+                f"prezzo_dettaglio_fascia_{fascia.value.lower()}" + id_suffix
+            )
+            self._attr_name = f"Prezzo al dettaglio fascia {fascia.value}{self._name_suffix}"
+        self._attr_unique_id = self.entity_id
+        self._native_value: float | None = None
+
+    async def async_added_to_hass(self) -> None:
+        """Entità aggiunta ad Home Assistant."""
+        await super().async_added_to_hass()
+
+        # Stato iniziale dai dati già presenti nel coordinator
+        self._aggiorna_stato()
+
+    def _handle_coordinator_update(self) -> None:
+        """Gestisce l'aggiornamento dei dati dal coordinator."""
+
+        # Ignora gli aggiornamenti che non modificano il sensore
+        if not is_update_for(self.coordinator, self._eventi):
+            return
+
+        self._aggiorna_stato()
+        self.async_write_ha_state()
+
+    def _aggiorna_stato(self) -> None:
+        """Calcola stato e attributi dai dati del coordinator."""
+
+        # Prezzo già calcolato dal coordinator una volta per download
+        # (assente per le fasce senza dati)
+        fascia = self.fascia or self.coordinator.fascia_corrente
+        self._native_value = self.coordinator.dettaglio[self.zone].get(fascia)
+        if self.fascia is None:
+            self._attr_name = (
+                f"Prezzo al dettaglio fascia corrente{self._name_suffix}"
+                if fascia is None
+                else f"Prezzo al dettaglio fascia corrente ({fascia.value}){self._name_suffix}"
+            )
 
     @property
-    def name(self) -> str:
-        """Restituisce il nome del sensore."""
-        return self._friendly_name
+    def available(self) -> bool:
+        """Determina se il valore è disponibile."""
+        return self._native_value is not None
 
     @property
-    def extra_state_attributes(self) -> dict[str, Any]:
-        """Restituisce gli attributi di stato."""
+    def native_value(self) -> float | None:
+        """Restituisce il prezzo al dettaglio."""
+        return None if self._native_value is None else fmt_float(self._native_value)
 
-        data_corrente = datetime.now()
-        prossima_ora = data_corrente + timedelta(hours=1)
-        stesso_giorno = data_corrente.day == prossima_ora.day
-        stesso_mese = data_corrente.month == prossima_ora.month
+
+class FinestraEconomicaSensorEntity(CoordinatorEntity, SensorEntity):
+    """Sensore con l'inizio del periodo più economico di oggi e domani."""
+
+    # Eventi del coordinator che modificano il sensore
+    _eventi = frozenset({EVENT_UPDATE_ORARIO, EVENT_UPDATE_QUARTO_ORARIO, EVENT_UPDATE_PREZZI})
+
+    # Proprietà comuni
+    _attr_has_entity_name = True
+    _attr_should_poll = False
+    _attr_device_class = SensorDeviceClass.TIMESTAMP
+    _attr_icon = "mdi:clock-check-outline"
+
+    def __init__(self, coordinator: PricesDataUpdateCoordinator, zone: str) -> None:
+        """Inizializza il sensore."""
+        super().__init__(coordinator)
+
+        # Inizializza coordinator e zona
+        self.coordinator = coordinator
+        self.zone = zone
+        id_suffix, self._name_suffix = zone_suffix(coordinator, zone)
+
+        # ID univoco sensore basato su un nome fisso
+        self.entity_id = ENTITY_ID_FORMAT.format("prezzo_zonale_finestra_economica" + id_suffix)
+        self._attr_unique_id = self.entity_id
+        self._attr_name = f"Finestra più economica ({coordinator.cheapest_hours} h){self._name_suffix}"
+        self._finestra: CheapestWindow | None = None
+        self._attr_extra_state_attributes = {}
+
+    async def async_added_to_hass(self) -> None:
+        """Entità aggiunta ad Home Assistant."""
+        await super().async_added_to_hass()
+
+        # Stato iniziale dai dati già presenti nel coordinator
+        self._aggiorna_stato()
+
+    def _handle_coordinator_update(self) -> None:
+        """Gestisce l'aggiornamento dei dati dal coordinator."""
+
+        # Ignora gli aggiornamenti che non modificano il sensore
+        if not is_update_for(self.coordinator, self._eventi):
+            return
+
+        self._aggiorna_stato()
+        self.async_write_ha_state()
+
+    def _aggiorna_stato(self) -> None:
+        """Calcola stato e attributi dai dati del coordinator."""
+
+        # Ricerca dal prossimo quarto d'ora (memorizzata dal coordinator)
+        finestra = self.coordinator.cheapest_window(
+            self.zone, timedelta(hours=self.coordinator.cheapest_hours)
+        )
+        self._attr_name = f"Finestra più economica ({self.coordinator.cheapest_hours} h){self._name_suffix}"
+
+        # Attributi ricostruiti solo se cambia la finestra
+        if finestra != self._finestra:
+            self._finestra = finestra
+            self._attr_extra_state_attributes = (
+                {}
+                if finestra is None
+                else {"fine": finestra.fine, "prezzo_medio": round(finestra.prezzo_medio, 6)}
+            )
+
+    @property
+    def available(self) -> bool:
+        """Determina se il valore è disponibile."""
+        return self._finestra is not None
+
+    @property
+    def native_value(self) -> datetime | None:
+        """Restituisce l'inizio del periodo più economico."""
+        return None if self._finestra is None else self._finestra.inizio
+
+
+class PercentileSensorEntity(CoordinatorEntity, SensorEntity):
+    """Sensore con il percentile del prezzo corrente tra i prezzi del giorno."""
+
+    # Eventi del coordinator che modificano il sensore
+    _eventi = frozenset({EVENT_UPDATE_ORARIO, EVENT_UPDATE_QUARTO_ORARIO, EVENT_UPDATE_PREZZI})
+
+    # Proprietà comuni
+    _attr_has_entity_name = True
+    _attr_should_poll = False
+    _attr_state_class = SensorStateClass.MEASUREMENT
+    _attr_native_unit_of_measurement = PERCENTAGE
+    _attr_suggested_display_precision = 0
+    _attr_icon = "mdi:sort-numeric-ascending"
+
+    def __init__(self, coordinator: PricesDataUpdateCoordinator, zone: str) -> None:
+        """Inizializza il sensore."""
+        super().__init__(coordinator)
+
+        # Inizializza coordinator e zona
+        self.coordinator = coordinator
+        self.zone = zone
+        id_suffix, name_suffix = zone_suffix(coordinator, zone)
+
+        # ID univoco sensore e nome basati su un nome fisso
+        self.entity_id = ENTITY_ID_FORMAT.format("prezzo_zonale_percentile" + id_suffix)
+        self._attr_unique_id = self.entity_id
+        self._attr_name = f"Percentile prezzo zonale{name_suffix}"
+        self._attr_available = False
+        self._attr_native_value = None
+        self._attr_extra_state_attributes = {}
+
+    async def async_added_to_hass(self) -> None:
+        """Entità aggiunta ad Home Assistant."""
+        await super().async_added_to_hass()
+
+        # Stato iniziale dai dati già presenti nel coordinator
+        self._aggiorna_stato()
+
+    def _handle_coordinator_update(self) -> None:
+        """Gestisce l'aggiornamento dei dati dal coordinator."""
+
+        # Ignora gli aggiornamenti che non modificano il sensore
+        if not is_update_for(self.coordinator, self._eventi):
+            return
+
+        self._aggiorna_stato()
+        self.async_write_ha_state()
+
+    def _aggiorna_stato(self) -> None:
+        """Calcola stato e attributi dai dati del coordinator."""
+
+        # Percentile e posizione calcolati una volta per evento
+        rango = self.coordinator.current_rank(self.zone)
+        self._attr_available = rango is not None
+        if rango is None:
+            self._attr_native_value = None
+            self._attr_extra_state_attributes = {}
+        else:
+            self._attr_native_value = round(rank_percentile(*rango), 1)
+            self._attr_extra_state_attributes = {"posizione": rango[0] + 1, "periodi": rango[1]}
+
+
+class CostoEnergiaSensorEntity(SensorEntity, RestoreEntity):
+    """Sensore con il costo dell'energia consumata ai prezzi zonali di ciascun periodo.
+
+    Legge le variazioni di un contatore di energia e le moltiplica per il
+    prezzo del periodo in cui sono registrate; può essere usato come
+    entità di costo nella dashboard Energia.
+    """
+
+    # Lo storico giornaliero non viene salvato nel recorder
+    _unrecorded_attributes = frozenset({ATTR_STORICO})
+
+    # Proprietà comuni
+    _attr_has_entity_name = True
+    _attr_should_poll = False
+    _attr_device_class = SensorDeviceClass.MONETARY
+    _attr_state_class = SensorStateClass.TOTAL
+    _attr_native_unit_of_measurement = CURRENCY_EURO
+    _attr_suggested_display_precision = 2
+    _attr_icon = "mdi:cash"
+
+    def __init__(self, coordinator: PricesDataUpdateCoordinator, zone: str, contatore: str) -> None:
+        """Inizializza il sensore."""
+
+        # Inizializza coordinator, zona e contatore
+        self.coordinator = coordinator
+        self.zone = zone
+        self.contatore = contatore
+        id_suffix, name_suffix = zone_suffix(coordinator, zone)
+
+        # ID univoco sensore e nome basati su un nome fisso
+        self.entity_id = ENTITY_ID_FORMAT.format("costo_energia_zonale" + id_suffix)
+        self._attr_unique_id = self.entity_id
+        self._attr_name = f"Costo energia ai prezzi zonali{name_suffix}"
+        self._accumulatore = CostAccumulator()
+
+        # Voci dello storico giornaliero per gli attributi (ricostruite solo
+        # quando cambiano i giorni, altrimenti aggiornate nella sola voce del giorno)
+        self._storico: list[dict[str, Any]] = []
+        self._attr_extra_state_attributes = self._build_attributes()
+
+    async def async_added_to_hass(self) -> None:
+        """Entità aggiunta ad Home Assistant."""
+        await super().async_added_to_hass()
+
+        # Recupera i totali accumulati in precedenza, se esistono
+        if (old_data := await self.async_get_last_extra_data()) is not None:
+            self._accumulatore = CostAccumulator.from_dict(old_data.as_dict())
+            self._attr_extra_state_attributes = self._build_attributes()
+
+        # Segue le letture del contatore
+        self.async_on_remove(
+            async_track_state_change_event(
+                self.hass, [self.contatore], self._async_contatore_aggiornato
+            )
+        )
+
+    @callback
+    def _async_contatore_aggiornato(self, event: Event) -> None:
+        """Aggiunge ai totali il consumo dall'ultima lettura del contatore."""
+        nuovo_stato = event.data.get("new_state")
+        if nuovo_stato is None or nuovo_stato.state in (STATE_UNKNOWN, STATE_UNAVAILABLE):
+            return
+        try:
+            lettura = float(nuovo_stato.state) * FATTORI_ENERGIA.get(
+                nuovo_stato.attributes.get(ATTR_UNIT_OF_MEASUREMENT), 1.0
+            )
+        except ValueError:
+            return
+
+        # Prezzo e fascia del periodo della lettura
+        istante = nuovo_stato.last_updated.astimezone(time_zone)
+        fascia, _ = get_fascia(istante, 3)
+        prezzo = self.coordinator.previsioni[self.zone].price_at(istante.timestamp())
+        self._accumulatore.add(lettura, prezzo, fascia, istante.date())
+        self._attr_extra_state_attributes = self._build_attributes(istante.date())
+        self.async_write_ha_state()
+
+    def _build_attributes(self, giorno: date | None = None) -> dict[str, Any]:
+        """Costruisce i totali di oggi, di ciascuna fascia e lo storico giornaliero.
+
+        Se è indicato il giorno della lettura e i giorni dello storico non
+        sono cambiati, viene ricalcolata solo la voce di quel giorno.
+        """
+        accumulatore = self._accumulatore
+        oggi = accumulatore.storico.get(datetime.now(tz=time_zone).date(), {})
         attributi = {
-                "ora_corrente": data_corrente.hour,
-                "ora_successiva": prossima_ora.hour,
-                "prezzo_successivo": str(format(round(self.coordinator.pz_data.data[Fascia.ORARIA][prossima_ora.hour]
-                    if (self.coordinator.month_average and stesso_mese) or stesso_giorno
-                    else self.coordinator.pz_data.data[Fascia.ORARIA_NEXT][prossima_ora.hour], self._attr_suggested_display_precision), f".{self._attr_suggested_display_precision}g")),
-                "prezzo_medio": str(format(round(self.coordinator.pz_values.value[Fascia.MONO], self._attr_suggested_display_precision), f".{self._attr_suggested_display_precision}g"))
-            }
-        
-        if CommonSettings.has_suggested_display_precision:
-            return attributi
+            "energia": round(accumulatore.energia, 3),
+            "costo_oggi": round(oggi.get("costo", 0.0), 4),
+            "energia_oggi": round(oggi.get("energia", 0.0), 3),
+            "energia_senza_prezzo": round(accumulatore.energia_senza_prezzo, 3),
+        }
+        for fascia in accumulatore.costo_fasce:
+            attributi[f"costo_{fascia.value.lower()}"] = round(accumulatore.costo_fasce[fascia], 4)
+            attributi[f"energia_{fascia.value.lower()}"] = round(accumulatore.energia_fasce[fascia], 3)
+
+        storico = accumulatore.storico
+        if (
+            giorno is not None
+            and giorno == next(reversed(storico), None)
+            and len(self._storico) == len(storico)
+            and self._storico[-1]["giorno"] == giorno.isoformat()
+        ):
+            # Stessi giorni: cambia solo la voce del giorno della lettura
+            # (in una nuova lista, così gli stati precedenti restano invariati)
+            self._storico = [*self._storico[:-1], self._voce_storico(giorno, storico[giorno])]
+        elif giorno is None or giorno in storico or len(self._storico) != len(storico):
+            # Nuovo giorno, ripristino o lettura di un giorno precedente
+            self._storico = [
+                self._voce_storico(giorno_storico, totali)
+                for giorno_storico, totali in storico.items()
+            ]
+        attributi[ATTR_STORICO] = self._storico
+        return attributi
+
+    @staticmethod
+    def _voce_storico(giorno: date, totali: Mapping[str, float]) -> dict[str, Any]:
+        """Restituisce la voce dello storico di un giorno con i totali arrotondati."""
+        return {"giorno": giorno.isoformat()} | {
+            chiave: round(valore, 4 if chiave.startswith("costo") else 3)
+            for chiave, valore in totali.items()
+        }
+
+    @property
+    def extra_restore_state_data(self) -> ExtraStoredData:
+        """Determina i dati da salvare per il ripristino successivo."""
+        return RestoredExtraData(self._accumulatore.as_dict())
+
+    @property
+    def native_value(self) -> float:
+        """Restituisce il costo totale accumulato."""
+        return self._accumulatore.costo
+
+
+class StatisticheSensorEntity(CoordinatorEntity, SensorEntity):
+    """Sensore diagnostico con la durata e le statistiche dell'ultimo aggiornamento."""
+
+    # Eventi del coordinator che modificano il sensore
+    _eventi = frozenset({EVENT_UPDATE_PREZZI, EVENT_UPDATE_STATISTICHE})
+
+    # Proprietà comuni
+    _attr_has_entity_name = True
+    _attr_should_poll = False
+    _attr_entity_category = EntityCategory.DIAGNOSTIC
+    _attr_device_class = SensorDeviceClass.DURATION
+    _attr_state_class = SensorStateClass.MEASUREMENT
+    _attr_native_unit_of_measurement = UnitOfTime.MILLISECONDS
+    _attr_suggested_display_precision = 0
+    _attr_icon = "mdi:timer-outline"
+    _attr_name = "Aggiornamento prezzi zonali"
+
+    def __init__(self, coordinator: PricesDataUpdateCoordinator) -> None:
+        """Inizializza il sensore."""
+        super().__init__(coordinator)
+
+        # Inizializza coordinator
+        self.coordinator = coordinator
 
-        # Nelle versioni precedenti di Home Assistant
-        # restituisce un valore arrotondato come attributo
-        return {ATTR_ROUNDED_DECIMALS: str(format(round(self.native_value, self._attr_suggested_display_precision), f".{self._attr_suggested_display_precision}g"))} | attributi
\ No newline at end of file
+        # ID univoco sensore basato su un nome fisso
+        self.entity_id = ENTITY_ID_FORMAT.format("prezzi_zonali_aggiornamento")
+        self._attr_unique_id = self.entity_id
+        self._attr_native_value = None
+        self._attr_extra_state_attributes = {}
+
+    async def async_added_to_hass(self) -> None:
+        """Entità aggiunta ad Home Assistant."""
+        await super().async_added_to_hass()
+
+        # Stato iniziale dai dati già presenti nel coordinator
+        self._aggiorna_stato()
+
+    def _handle_coordinator_update(self) -> None:
+        """Gestisce l'aggiornamento dei dati dal coordinator."""
+
+        # Ignora gli aggiornamenti che non modificano il sensore
+        if not is_update_for(self.coordinator, self._eventi):
+            return
+
+        self._aggiorna_stato()
+        self.async_write_ha_state()
+
+    def _aggiorna_stato(self) -> None:
+        """Calcola stato e attributi dai dati del coordinator."""
+
+        # Durata come stato e statistiche come attributi
+        statistiche = self.coordinator.statistiche
+        self._attr_native_value = round(statistiche["durata_ms"], 1)
+        self._attr_extra_state_attributes = {
+            chiave: round(valore, 1) if isinstance(valore, float) else valore
+            for chiave, valore in statistiche.items()
+            if chiave != "durata_ms"
+        } | {
+            "cache_hit": self.coordinator.cache_hits,
+            "cache_miss": self.coordinator.cache_misses,
+            "prossimo_aggiornamento": self.coordinator.prossimo_aggiornamento,
+        }
+
+    @property
+    def available(self) -> bool:
+        """Determina se il valore è disponibile."""
+        return self.coordinator.statistiche["ultimo_successo"] is not None
@@ -0,0 +1,177 @@
+"""Servizi di pzo_sensor (archivio storico e finestra più economica)."""
+
+from datetime import date, datetime
+import logging
+
+from aiohttp import ClientError
+from awesomeversion.awesomeversion import AwesomeVersion
+import voluptuous as vol
+from zoneinfo import ZoneInfo
+
+from homeassistant.const import __version__ as HA_VERSION
+from homeassistant.core import HomeAssistant, ServiceCall
+from homeassistant.exceptions import HomeAssistantError
+import homeassistant.helpers.config_validation as cv
+from homeassistant.helpers.update_coordinator import UpdateFailed
+
+from .const import (
+    DOMAIN,
+    SERVICE_BACKFILL,
+    SERVICE_FIND_CHEAPEST_WINDOW,
+    SERVICE_GET_PERIOD_PRICES,
+    ZONE_CODES,
+)
+from .coordinator import PricesDataUpdateCoordinator
+
+if AwesomeVersion(HA_VERSION) >= AwesomeVersion("2023.7.0"):
+    from homeassistant.core import SupportsResponse
+
+# Ottiene il logger
+_LOGGER = logging.getLogger(__name__)
+
+ATTR_START_DATE = "start_date"
+ATTR_END_DATE = "end_date"
+ATTR_ZONE = "zone"
+ATTR_DURATION = "duration"
+ATTR_START = "start"
+ATTR_END = "end"
+ATTR_CONTIGUOUS = "contiguous"
+
+# I prezzi sono riferiti all'ora italiana
+time_zone = ZoneInfo("Europe/Rome")
+
+SCHEMA_PERIODO = vol.Schema(
+    {
+        vol.Required(ATTR_START_DATE): cv.date,
+        vol.Required(ATTR_END_DATE): cv.date,
+    }
+)
+
+SCHEMA_PREZZI_PERIODO = SCHEMA_PERIODO.extend(
+    {vol.Optional(ATTR_ZONE): vol.In(list(ZONE_CODES.keys()))}
+)
+
+SCHEMA_FINESTRA = vol.Schema(
+    {
+        vol.Required(ATTR_DURATION): cv.positive_time_period,
+        vol.Optional(ATTR_START): cv.datetime,
+        vol.Optional(ATTR_END): cv.datetime,
+        vol.Optional(ATTR_CONTIGUOUS, default=True): cv.boolean,
+        vol.Optional(ATTR_ZONE): vol.In(list(ZONE_CODES.keys())),
+    }
+)
+
+
+def _get_coordinator(hass: HomeAssistant) -> PricesDataUpdateCoordinator:
+    """Restituisce il coordinator dell'integrazione configurata."""
+    if not hass.data.get(DOMAIN):
+        raise HomeAssistantError("Integrazione non configurata.")
+    return next(iter(hass.data[DOMAIN].values()))
+
+
+def _get_periodo(call: ServiceCall) -> tuple[date, date]:
+    """Legge e verifica l'intervallo di date del servizio."""
+    inizio: date = call.data[ATTR_START_DATE]
+    fine: date = call.data[ATTR_END_DATE]
+    if fine < inizio:
+        raise HomeAssistantError("La data finale precede quella iniziale.")
+    return inizio, fine
+
+
+def _get_istante(call: ServiceCall, attributo: str) -> datetime | None:
+    """Legge un istante del servizio (senza fuso orario si intende l'ora italiana)."""
+    if (istante := call.data.get(attributo)) is None:
+        return None
+    return istante.replace(tzinfo=time_zone) if istante.tzinfo is None else istante
+
+
+def _get_zona(call: ServiceCall, coordinator: PricesDataUpdateCoordinator) -> str:
+    """Restituisce il codice della zona richiesta (per default la prima configurata)."""
+    if ATTR_ZONE not in call.data:
+        return coordinator.zones[0]
+    zona = ZONE_CODES[call.data[ATTR_ZONE]]
+    if zona not in coordinator.zones:
+        raise HomeAssistantError(f"Zona {call.data[ATTR_ZONE]} non configurata.")
+    return zona
+
+
+def async_setup_services(hass: HomeAssistant) -> None:
+    """Registra i servizi dell'integrazione."""
+
+    async def get_period_prices(call: ServiceCall) -> dict:
+        """Restituisce le medie per fascia di un periodo dall'archivio storico."""
+        coordinator = _get_coordinator(hass)
+        inizio, fine = _get_periodo(call)
+        zona = (
+            ZONE_CODES[call.data[ATTR_ZONE]]
+            if ATTR_ZONE in call.data
+            else coordinator.zones[0]
+        )
+        return await coordinator.async_query_period(inizio, fine, zona)
+
+    async def find_cheapest_window(call: ServiceCall) -> dict:
+        """Restituisce il periodo più economico di oggi e domani della durata richiesta."""
+        coordinator = _get_coordinator(hass)
+        zona = _get_zona(call, coordinator)
+        finestra = coordinator.cheapest_window(
+            zona,
+            call.data[ATTR_DURATION],
+            _get_istante(call, ATTR_START),
+            _get_istante(call, ATTR_END),
+            call.data[ATTR_CONTIGUOUS],
+        )
+        if finestra is None:
+            raise HomeAssistantError(
+                "Prezzi non disponibili per la durata richiesta prima della scadenza."
+            )
+        return {
+            "zona": zona,
+            "inizio": finestra.inizio.isoformat(),
+            "fine": finestra.fine.isoformat(),
+            "prezzo_medio": round(finestra.prezzo_medio, 6),
+            "intervalli": [
+                {"inizio": inizio.isoformat(), "fine": fine.isoformat()}
+                for inizio, fine in finestra.intervalli
+            ],
+        }
+
+    async def backfill(call: ServiceCall) -> None:
+        """Scarica dal GME i prezzi di un intervallo e li salva nell'archivio storico."""
+        coordinator = _get_coordinator(hass)
+        inizio, fine = _get_periodo(call)
+        try:
+            await coordinator.async_backfill(inizio, fine)
+        except (ValueError, UpdateFailed, ClientError, OSError) as e:
+            raise HomeAssistantError(f"Recupero dei prezzi fallito: {e}") from e
+
+    if AwesomeVersion(HA_VERSION) >= AwesomeVersion("2023.7.0"):
+        # Il servizio di interrogazione richiede le risposte ai servizi
+        hass.services.async_register(
+            DOMAIN,
+            SERVICE_GET_PERIOD_PRICES,
+            get_period_prices,
+            schema=SCHEMA_PREZZI_PERIODO,
+            supports_response=SupportsResponse.ONLY,
+        )
+        hass.services.async_register(
+            DOMAIN,
+            SERVICE_FIND_CHEAPEST_WINDOW,
+            find_cheapest_window,
+            schema=SCHEMA_FINESTRA,
+            supports_response=SupportsResponse.ONLY,
+        )
+    else:
+        _LOGGER.warning(
+            "I servizi %s e %s richiedono Home Assistant 2023.7 o successivo.",
+            SERVICE_GET_PERIOD_PRICES,
+            SERVICE_FIND_CHEAPEST_WINDOW,
+        )
+
+    hass.services.async_register(DOMAIN, SERVICE_BACKFILL, backfill, schema=SCHEMA_PERIODO)
+
+
+def async_unload_services(hass: HomeAssistant) -> None:
+    """Rimuove i servizi dell'integrazione."""
+    hass.services.async_remove(DOMAIN, SERVICE_GET_PERIOD_PRICES)
+    hass.services.async_remove(DOMAIN, SERVICE_FIND_CHEAPEST_WINDOW)
+    hass.services.async_remove(DOMAIN, SERVICE_BACKFILL)
@@ -1,17 +1,71 @@
 """Metodi di utilità generale."""
 
-from datetime import date, datetime, timedelta
+from array import array
+from calendar import monthrange
+from collections.abc import Mapping, Sequence
+from datetime import date, datetime, time, timedelta, timezone
+from functools import lru_cache
+import io
+from itertools import accumulate
 import logging
+import random
+from time import perf_counter
+from types import MappingProxyType
+from typing import IO, NamedTuple
 from zipfile import ZipFile
 
 import defusedxml.ElementTree as et  # type: ignore[import-untyped]
 import holidays
-
-from .interfaces import Fascia
+from zoneinfo import ZoneInfo
+
+from .const import (
+    CONF_MONTH_AVG,
+    CONF_RETAIL_FIXED,
+    CONF_RETAIL_LOSSES,
+    CONF_RETAIL_SPREAD,
+    CONF_RETAIL_VAT,
+    CONF_WINDOW,
+    DEFAULT_RETAIL_FIXED,
+    DEFAULT_RETAIL_LOSSES,
+    DEFAULT_RETAIL_SPREAD,
+    DEFAULT_RETAIL_VAT,
+    DEFAULT_WINDOW_DAYS,
+    DEFAULT_ZONE,
+    PAD_DAYS,
+    POLL_BACKOFF_MAX_MINUTES,
+    POLL_BACKOFF_START_MINUTES,
+    POLL_JITTER,
+    PUBLICATION_TIME,
+    WINDOW_BILLING,
+    WINDOW_DAY,
+    WINDOW_MONTH,
+    WINDOW_NAMES,
+    WINDOW_ROLLING,
+    WINDOW_WEEK,
+    ZONE_CODES,
+)
+from .interfaces import (
+    CODICI_FASCE,
+    FASCE_DA_CODICE,
+    CheapestWindow,
+    DayContribution,
+    Fascia,
+    PriceForecast,
+    PricesData,
+    PricesResult,
+    RetailTariff,
+    RunningMeans,
+    hourly_means,
+    quarter_values,
+    slot_profile,
+)
 
 # Ottiene il logger
 _LOGGER = logging.getLogger(__name__)
 
+# Usa sempre il fuso orario italiano (i dati del sito sono per il mercato italiano)
+time_zone = ZoneInfo("Europe/Rome")
+
 
 def get_fascia_for_xml(data: date, festivo: bool, ora: int) -> Fascia:
     """Restituisce la fascia oraria di un determinato giorno/ora."""
@@ -37,88 +91,78 @@ def get_fascia_for_xml(data: date, festivo: bool, ora: int) -> Fascia:
     return Fascia.F3
 
 
+@lru_cache(maxsize=8)
+def get_festivi(anno: int) -> frozenset[date]:
+    """Restituisce le festività italiane dell'anno indicato (calcolate una sola volta)."""
+    return frozenset(holidays.IT(years=anno))  # type: ignore[attr-defined]
+
+
+def is_festivo(giorno: date) -> bool:
+    """Verifica se il giorno indicato è una festività."""
+    return giorno in get_festivi(giorno.year)
+
+
+class CalendarioFasce(NamedTuple):
+    """Indice annuale delle fasce orarie per un tipo di contratto."""
+
+    # Codice fascia (CODICI_FASCE) di ogni ora dell'anno: indice = giorno * 24 + ora
+    fasce: bytes
+
+    # Indice (ore dall'inizio dell'anno, anche oltre la fine) del prossimo cambio di fascia
+    prossimo_cambio: array
+
+
+@lru_cache(maxsize=8)
+def get_calendario_fasce(anno: int, contract: int) -> CalendarioFasce:
+    """Costruisce l'indice delle fasce orarie dell'anno per il contratto indicato.
+
+    Viene calcolato una sola volta per anno e contratto; comprende anche
+    le prime settimane dell'anno successivo per determinare i cambi di fascia
+    a cavallo di fine anno.
+    """
+    inizio = date(anno, 1, 1)
+    giorni_anno = (date(anno + 1, 1, 1) - inizio).days
+    codici = bytearray()
+
+    for n in range(giorni_anno + 21):
+        giorno = inizio + timedelta(days=n)
+        festivo = is_festivo(giorno)
+        for ora in range(24):
+            fascia = get_fascia_for_xml(giorno, festivo, ora)
+            # Nel bi-orario le fasce F2 e F3 sono accorpate
+            if contract == 2 and fascia != Fascia.F1:
+                fascia = Fascia.F23
+            codici.append(CODICI_FASCE[fascia])
+
+    # Calcola a ritroso l'ora del prossimo cambio di fascia
+    prossimo_cambio = array("l", [len(codici)] * len(codici))
+    for i in range(len(codici) - 2, -1, -1):
+        prossimo_cambio[i] = i + 1 if codici[i + 1] != codici[i] else prossimo_cambio[i + 1]
+
+    return CalendarioFasce(
+        fasce=bytes(codici[: giorni_anno * 24]),
+        prossimo_cambio=prossimo_cambio[: giorni_anno * 24],
+    )
+
+
 def get_fascia(dataora: datetime, contract: int) -> tuple[Fascia, datetime]:
     """Restituisce la fascia della data/ora indicata e la data del prossimo cambiamento."""
 
-    # Verifica se la data corrente è un giorno con festività
-    festivo = dataora in holidays.IT()  # type: ignore[attr-defined]
-
-    # Identifica la fascia corrente
     # F1 = lu-ve 8-19
     # F2 = lu-ve 7-8, lu-ve 19-23, sa 7-23
     # F3 = lu-sa 0-7, lu-sa 23-24, do, festivi
-    # Festivi
-    if festivo or dataora.weekday() in [5, 6]:
-        if contract == 2:
-            fascia = Fascia.F23
-            # Prossima fascia: alle 8 di un giorno non domenica, sabato o festività
-            prossima = get_next_date(dataora, 8, 1, True, True)
-
-            return fascia, prossima
-            
-        elif dataora.weekday() != 5:
-            fascia = Fascia.F3
-            # Prossima fascia: alle 7 di un giorno non domenica o festività
-            prossima = get_next_date(dataora, 7, 1, True)
-
-            return fascia, prossima
-    
-    match dataora.weekday():
-        # Sabato
-        case 5:
-            if contract != 2:
-                if 7 <= dataora.hour < 23:
-                    # Sabato dalle 7 alle 23
-                    fascia = Fascia.F2
-                    # Prossima fascia: alle 23 dello stesso giorno
-                    prossima = get_next_date(dataora, 23)
-                # abbiamo solo due fasce quindi facciamo solo il check per la prossima fascia
-                else:
-                    # Sabato dopo le 23 e prima delle 7
-                    fascia = Fascia.F3
-
-                    if dataora.hour < 7:
-                        # Prossima fascia: alle 7 dello stesso giorno
-                        prossima = get_next_date(dataora, 7)
-                    else:
-                        # Prossima fascia: alle 7 di un giorno non domenica o festività
-                        prossima = get_next_date(dataora, 7, 1, True)
-
-        # Altri giorni della settimana
-        case _:
-            if 8 <= dataora.hour < 19:
-                # Lunedì-venerdì dalle 8 alle 19
-                fascia = Fascia.F1
-                # Prossima fascia: alle 19 dello stesso giorno
-                prossima = get_next_date(dataora, 19)
-                
-            elif (dataora.hour == 7 or 19 <= dataora.hour < 23) and contract != 2:
-                # Lunedì-venerdì dalle 7 alle 8 e dalle 19 alle 23
-                fascia = Fascia.F2
-
-                if dataora.hour == 7:
-                    # Prossima fascia: alle 8 dello stesso giorno
-                    prossima = get_next_date(dataora, 8)
-                else:
-                    # Prossima fascia: alle 23 dello stesso giorno
-                    prossima = get_next_date(dataora, 23)
-
-            elif contract != 2:
-                # Lunedì-venerdì dalle 23 alle 7 del giorno dopo
-                fascia = Fascia.F3
-
-                if dataora.hour < 7:
-                    # Siamo dopo la mezzanotte
-                    # Prossima fascia: alle 7 dello stesso giorno
-                    prossima = get_next_date(dataora, 7)
-                else:
-                    # Prossima fascia: alle 7 di un giorno non domenica o festività
-                    prossima = get_next_date(dataora, 7, 1, True)
-
-            else:
-                fascia = Fascia.F23
-                # Prossima fascia: alle 8 di un giorno non domenica, sabato o festività
-                prossima = get_next_date(dataora, 8, 1, True, True)
+    # F23 = tutto tranne F1 (solo bi-orario)
+    calendario = get_calendario_fasce(dataora.year, contract)
+    indice = (dataora.timetuple().tm_yday - 1) * 24 + dataora.hour
+
+    # Identifica la fascia corrente e l'ora del prossimo cambio
+    fascia = FASCE_DA_CODICE[calendario.fasce[indice]]
+    ore_cambio = calendario.prossimo_cambio[indice]
+    prossima = datetime.combine(
+        date(dataora.year, 1, 1) + timedelta(days=ore_cambio // 24),
+        time(ore_cambio % 24),
+        tzinfo=dataora.tzinfo,
+    )
 
     return fascia, prossima
 
@@ -144,99 +188,752 @@ def get_next_date(dataora: datetime, ora: int, offset: int = 0, feriale: bool =
     )
 
     if feriale:
-        while prossima in holidays.IT() or prossima.weekday() == 6 or (sabato and prossima.weekday() == 5):  # type: ignore[attr-defined]
+        while is_festivo(prossima.date()) or prossima.weekday() == 6 or (sabato and prossima.weekday() == 5):
             prossima += timedelta(days=1)
 
     return prossima
 
 
-def extract_xml(priceArchive: ZipFile, pz_data: dict, zone: str, mediaMese: True) -> list[dict[Fascia, list[float]]]:
+def get_window(
+    tipo: str,
+    oggi: date,
+    giorni: int = DEFAULT_WINDOW_DAYS,
+    giorno_fatturazione: int = 1,
+    actual_data_only: bool = False,
+) -> tuple[date, date]:
+    """Ritorna il primo e l'ultimo giorno della finestra di calcolo delle medie che contiene oggi.
+
+    Args:
+    tipo (str): WINDOW_MONTH (mese corrente), WINDOW_DAY (solo oggi), WINDOW_ROLLING
+        (ultimi giorni), WINDOW_WEEK (settimana ISO) o WINDOW_BILLING (ciclo di fatturazione).
+    oggi (date): il giorno di riferimento.
+    giorni (int): numero di giorni della finestra WINDOW_ROLLING.
+    giorno_fatturazione (int): giorno del mese di inizio del ciclo di fatturazione
+        (nei mesi più corti, l'ultimo giorno del mese).
+    actual_data_only (bool): se False, nei primi giorni di una finestra di
+        calendario (mese, settimana, ciclo) include anche i PAD_DAYS giorni precedenti.
+
+    L'ultimo giorno non è mai successivo a domani (i prezzi futuri non sono noti).
+
+    """
+    if tipo == WINDOW_DAY:
+        inizio = fine = oggi
+    elif tipo == WINDOW_ROLLING:
+        inizio, fine = oggi - timedelta(days=max(giorni, 1) - 1), oggi
+    elif tipo == WINDOW_WEEK:
+        inizio = oggi - timedelta(days=oggi.weekday())
+        fine = inizio + timedelta(days=6)
+    elif tipo == WINDOW_BILLING:
+        def inizio_ciclo(anno: int, mese: int) -> date:
+            return date(anno, mese, min(giorno_fatturazione, monthrange(anno, mese)[1]))
+
+        inizio = inizio_ciclo(oggi.year, oggi.month)
+        if inizio > oggi:
+            mese_prec = oggi.replace(day=1) - timedelta(days=1)
+            inizio = inizio_ciclo(mese_prec.year, mese_prec.month)
+        mese_succ = (inizio.replace(day=1) + timedelta(days=32)).replace(day=1)
+        fine = inizio_ciclo(mese_succ.year, mese_succ.month) - timedelta(days=1)
+    else:
+        inizio = oggi.replace(day=1)
+        fine = date(oggi.year, oggi.month, monthrange(oggi.year, oggi.month)[1])
+
+    # Nei primi giorni della finestra aggiunge quelli precedenti, per avere
+    # sempre prezzi per tutte le fasce
+    if (
+        not actual_data_only
+        and tipo in (WINDOW_MONTH, WINDOW_WEEK, WINDOW_BILLING)
+        and (oggi - inizio).days < PAD_DAYS
+    ):
+        inizio -= timedelta(days=PAD_DAYS)
+
+    return inizio, min(fine, oggi + timedelta(days=1))
+
+
+def get_publication_time(giorno: date) -> datetime:
+    """Ritorna l'orario (fuso italiano) in cui sono normalmente pubblicati i prezzi MGP del giorno successivo."""
+    return datetime.combine(giorno, PUBLICATION_TIME, tzinfo=time_zone)
+
+
+def get_backoff_delay(tentativo: int, rng: random.Random | None = None) -> timedelta:
+    """Ritorna l'attesa prima del tentativo successivo (backoff esponenziale con jitter).
+
+    Args:
+    tentativo (int): numero di tentativi già effettuati (da 0).
+    rng (Random | None): generatore casuale (per default quello del modulo random).
+
+    """
+    minuti = min(POLL_BACKOFF_START_MINUTES * 2 ** tentativo, POLL_BACKOFF_MAX_MINUTES)
+    return timedelta(
+        minutes=minuti * (rng or random).uniform(1 - POLL_JITTER, 1 + POLL_JITTER)
+    )
+
+
+def _parse_prezzo(prezzo_string: str) -> float:
+    """Restituisce in €/kWh un prezzo dell'XML (in €/MWh con virgola decimale)."""
+    return float(prezzo_string.replace(".", "").replace(",", ".")) / 1000
+
+
+def _parse_data(dat_string: str) -> date:
+    """Restituisce la data corrispondente alla stringa giorno dell'XML (YYYYMMDD)."""
+    return date(int(dat_string[0:4]), int(dat_string[4:6]), int(dat_string[6:8]))
+
+
+def _build_day(periodi: list[tuple[int, int | None, dict[str, str]]]) -> dict[str, list[float]]:
+    """Ordina i prezzi letti da un file XML per periodo di mercato.
+
+    Ogni periodo è descritto da (Ora, Periodo, dict[zona, prezzo]).
+    Se il file contiene Periodo (prezzi al quarto d'ora) viene usato come indice,
+    eventualmente relativo all'ora se non supera mai 4; altrimenti l'indice è Ora.
+    I giorni del cambio d'ora hanno 23/25 ore (92/100 quarti d'ora).
+
+    Returns dict[zona, list[prezzo: float]]
+    """
+    indici: list[int] = []
+    max_periodo = max((pe for _, pe, _ in periodi if pe is not None), default=None)
+    for ora, periodo, _ in periodi:
+        if periodo is None:
+            indici.append(ora - 1)
+        elif max_periodo <= 4:
+            indici.append((ora - 1) * 4 + periodo - 1)
+        else:
+            indici.append(periodo - 1)
+
+    numero_periodi = max(indici, default=-1) + 1
+    prezzi_giorno: dict[str, list[float]] = {}
+    for indice, (_, _, valori) in zip(indici, periodi, strict=True):
+        if indice < 0:
+            _LOGGER.debug("Periodo %s ignorato.", indice + 1)
+            continue
+
+        # Estrae il prezzo zonale dall'XML in un float
+        for zone, prezzo_string in valori.items():
+            if zone not in prezzi_giorno:
+                prezzi_giorno[zone] = [0.0] * numero_periodi
+            prezzi_giorno[zone][indice] = _parse_prezzo(prezzo_string)
+
+    return prezzi_giorno
+
+
+def parse_xml_tree(xml_file: IO[bytes], zones: list[str]) -> tuple[date, dict[str, list[float]]] | None:
+    """Estrae i prezzi di un file XML costruendone l'intero albero.
+
+    Returns tuple(data, dict[zona, list[prezzo: float]]) o None se il file non è valido
+
+    """
+    # Parsing dell'XML (1 file = 1 giorno)
+    xml_prices_root = et.parse(xml_file).getroot()
+    price_element = xml_prices_root.find("Prezzi")
+
+    if price_element == None:
+        _LOGGER.warning(f'Il file non contiene dati validi.')
+        return None
+
+    # Estrae la data dal primo elemento (sarà identica per gli altri)
+    dat_string = price_element.find("Data")  # YYYYMMDD
+    if dat_string == None or price_element.find("Ora") == None:
+        _LOGGER.warning(f'Il file non contiene dati validi.')
+        return None
+
+    # Considera solo le zone presenti nel file
+    zone_file = [z for z in zones if price_element.find(z) != None]
+    if not zone_file:
+        _LOGGER.warning(f'Nessun prezzo per le zone {zones} trovato nel file.')
+        return None
+
+    # Estrae le rimanenti informazioni
+    periodi: list[tuple[int, int | None, dict[str, str]]] = []
+    for prezzi in xml_prices_root.iter("Prezzi"):
+        periodo = prezzi.find("Periodo")
+        periodi.append(
+            (
+                int(prezzi.find("Ora").text),  # 1..24
+                int(periodo.text) if periodo != None else None,
+                {zone: prezzi.find(zone).text for zone in zone_file},
+            )
+        )
+
+    return _parse_data(dat_string.text), _build_day(periodi)
+
+
+def parse_xml_stream(xml_file: IO[bytes], zones: list[str]) -> tuple[date, dict[str, list[float]]] | None:
+    """Estrae i prezzi di un file XML in un unico passaggio con iterparse.
+
+    Ogni elemento Prezzi viene letto una sola volta (data, ora, periodo e tutte
+    le zone richieste) e subito rimosso dall'albero, senza allocare l'intero documento.
+
+    Returns tuple(data, dict[zona, list[prezzo: float]]) o None se il file non è valido
+
+    """
+    zone_richieste = set(zones)
+    dat_date: date | None = None
+    periodi: list[tuple[int, int | None, dict[str, str]]] = []
+    root = None
+
+    for event, elem in et.iterparse(xml_file, events=("start", "end")):
+        if event == "start":
+            # Memorizza la radice per poterla svuotare man mano
+            if root is None:
+                root = elem
+            continue
+
+        if elem.tag != "Prezzi":
+            continue
+
+        ora = None
+        periodo = None
+        valori: dict[str, str] = {}
+        for child in elem:
+            if child.tag in zone_richieste:
+                valori[child.tag] = child.text
+            elif child.tag == "Ora":
+                ora = int(child.text)  # 1..24
+            elif child.tag == "Periodo":
+                periodo = int(child.text)
+            elif child.tag == "Data" and dat_date is None:
+                dat_date = _parse_data(child.text)
+
+        if ora is not None and valori:
+            periodi.append((ora, periodo, valori))
+
+        # Libera la memoria degli elementi già letti
+        elem.clear()
+        root.clear()
+
+    if dat_date is None:
+        _LOGGER.warning("Il file non contiene dati validi.")
+        return None
+
+    if not periodi:
+        _LOGGER.warning("Nessun prezzo per le zone %s trovato nel file.", zones)
+        return None
+
+    return dat_date, _build_day(periodi)
+
+
+def parse_xml_archive(
+    priceArchive: ZipFile,
+    zones: list[str],
+    streaming: bool = True,
+    tempi: list[float] | None = None,
+) -> dict[date, dict[str, list[float]]]:
+    """Estrae i prezzi di ogni zona da un archivio zip contenente un XML per giorno.
+
+    Con streaming=True usa parse_xml_stream, altrimenti parse_xml_tree.
+    Se indicata, la lista tempi riceve la durata (ms) della lettura di ogni file.
+
+    Returns dict[data, dict[zona, list[prezzo per periodo: float]]]
+
+    """
+    parse_xml = parse_xml_stream if streaming else parse_xml_tree
+    giorni: dict[date, dict[str, list[float]]] = {}
+
+    # Esamina ogni file XML negli ZIP (ordinandoli prima)
+    for pf in sorted(priceArchive.namelist()):
+        _LOGGER.debug('Lettura del file "%s".', pf)
+        # Scompatta il file XML direttamente dall'archivio
+        inizio = perf_counter()
+        try:
+            with priceArchive.open(pf) as xml_file:
+                risultato = parse_xml(xml_file, zones)
+        except(Exception) as e:
+            _LOGGER.debug("Errore: %s", e)
+            continue
+        finally:
+            if tempi is not None:
+                tempi.append((perf_counter() - inizio) * 1000)
+
+        if risultato is not None:
+            dat_date, prezzi_giorno = risultato
+            giorni[dat_date] = prezzi_giorno
+
+    return giorni
+
+
+@lru_cache(maxsize=128)
+def get_periodi_giorno(giorno: date, numero_periodi: int) -> tuple[tuple[datetime, ...], bytes]:
+    """Restituisce l'indice dei periodi di mercato di un giorno.
+
+    I periodi GME (Ora 1..23/24/25 o quarti d'ora 1..92/96/100) sono consecutivi
+    a partire dalla mezzanotte italiana, quindi ciascuno corrisponde a un istante
+    UTC preciso anche nei giorni del cambio d'ora.
+
+    Returns tuple(istanti di inizio UTC, posizione nel giorno in ora locale)
+
+    """
+    periodi_ora = 4 if numero_periodi > 25 else 1
+    durata = timedelta(hours=1) / periodi_ora
+    mezzanotte = datetime.combine(giorno, time(0), tzinfo=time_zone).astimezone(timezone.utc)
+
+    istanti = tuple(mezzanotte + durata * p for p in range(numero_periodi))
+    slot = bytearray()
+    for istante in istanti:
+        locale = istante.astimezone(time_zone)
+        slot.append(locale.hour * periodi_ora + locale.minute // 15 % periodi_ora)
+
+    return istanti, bytes(slot)
+
+
+def aggregate_prices(giorni: Mapping[date, Sequence[float]], oggi: date, fine_media: date) -> PricesData:
+    """Raggruppa i prezzi di più giorni per fascia.
+
+    Un giorno viene incluso nelle medie se non è successivo a fine_media
+    (l'ultimo giorno della finestra di calcolo, vedi get_window).
+    I prezzi di domani sono sempre riportati anche in PricesData.domani.
+    Se almeno un giorno è al quarto d'ora, i giorni orari vengono
+    ripetuti su 4 periodi così che le medie restino pesate sul tempo.
+    Fasce e profili usano l'ora locale di ciascun periodo (vedi get_periodi_giorno).
+
+    """
+    domani = oggi + timedelta(days=1)
+
+    # Usa la risoluzione più fine tra i giorni presenti
+    periodi = 96 if any(len(prezzi) > 25 for prezzi in giorni.values()) else 24
+    periodi_ora = periodi // 24
+    pz_data = PricesData(periodi)
+
+    for dat_date in sorted(giorni):
+        if dat_date > fine_media:
+            continue
+
+        prezzi = giorni[dat_date]
+        if periodi == 96 and len(prezzi) <= 25:
+            prezzi = quarter_values(prezzi)
+
+        # Legge le fasce del giorno dall'indice annuale (una per ogni periodo)
+        _, slot = get_periodi_giorno(dat_date, len(prezzi))
+        indice = (dat_date.timetuple().tm_yday - 1) * 24
+        fasce_ore = get_calendario_fasce(dat_date.year, 3).fasce[indice : indice + 24]
+        fasce = bytes(fasce_ore[posizione // periodi_ora] for posizione in slot)
+        pz_data.add_day(dat_date, prezzi, fasce, slot)
+
+    # Calcola la media di ciascun periodo sui giorni inclusi
+    profilo = pz_data.profile()
+    pz_data.orario = hourly_means(profilo)
+    pz_data.quarti = quarter_values(profilo)
+
+    if domani in giorni:
+        prezzi_domani = giorni[domani]
+        _, slot = get_periodi_giorno(domani, len(prezzi_domani))
+        profilo_domani = slot_profile(prezzi_domani, slot, 96 if len(prezzi_domani) > 25 else 24)
+        pz_data.domani = hourly_means(profilo_domani)
+        pz_data.quarti_domani = quarter_values(profilo_domani)
+
+    return pz_data
+
+
+def day_ranks(prezzi: Sequence[float]) -> array:
+    """Restituisce la posizione di ciascun prezzo nella classifica del giorno (0 = il più basso).
+
+    A parità di prezzo precede il periodo più vicino all'inizio del giorno.
+    """
+    ranghi = array("H", bytes(2 * len(prezzi)))
+    for rango, indice in enumerate(sorted(range(len(prezzi)), key=prezzi.__getitem__)):
+        ranghi[indice] = rango
+    return ranghi
+
+
+def rank_percentile(rango: int, periodi: int) -> float:
+    """Restituisce il percentile del prezzo nel giorno (0 = il più basso, 100 = il più alto)."""
+    return 100 * rango / (periodi - 1) if periodi > 1 else 0.0
+
+
+def is_among_cheapest(rango: int, periodi: int, ore: int) -> bool:
+    """Indica se il periodo è tra le ore indicate più economiche del giorno.
+
+    Per i giorni al quarto d'ora ogni ora corrisponde a 4 periodi; per
+    le ore più costose basta passare la posizione dal fondo della classifica.
+    """
+    return rango < ore * (4 if periodi > 25 else 1)
+
+
+def build_forecast(
+    giorni: Mapping[date, Sequence[float]], oggi: date, tariffa: RetailTariff | None = None
+) -> PriceForecast:
+    """Costruisce la curva dei prezzi di oggi e domani (se pubblicato).
+
+    Ogni giorno mantiene la risoluzione pubblicata (oraria o al quarto
+    d'ora); gli istanti di inizio seguono i periodi GME anche nei giorni
+    del cambio d'ora. Per ogni giorno viene calcolata anche la classifica
+    dei prezzi, così che posizione e percentile del periodo corrente siano
+    letti direttamente. Nelle voci per gli attributi l'inizio è in ora
+    locale (ISO 8601) e il prezzo è arrotondato a 6 decimali, per
+    contenere la dimensione dello stato.
+    Se è indicata una tariffa, la curva è quella dei prezzi al dettaglio.
+    """
+    istanti: list[float] = []
+    prezzi: list[float] = []
+    voci: list[Mapping[str, str | float]] = []
+    quarti = array("d")
+    ranghi = array("H")
+    periodi = array("H")
+    fine = 0.0
+
+    for giorno in (oggi, oggi + timedelta(days=1)):
+        if giorno not in giorni:
+            break
+        prezzi_giorno = giorni[giorno] if tariffa is None else tariffa.apply_all(giorni[giorno])
+        inizi, _ = get_periodi_giorno(giorno, len(prezzi_giorno))
+        for inizio, prezzo in zip(inizi, prezzi_giorno, strict=True):
+            istanti.append(inizio.timestamp())
+            prezzi.append(prezzo)
+            voci.append(
+                {
+                    "start": inizio.astimezone(time_zone).isoformat(),
+                    "price": round(prezzo, 6),
+                }
+            )
+        durata = timedelta(hours=1) / (4 if len(prezzi_giorno) > 25 else 1)
+        fine = (inizi[-1] + durata).timestamp()
+        ripetizioni = 1 if len(prezzi_giorno) > 25 else 4
+        quarti.extend(prezzi_giorno if ripetizioni == 1 else quarter_values(prezzi_giorno))
+        ranghi.extend(
+            rango for rango in day_ranks(prezzi_giorno) for _ in range(ripetizioni)
+        )
+        periodi.extend([len(prezzi_giorno)] * (len(prezzi_giorno) * ripetizioni))
+
+    return PriceForecast(
+        tuple(istanti),
+        tuple(prezzi),
+        fine,
+        tuple(voci),
+        quarti,
+        array("d", accumulate(quarti, initial=0.0)),
+        ranghi,
+        periodi,
+    )
+
+
+def find_cheapest_window(
+    previsioni: PriceForecast, primo: int, ultimo: int, numero: int, contigua: bool = True
+) -> CheapestWindow | None:
+    """Cerca i quarti d'ora più economici tra primo (incluso) e ultimo (escluso).
+
+    Con contigua=True cerca la finestra di numero quarti d'ora consecutivi
+    con la somma minima, con una finestra scorrevole sulle somme cumulative
+    (O(n)); altrimenti sceglie i numero quarti d'ora più economici anche
+    non consecutivi. A parità di prezzo viene preferito il periodo più vicino.
+    Restituisce None se l'intervallo è più breve della durata richiesta.
+    """
+    if numero <= 0 or ultimo - primo < numero:
+        return None
+
+    if contigua:
+        somme = previsioni.somme
+        migliore = min(
+            range(primo, ultimo - numero + 1), key=lambda i: somme[i + numero] - somme[i]
+        )
+        scelti = [(migliore, migliore + numero)]
+        totale = somme[migliore + numero] - somme[migliore]
+    else:
+        quarti = previsioni.quarti
+        indici = sorted(sorted(range(primo, ultimo), key=quarti.__getitem__)[:numero])
+        totale = sum(quarti[i] for i in indici)
+
+        # Raggruppa i quarti d'ora consecutivi in intervalli
+        scelti = []
+        for indice in indici:
+            if scelti and scelti[-1][1] == indice:
+                scelti[-1] = (scelti[-1][0], indice + 1)
+            else:
+                scelti.append((indice, indice + 1))
+
+    origine = previsioni.istanti[0]
+    intervalli = tuple(
+        (
+            datetime.fromtimestamp(origine + inizio * 900, tz=time_zone),
+            datetime.fromtimestamp(origine + fine * 900, tz=time_zone),
+        )
+        for inizio, fine in scelti
+    )
+    return CheapestWindow(
+        intervalli[0][0], intervalli[-1][1], totale / numero, intervalli
+    )
+
+
+def day_contribution(giorno: date, prezzi: Sequence[float]) -> DayContribution:
+    """Calcola il contributo di un giorno alle somme per fascia e per quarto d'ora."""
+    prezzi_quarti = quarter_values(prezzi)
+    _, slot = get_periodi_giorno(giorno, len(prezzi_quarti))
+    indice = (giorno.timetuple().tm_yday - 1) * 24
+    fasce_ore = get_calendario_fasce(giorno.year, 3).fasce[indice : indice + 24]
+
+    somme_fasce = [0.0] * 5
+    conteggi_fasce = [0] * 5
+    somme_slot = array("d", bytes(8 * 96))
+    conteggi_slot = array("l", bytes(array("l").itemsize * 96))
+    for prezzo, posizione in zip(prezzi_quarti, slot, strict=True):
+        codice = fasce_ore[posizione // 4]
+        somme_fasce[codice] += prezzo
+        conteggi_fasce[codice] += 1
+        somme_slot[posizione] += prezzo
+        conteggi_slot[posizione] += 1
+
+    return DayContribution(
+        tuple(prezzi), tuple(somme_fasce), tuple(conteggi_fasce), somme_slot, conteggi_slot
+    )
+
+
+def update_running_means(
+    medie: RunningMeans, giorni: Mapping[date, Sequence[float]], oggi: date, fine_media: date
+) -> tuple[PricesData, int, int]:
+    """Aggiorna le somme progressive con i soli giorni entrati o usciti dalle medie.
+
+    Include gli stessi giorni di aggregate_prices; restituisce un PricesData con
+    i profili medi e i prezzi di domani (senza i prezzi dei singoli giorni),
+    il numero di giorni aggiunti e quello dei giorni rimossi.
+
+    """
+    domani = oggi + timedelta(days=1)
+    inclusi = {giorno for giorno in giorni if giorno <= fine_media}
+
+    # Toglie i giorni usciti dall'intervallo o con prezzi corretti
+    rimossi = [
+        giorno
+        for giorno, contributo in medie.giorni.items()
+        if giorno not in inclusi or contributo.prezzi != tuple(giorni[giorno])
+    ]
+    for giorno in rimossi:
+        medie.remove(giorno)
+
+    # Aggiunge i giorni nuovi
+    aggiunti = sorted(inclusi - medie.giorni.keys())
+    for giorno in aggiunti:
+        medie.add(giorno, day_contribution(giorno, giorni[giorno]))
+
+    pz_data = PricesData(96)
+    profilo = medie.profile()
+    pz_data.orario = hourly_means(profilo)
+    pz_data.quarti = profilo
+
+    if domani in giorni:
+        prezzi_domani = giorni[domani]
+        _, slot = get_periodi_giorno(domani, len(prezzi_domani))
+        profilo_domani = slot_profile(prezzi_domani, slot, 96 if len(prezzi_domani) > 25 else 24)
+        pz_data.domani = hourly_means(profilo_domani)
+        pz_data.quarti_domani = quarter_values(profilo_domani)
+
+    return pz_data, len(aggiunti), len(rimossi)
+
+
+def extract_xml(priceArchive: ZipFile, pz_data: dict, zone: str, mediaMese: True, streaming: bool = True) -> list[dict[Fascia, list[float]]]:
     """Estrae i valori dei prezzi per ogni fascia da un archivio zip contenente un XML per giorno del mese.
 
+    Con streaming=False usa il parser ad albero completo (per confronto).
+
     Returns tuple(zonali, consumi zonali):
     List[ list[ORARIA: float], list[F1: float], list[F2: float], list[F3: float], list[F23: float] ]
 
     """
-    # Carica le festività
-    it_holidays = holidays.IT()  # type: ignore[attr-defined]
+    giorni = {
+        dat_date: prezzi[zone]
+        for dat_date, prezzi in parse_xml_archive(priceArchive, [zone], streaming).items()
+        if zone in prezzi
+    }
     oggi = datetime.now().date()
+    _, fine_media = get_window(WINDOW_MONTH if mediaMese else WINDOW_DAY, oggi)
+    pz_data.update(aggregate_prices(giorni, oggi, fine_media).data)
 
-    # Azzera i dati precedenti
-    for f in pz_data.keys():
-        if (f not in [Fascia.ORARIA, Fascia.ORARIA_NEXT]): pz_data[f].clear()
+    for ora, prezzo in enumerate(pz_data[Fascia.ORARIA]):
+        _LOGGER.debug(f'Prezzo {zone} ora {ora}: {prezzo}.')
 
-    # Esamina ogni file XML negli ZIP (ordinandoli prima)
-    priceFiles = priceArchive.namelist()
-    fileNumber = len(priceFiles)
+    return pz_data
 
-    for pf in sorted(priceFiles):
-        _LOGGER.debug(f'Lettura del file "{pf}".')
-        # Scompatta il file XML in memoria
-        try:
-            xml_prices_tree = et.parse(priceArchive.open(pf))
-        except(Exception) as e:
-            _LOGGER.debug(f'Errore: {e}')
 
-        # Parsing dell'XML (1 file = 1 giorno)
-        xml_prices_root = xml_prices_tree.getroot()
-        price_element = xml_prices_root.find("Prezzi")
+def get_window_name(options: Mapping, data: Mapping) -> str:
+    """Restituisce il nome della finestra di calcolo delle medie configurata.
 
-        if price_element == None:
-            _LOGGER.warning(f'Il file non contiene dati validi.')
-            fileNumber -= 1
-            continue
-        
-        # Estrae la data dal primo elemento (sarà identica per gli altri)
-        dat_string = price_element.find("Data")  # YYYYMMDD
-        if dat_string == None or price_element.find("Ora") == None:
-            _LOGGER.warning(f'Il file non contiene dati validi.')
-            fileNumber -= 1
-            continue
+    Le configurazioni precedenti (solo CONF_MONTH_AVG) usano il mese
+    o il giorno corrente.
+    """
+    if CONF_WINDOW in options:
+        return options[CONF_WINDOW]
+    if CONF_WINDOW in data:
+        return data[CONF_WINDOW]
+    if options.get(CONF_MONTH_AVG, data.get(CONF_MONTH_AVG, True)):
+        return WINDOW_NAMES[WINDOW_MONTH]
+    return WINDOW_NAMES[WINDOW_DAY]
 
-        # Controlla i prezzi zonali siano presenti, altrimenti passa al giorno successivo
-        if price_element == None or price_element.find(zone) == None:
-            fileNumber -= 1
-            _LOGGER.warning(f'Nessun prezzo per zona "{zone}" trovato nel file.')
-            continue
 
-        # Converte la stringa giorno in data
-        dat_date = date(
-            int(dat_string.text[0:4]),
-            int(dat_string.text[4:6]),
-            int(dat_string.text[6:8]),
+def get_retail_tariff(options: Mapping, data: Mapping) -> RetailTariff | None:
+    """Restituisce il modello del prezzo al dettaglio configurato.
+
+    Restituisce None se non è stato indicato nessun dato del contratto.
+    Le opzioni, se presenti, sostituiscono la configurazione iniziale,
+    così che svuotando i campi il modello venga disattivato.
+    """
+    fonte = options if options else data
+    if not any(
+        fonte.get(chiave) is not None
+        for chiave in (CONF_RETAIL_SPREAD, CONF_RETAIL_FIXED, CONF_RETAIL_LOSSES, CONF_RETAIL_VAT)
+    ):
+        return None
+    return RetailTariff(
+        spread=fonte.get(CONF_RETAIL_SPREAD, DEFAULT_RETAIL_SPREAD),
+        fissi=fonte.get(CONF_RETAIL_FIXED, DEFAULT_RETAIL_FIXED),
+        perdite=fonte.get(CONF_RETAIL_LOSSES, DEFAULT_RETAIL_LOSSES),
+        iva=fonte.get(CONF_RETAIL_VAT, DEFAULT_RETAIL_VAT),
+    )
+
+
+def get_zone_codes(zone: str | list[str]) -> list[str]:
+    """Restituisce i codici XML delle zone configurate (accetta anche il vecchio formato a zona singola)."""
+    if isinstance(zone, str):
+        zone = [zone]
+    return [ZONE_CODES[z] for z in zone if z in ZONE_CODES] or [ZONE_CODES[DEFAULT_ZONE]]
+
+
+def extract_days(
+    archivio: bytes | IO[bytes], tempi: list[float] | None = None
+) -> dict[date, Mapping[str, tuple[float, ...]]]:
+    """Estrae dall'archivio ZIP scaricato i prezzi di tutte le zone note per ogni giorno."""
+    giorni: dict[date, Mapping[str, tuple[float, ...]]] = {}
+
+    if isinstance(archivio, bytes):
+        archivio = io.BytesIO(archivio)
+    archivio.seek(0)
+    with ZipFile(archivio, "r") as priceArchive:
+        # Mostra i file nell'archivio
+        nFile = priceArchive.namelist()
+        _LOGGER.debug(
+            "%s file trovati nell'archivio (%s)",
+            len(nFile),
+            ", ".join(str(fn) for fn in nFile),
         )
-        domani = oggi < dat_date
 
-        # Verifica la festività
-        festivo = dat_date in it_holidays
+        for dat_date, prezzi in parse_xml_archive(priceArchive, list(ZONE_CODES.values()), tempi=tempi).items():
+            giorni[dat_date] = MappingProxyType(
+                {z: tuple(p) for z, p in prezzi.items()}
+            )
 
-        # Estrae le rimanenti informazioni
-        for prezzi in xml_prices_root.iter("Prezzi"):
-            # Estrae l'ora dall'XML
-            ora = int(prezzi.find("Ora").text) - 1  # 1..24
+    return giorni
 
-            # Estrae la fascia oraria
-            fascia = get_fascia_for_xml(dat_date, festivo, ora)
 
-            # Estrae il prezzo zonale dall'XML in un float
-            prezzo_string = prezzi.find(zone).text
-            prezzo_string = prezzo_string.replace(".", "").replace(",", ".")
-            prezzo_pz = float(prezzo_string) / 1000
+def get_period_means(giorni: Mapping[date, Sequence[float]], inizio: date, fine: date) -> dict[Fascia, float]:
+    """Calcola le medie per fascia dei prezzi di una zona nel periodo indicato (estremi inclusi)."""
+    pz_data = aggregate_prices(
+        {giorno: prezzi for giorno, prezzi in giorni.items() if inizio <= giorno <= fine},
+        fine,
+        fine,
+    )
+    return {
+        fascia: pz_data.mean(fascia)
+        for fascia in (Fascia.MONO, Fascia.F1, Fascia.F2, Fascia.F3, Fascia.F23)
+    }
+
+
+def process_prices(
+    archivio: bytes | IO[bytes] | None,
+    giorni_salvati: Mapping[date, Mapping[str, Sequence[float]]],
+    zones: list[str],
+    date_start: date,
+    date_end: date,
+    oggi: date,
+    fine_media: date,
+    medie: Mapping[str, RunningMeans] | None = None,
+    tariffa: RetailTariff | None = None,
+) -> PricesResult:
+    """Decodifica l'archivio scaricato (se presente) e calcola le medie per fascia.
+
+    L'archivio (in memoria o file già scaricato) viene letto una sola volta
+    estraendo tutte le zone note, un file XML alla volta; le medie sono
+    calcolate per ciascuna delle zone richieste sui giorni da date_start
+    a fine_media.
+    Non accede allo stato dell'integrazione, quindi può essere eseguita
+    in un executor senza bloccare il loop di Home Assistant.
+
+    Se sono indicate le somme progressive di ciascuna zona (medie), una loro
+    copia viene aggiornata con i soli giorni cambiati invece di ricalcolare
+    le medie da zero e restituita nel risultato; le somme ricevute non
+    vengono modificate.
+    Se è indicato il modello del prezzo al dettaglio (tariffa), questo
+    viene applicato alle medie e all'intera curva dei prezzi.
+    Restituisce anche la curva dei prezzi di oggi e domani di ciascuna
+    zona e le statistiche di elaborazione (numero di file, tempi di
+    lettura e di aggregazione in ms, giorni aggiunti e rimossi).
 
-            # Somma i prezzi orari dei diversi file per poter fare la media in seguito
-            if not domani or (mediaMese and oggi.month == dat_date.month):
-                pz_data[Fascia.ORARIA][ora] += prezzo_pz
-            else:
-                pz_data[Fascia.ORARIA_NEXT][ora] = prezzo_pz
-
-            # Aggiunge il prezzo al calcolo delle varie fasce, eccetto quando è il primo giorno del mese successivo al giorno corrente
-            if oggi.month == dat_date.month: pz_data[fascia].append(prezzo_pz)
-    
-    # Divide per il numero di file in cui erano presenti prezzi per completare la media
-    for ora in range(len(pz_data[Fascia.ORARIA])):
-        pz_data[Fascia.ORARIA][ora] /= fileNumber
-
-        if fascia == Fascia.ORARIA:
-            _LOGGER.debug(f'Prezzo {zone} ora {ora}: {pz_data[Fascia.ORARIA][ora]}.')
-    
-    return pz_data
\ No newline at end of file
+    """
+    giorni: Mapping[date, Mapping[str, tuple[float, ...]]] = {}
+    tempi_file: list[float] = []
+    statistiche: dict[str, float] = {"file_zip": 0, "parse_ms": 0.0, "parse_ms_file": 0.0}
+
+    # Estrae i dati di tutte le zone dall'archivio
+    if archivio is not None:
+        giorni = extract_days(archivio, tempi_file)
+        statistiche["file_zip"] = len(tempi_file)
+        statistiche["parse_ms"] = sum(tempi_file)
+        if tempi_file:
+            statistiche["parse_ms_file"] = statistiche["parse_ms"] / len(tempi_file)
+
+    inizio_aggregazione = perf_counter()
+
+    giorni_intervallo = {
+        giorno: prezzi
+        for giorno, prezzi in {**giorni_salvati, **giorni}.items()
+        if date_start <= giorno <= date_end
+    }
+    data: dict[str, PricesData] = {}
+    value: dict[str, Mapping[Fascia, float]] = {}
+    previsioni: dict[str, PriceForecast] = {}
+    dettaglio: dict[str, Mapping[Fascia, float]] = {}
+    previsioni_dettaglio: dict[str, PriceForecast] = {}
+    medie_aggiornate: dict[str, RunningMeans] = {}
+
+    statistiche["giorni_aggiunti"] = 0
+    statistiche["giorni_rimossi"] = 0
+
+    for zone in zones:
+        giorni_zona = {
+            giorno: prezzi[zone]
+            for giorno, prezzi in giorni_intervallo.items()
+            if zone in prezzi
+        }
+
+        if medie is not None:
+            # Aggiorna una copia delle somme progressive con i giorni cambiati
+            fonte = medie_aggiornate[zone] = medie.get(zone, RunningMeans()).copy()
+            data[zone], aggiunti, rimossi = update_running_means(
+                fonte, giorni_zona, oggi, fine_media
+            )
+            statistiche["giorni_aggiunti"] += aggiunti
+            statistiche["giorni_rimossi"] += rimossi
+        else:
+            # Raggruppa per fascia i prezzi dei giorni dell'intervallo
+            data[zone] = aggregate_prices(giorni_zona, oggi, fine_media)
+            fonte = data[zone]
+
+        # Curva dei prezzi di oggi e domani (calcolata una volta per download)
+        previsioni[zone] = build_forecast(giorni_zona, oggi)
+
+        # Per ogni fascia, calcola il valore dei prezzi zonali facendo
+        # la media dei prezzi orari che le compongono
+        value[zone] = MappingProxyType(
+            {
+                fascia: fonte.mean(fascia)
+                for fascia in (Fascia.MONO, Fascia.F1, Fascia.F2, Fascia.F3, Fascia.F23)
+            }
+        )
+
+        if tariffa is not None:
+            # Prezzi al dettaglio (solo per le fasce con dati; le componenti
+            # fisse si applicano anche a un prezzo all'ingrosso nullo)
+            dettaglio[zone] = MappingProxyType(
+                {
+                    fascia: tariffa.apply(valore)
+                    for fascia, valore in value[zone].items()
+                    if fonte.has_prices(fascia)
+                }
+            )
+            previsioni_dettaglio[zone] = build_forecast(giorni_zona, oggi, tariffa)
+
+    statistiche["aggregazione_ms"] = (perf_counter() - inizio_aggregazione) * 1000
+
+    return PricesResult(
+        giorni=MappingProxyType(giorni),
+        data=MappingProxyType(data),
+        value=MappingProxyType(value),
+        statistiche=MappingProxyType(statistiche),
+        previsioni=MappingProxyType(previsioni),
+        dettaglio=MappingProxyType(dettaglio),
+        previsioni_dettaglio=MappingProxyType(previsioni_dettaglio),
+        medie=MappingProxyType(medie_aggiornate),
+    )
@@ -0,0 +1,48 @@
+"""Configurazione comune dei test della logica dei prezzi.
+
+I moduli puri (utils, interfaces, const) vengono importati senza eseguire
+il modulo __init__ dell'integrazione, che richiede Home Assistant.
+"""
+
+from datetime import date
+import importlib
+from pathlib import Path
+import sys
+import types
+
+import pytest
+
+PACKAGE_DIR = Path(__file__).resolve().parent.parent / "custom_components" / "pzo_sensor"
+
+if "pzo_sensor" not in sys.modules:
+    package = types.ModuleType("pzo_sensor")
+    package.__path__ = [str(PACKAGE_DIR)]
+    sys.modules["pzo_sensor"] = package
+    importlib.import_module("pzo_sensor.utils")
+
+
+def _build_xml(giorno: date, prezzi: dict[str, list[float]], quarti: bool = False) -> bytes:
+    """Crea il file XML GME di un giorno con i prezzi (€/MWh) indicati per zona."""
+    data = giorno.strftime("%Y%m%d")
+    periodi = len(next(iter(prezzi.values())))
+    righe = ['<?xml version="1.0" encoding="utf-8"?>\n<NewDataSet>']
+    for p in range(periodi):
+        riga = [f"<Prezzi><Data>{data}</Data><Mercato>MGP</Mercato>"]
+        if quarti:
+            riga.append(f"<Ora>{p // 4 + 1}</Ora><Periodo>{p + 1}</Periodo>")
+        else:
+            riga.append(f"<Ora>{p + 1}</Ora>")
+        riga.extend(
+            f"<{zona}>{f'{valori[p]:.6f}'.replace('.', ',')}</{zona}>"
+            for zona, valori in prezzi.items()
+        )
+        riga.append("</Prezzi>")
+        righe.append("".join(riga))
+    righe.append("</NewDataSet>")
+    return "\n".join(righe).encode()
+
+
+@pytest.fixture
+def build_xml():
+    """Restituisce la funzione che crea il file XML GME di un giorno."""
+    return _build_xml
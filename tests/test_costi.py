@@ -0,0 +1,78 @@
+"""Test del costo dell'energia accumulato per fascia."""
+
+from datetime import date, timedelta
+
+import pytest
+from pzo_sensor.interfaces import GIORNI_STORICO_COSTI, CostAccumulator, Fascia
+
+GIORNO = date(2026, 3, 10)
+
+
+def test_accumulo_per_fascia() -> None:
+    """Il consumo tra due letture viene valorizzato al prezzo del periodo."""
+    costi = CostAccumulator()
+    costi.add(100.0, 0.1, Fascia.F1, GIORNO)
+    costi.add(102.0, 0.1, Fascia.F1, GIORNO)
+    costi.add(103.0, 0.2, Fascia.F3, GIORNO)
+
+    assert costi.energia == pytest.approx(3.0)
+    assert costi.costo == pytest.approx(0.4)
+    assert costi.costo_fasce[Fascia.F1] == pytest.approx(0.2)
+    assert costi.energia_fasce[Fascia.F3] == pytest.approx(1.0)
+    totali = costi.storico[GIORNO]
+    assert totali["costo"] == pytest.approx(0.4)
+    assert totali["energia_f1"] == pytest.approx(2.0)
+    assert totali["costo_f3"] == pytest.approx(0.2)
+
+
+def test_diminuzioni_e_azzeramenti() -> None:
+    """Le piccole diminuzioni spostano solo la lettura; sotto il 90% il contatore è azzerato."""
+    costi = CostAccumulator()
+    costi.add(100.0, 0.1, Fascia.F1, GIORNO)
+    costi.add(99.5, 0.1, Fascia.F1, GIORNO)
+    assert costi.energia == 0
+    costi.add(100.5, 0.1, Fascia.F1, GIORNO)
+    assert costi.energia == pytest.approx(1.0)
+
+    costi.add(2.0, 0.1, Fascia.F1, GIORNO)
+    assert costi.energia == pytest.approx(3.0)
+    assert costi.ultima_lettura == 2.0
+
+
+def test_energia_senza_prezzo() -> None:
+    """L'energia letta senza prezzo non viene mai valorizzata."""
+    costi = CostAccumulator()
+    costi.add(10.0, None, Fascia.F2, GIORNO)
+    costi.add(11.0, None, Fascia.F2, GIORNO)
+    costi.add(12.0, 0.1, Fascia.F2, GIORNO)
+
+    assert costi.energia_senza_prezzo == pytest.approx(1.0)
+    assert costi.energia == pytest.approx(1.0)
+    assert costi.costo == pytest.approx(0.1)
+
+
+def test_storico_e_ripristino() -> None:
+    """Lo storico tiene gli ultimi giorni e sopravvive al salvataggio."""
+    costi = CostAccumulator()
+    costi.add(0.0, 0.1, Fascia.F3, GIORNO)
+    for n in range(GIORNI_STORICO_COSTI + 9):
+        costi.add(float(n + 1), 0.1, Fascia.F3, GIORNO + timedelta(days=n))
+
+    giorni = list(costi.storico)
+    assert len(giorni) == GIORNI_STORICO_COSTI
+    assert giorni == sorted(giorni)
+    assert giorni[-1] == GIORNO + timedelta(days=GIORNI_STORICO_COSTI + 8)
+
+    ripristinato = CostAccumulator.from_dict(costi.as_dict())
+    assert ripristinato.as_dict() == costi.as_dict()
+
+
+def test_ripristino_formato_precedente() -> None:
+    """Gli stati salvati prima dello storico conservano i totali del giorno."""
+    costi = CostAccumulator.from_dict(
+        {"costo": 5.0, "energia": 40.0, "giorno": "2026-03-10", "costo_giorno": 0.3, "energia_giorno": 2.0, "ultima_lettura": 40.0}
+    )
+    assert costi.costo == 5.0
+    assert costi.storico[GIORNO]["costo"] == 0.3
+    assert costi.storico[GIORNO]["energia"] == 2.0
+    assert costi.ultima_lettura == 40.0
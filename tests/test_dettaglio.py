@@ -0,0 +1,55 @@
+"""Test del modello del prezzo al dettaglio."""
+
+from datetime import date, timedelta
+import random
+
+import pytest
+from pzo_sensor.const import CONF_RETAIL_SPREAD, CONF_RETAIL_VAT
+from pzo_sensor.interfaces import Fascia, RetailTariff
+from pzo_sensor.utils import build_forecast, get_retail_tariff, process_prices
+
+TARIFFA = RetailTariff(spread=0.015, fissi=0.04, perdite=10.2, iva=10)
+
+
+@pytest.mark.parametrize("prezzo", [0.0, -0.01, 0.1234, 0.5])
+def test_tariffa_dettaglio(prezzo: float) -> None:
+    """Il modello si applica anche ai prezzi nulli o negativi, singolarmente o sull'intera curva."""
+    atteso = (prezzo * 1.102 + 0.055) * 1.1
+    assert TARIFFA.apply(prezzo) == pytest.approx(atteso, abs=1e-14)
+    assert TARIFFA.apply_all([prezzo, prezzo])[1] == pytest.approx(atteso, abs=1e-14)
+
+
+def test_tariffa_configurata() -> None:
+    """La tariffa esiste solo se almeno un campo è configurato (le opzioni prevalgono)."""
+    assert get_retail_tariff({}, {}) is None
+    assert get_retail_tariff({CONF_RETAIL_VAT: None}, {CONF_RETAIL_SPREAD: 0.01}) is None
+    tariffa = get_retail_tariff({}, {CONF_RETAIL_SPREAD: 0.01})
+    assert tariffa is not None
+    assert tariffa.spread == 0.01
+    assert tariffa.iva == 10
+
+
+def test_curva_dettaglio() -> None:
+    """Con una tariffa la curva è quella dei prezzi al dettaglio, con la stessa classifica."""
+    oggi = date(2026, 6, 1)
+    rng = random.Random(0)
+    giorni = {oggi + timedelta(days=n): [rng.uniform(0.05, 0.2) for _ in range(24)] for n in range(2)}
+    previsioni = build_forecast(giorni, oggi, TARIFFA)
+    ingrosso = build_forecast(giorni, oggi)
+    assert previsioni.prezzi == pytest.approx([TARIFFA.apply(p) for p in ingrosso.prezzi], abs=1e-14)
+    assert previsioni.ranghi == ingrosso.ranghi
+
+
+@pytest.mark.parametrize("tariffa", [None, TARIFFA])
+def test_prezzi_dettaglio_elaborati(tariffa: RetailTariff | None) -> None:
+    """I prezzi al dettaglio sono calcolati solo con una tariffa, anche per medie nulle."""
+    oggi = date(2026, 6, 1)
+    giorni = {oggi - timedelta(days=n): {"NORD": (0.0,) * 24} for n in range(3)}
+    risultato = process_prices(None, giorni, ["NORD"], oggi - timedelta(days=2), oggi + timedelta(days=1), oggi, oggi, tariffa=tariffa)
+
+    if tariffa is None:
+        assert not risultato.dettaglio
+        assert not risultato.previsioni_dettaglio
+    else:
+        assert risultato.dettaglio["NORD"][Fascia.F1] == pytest.approx(TARIFFA.apply(0.0))
+        assert risultato.previsioni_dettaglio["NORD"].prezzi[0] == pytest.approx(TARIFFA.apply(0.0))
@@ -0,0 +1,54 @@
+"""Test del calendario delle fasce orarie."""
+
+from datetime import date, datetime
+
+import pytest
+from pzo_sensor.interfaces import Fascia
+from pzo_sensor.utils import get_fascia, is_festivo, time_zone
+
+
+def _ora(anno: int, mese: int, giorno: int, ora: int, minuto: int = 0) -> datetime:
+    return datetime(anno, mese, giorno, ora, minuto, tzinfo=time_zone)
+
+
+@pytest.mark.parametrize(
+    ("dataora", "fascia", "prossima"),
+    [
+        # Martedì feriale
+        (_ora(2026, 3, 10, 2), Fascia.F3, _ora(2026, 3, 10, 7)),
+        (_ora(2026, 3, 10, 7, 30), Fascia.F2, _ora(2026, 3, 10, 8)),
+        (_ora(2026, 3, 10, 12), Fascia.F1, _ora(2026, 3, 10, 19)),
+        (_ora(2026, 3, 10, 20), Fascia.F2, _ora(2026, 3, 10, 23)),
+        # Sabato e domenica
+        (_ora(2026, 3, 14, 10), Fascia.F2, _ora(2026, 3, 14, 23)),
+        (_ora(2026, 3, 15, 10), Fascia.F3, _ora(2026, 3, 16, 7)),
+    ],
+)
+def test_fascia_tri_orario(dataora: datetime, fascia: Fascia, prossima: datetime) -> None:
+    """Fasce e prossimo cambio del contratto tri-orario."""
+    assert get_fascia(dataora, 3) == (fascia, prossima)
+
+
+@pytest.mark.parametrize(
+    ("dataora", "fascia", "prossima"),
+    [
+        # Le notti feriali passano a F1 alle 8 dello stesso giorno (non alle 7)
+        (_ora(2026, 3, 10, 2), Fascia.F23, _ora(2026, 3, 10, 8)),
+        (_ora(2026, 3, 10, 7, 30), Fascia.F23, _ora(2026, 3, 10, 8)),
+        (_ora(2026, 3, 10, 12), Fascia.F1, _ora(2026, 3, 10, 19)),
+        (_ora(2026, 3, 10, 20), Fascia.F23, _ora(2026, 3, 11, 8)),
+        # Il fine settimana è un'unica F23 fino a lunedì alle 8
+        (_ora(2026, 3, 14, 10), Fascia.F23, _ora(2026, 3, 16, 8)),
+    ],
+)
+def test_fascia_bi_orario(dataora: datetime, fascia: Fascia, prossima: datetime) -> None:
+    """Nel bi-orario tutto ciò che non è F1 è F23."""
+    assert get_fascia(dataora, 2) == (fascia, prossima)
+
+
+@pytest.mark.parametrize("ora", [3, 10, 22])
+def test_sabato_festivo(ora: int) -> None:
+    """Un sabato festivo (25 aprile 2026) è F3 per tutto il giorno."""
+    assert is_festivo(date(2026, 4, 25))
+    assert get_fascia(_ora(2026, 4, 25, ora), 3) == (Fascia.F3, _ora(2026, 4, 27, 7))
+    assert get_fascia(_ora(2026, 4, 25, ora), 2) == (Fascia.F23, _ora(2026, 4, 27, 8))
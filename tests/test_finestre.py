@@ -0,0 +1,34 @@
+"""Test delle finestre di calcolo delle medie."""
+
+from datetime import date
+
+import pytest
+from pzo_sensor.const import (
+    WINDOW_BILLING,
+    WINDOW_DAY,
+    WINDOW_MONTH,
+    WINDOW_ROLLING,
+    WINDOW_WEEK,
+)
+from pzo_sensor.utils import get_window
+
+
+@pytest.mark.parametrize(
+    ("tipo", "oggi", "argomenti", "finestra"),
+    [
+        # Nei primi giorni del mese include i PAD_DAYS giorni precedenti
+        (WINDOW_MONTH, date(2026, 3, 2), {}, (date(2026, 2, 26), date(2026, 3, 3))),
+        (WINDOW_MONTH, date(2026, 3, 2), {"actual_data_only": True}, (date(2026, 3, 1), date(2026, 3, 3))),
+        (WINDOW_MONTH, date(2026, 3, 10), {}, (date(2026, 3, 1), date(2026, 3, 11))),
+        (WINDOW_DAY, date(2026, 3, 10), {}, (date(2026, 3, 10), date(2026, 3, 10))),
+        (WINDOW_ROLLING, date(2026, 3, 12), {"giorni": 7}, (date(2026, 3, 6), date(2026, 3, 12))),
+        (WINDOW_WEEK, date(2026, 3, 12), {}, (date(2026, 3, 9), date(2026, 3, 13))),
+        (WINDOW_WEEK, date(2026, 3, 9), {}, (date(2026, 3, 6), date(2026, 3, 10))),
+        # Ciclo dal 31: a febbraio inizia l'ultimo giorno del mese
+        (WINDOW_BILLING, date(2026, 3, 10), {"giorno_fatturazione": 31}, (date(2026, 2, 28), date(2026, 3, 11))),
+        (WINDOW_BILLING, date(2026, 3, 20), {"giorno_fatturazione": 15}, (date(2026, 3, 15), date(2026, 3, 21))),
+    ],
+)
+def test_get_window(tipo: str, oggi: date, argomenti: dict, finestra: tuple[date, date]) -> None:
+    """Primo e ultimo giorno delle finestre di calcolo (mai oltre domani)."""
+    assert get_window(tipo, oggi, **argomenti) == finestra
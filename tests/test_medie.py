@@ -0,0 +1,115 @@
+"""Test delle medie per fascia calcolate da zero e con le somme progressive."""
+
+from datetime import date, datetime, time, timedelta, timezone
+import random
+
+import pytest
+from pzo_sensor.interfaces import Fascia, RunningMeans
+from pzo_sensor.utils import (
+    aggregate_prices,
+    process_prices,
+    time_zone,
+    update_running_means,
+)
+
+FASCE = (Fascia.MONO, Fascia.F1, Fascia.F2, Fascia.F3, Fascia.F23)
+
+
+def _ore_giorno(giorno: date) -> int:
+    """Numero di ore del giorno (23 o 25 nei giorni del cambio d'ora)."""
+    inizio = datetime.combine(giorno, time(0), tzinfo=time_zone)
+    fine = datetime.combine(giorno + timedelta(days=1), time(0), tzinfo=time_zone)
+    return int((fine.astimezone(timezone.utc) - inizio.astimezone(timezone.utc)).total_seconds()) // 3600
+
+
+def _giorni(inizio: date, numero: int, quarti_da: date | None = None, seed: int = 0) -> dict[date, list[float]]:
+    """Prezzi casuali di più giorni, con 23/25 periodi nei giorni del cambio d'ora."""
+    rng = random.Random(seed)
+    giorni = {}
+    for n in range(numero):
+        giorno = inizio + timedelta(days=n)
+        periodi_ora = 4 if quarti_da is not None and giorno >= quarti_da else 1
+        ore = _ore_giorno(giorno)
+        giorni[giorno] = [rng.uniform(0.05, 0.2) for _ in range(ore * periodi_ora)]
+    return giorni
+
+
+def test_periodi_cambio_ora() -> None:
+    """I giorni del cambio d'ora hanno 23 e 25 ore."""
+    giorni = _giorni(date(2025, 3, 29), 2) | _giorni(date(2025, 10, 25), 3)
+    assert len(giorni[date(2025, 3, 30)]) == 23
+    assert len(giorni[date(2025, 10, 26)]) == 25
+    assert len(giorni[date(2025, 10, 27)]) == 24
+
+
+@pytest.mark.parametrize(
+    ("inizio", "quarti_da"),
+    [
+        (date(2025, 3, 20), None),
+        (date(2025, 10, 15), date(2025, 10, 20)),
+    ],
+)
+def test_medie_progressive(inizio: date, quarti_da: date | None) -> None:
+    """Le somme progressive danno le stesse medie del calcolo completo.
+
+    La finestra scorre di un giorno alla volta attraverso il cambio d'ora
+    (e, nel secondo caso, il passaggio ai prezzi al quarto d'ora).
+    """
+    giorni = _giorni(inizio, 20, quarti_da)
+    medie = RunningMeans()
+
+    for n in range(7, 19):
+        oggi = inizio + timedelta(days=n)
+        finestra = {g: p for g, p in giorni.items() if oggi - timedelta(days=6) <= g <= oggi + timedelta(days=1)}
+        progressive, aggiunti, rimossi = update_running_means(medie, finestra, oggi, oggi)
+        complete = aggregate_prices(finestra, oggi, oggi)
+
+        assert (aggiunti, rimossi) == ((7, 0) if n == 7 else (1, 1))
+        assert list(progressive.orario) == pytest.approx(list(complete.orario), abs=1e-12)
+        assert list(progressive.domani) == pytest.approx(list(complete.domani), abs=1e-12)
+        for fascia in FASCE:
+            assert medie.mean(fascia) == pytest.approx(complete.mean(fascia), abs=1e-12)
+            assert medie.has_prices(fascia) == complete.has_prices(fascia)
+
+
+def test_prezzi_corretti() -> None:
+    """Un giorno con prezzi diversi da quelli già sommati viene sostituito."""
+    oggi = date(2025, 5, 10)
+    giorni = _giorni(oggi - timedelta(days=4), 5)
+    medie = RunningMeans()
+    update_running_means(medie, giorni, oggi, oggi)
+
+    giorni[oggi] = [prezzo + 0.01 for prezzo in giorni[oggi]]
+    _, aggiunti, rimossi = update_running_means(medie, giorni, oggi, oggi)
+
+    assert (aggiunti, rimossi) == (1, 1)
+    for fascia in FASCE:
+        assert medie.mean(fascia) == pytest.approx(aggregate_prices(giorni, oggi, oggi).mean(fascia), abs=1e-12)
+
+
+def test_medie_vuote() -> None:
+    """Senza giorni non ci sono prezzi per nessuna fascia."""
+    medie = RunningMeans()
+    pz_data, _, _ = update_running_means(medie, {}, date(2025, 5, 10), date(2025, 5, 10))
+    assert not any(medie.has_prices(fascia) for fascia in FASCE)
+    assert not any(aggregate_prices({}, date(2025, 5, 10), date(2025, 5, 10)).has_prices(fascia) for fascia in FASCE)
+    assert sum(pz_data.orario) == 0
+
+
+def test_elaborazione_senza_effetti() -> None:
+    """process_prices aggiorna una copia delle somme e la restituisce nel risultato."""
+    oggi = date(2025, 5, 10)
+    giorni = {giorno: {"NORD": tuple(prezzi)} for giorno, prezzi in _giorni(oggi - timedelta(days=6), 8).items()}
+    medie = {"NORD": RunningMeans()}
+
+    risultato = process_prices(None, giorni, ["NORD"], oggi - timedelta(days=6), oggi + timedelta(days=1), oggi, oggi, medie)
+    assert not medie["NORD"].giorni
+    assert len(risultato.medie["NORD"].giorni) == 7
+    assert risultato.statistiche["giorni_aggiunti"] == 7
+
+    # Con le somme restituite non ci sono giorni da aggiungere o togliere
+    successivo = process_prices(
+        None, giorni, ["NORD"], oggi - timedelta(days=6), oggi + timedelta(days=1), oggi, oggi, dict(risultato.medie)
+    )
+    assert successivo.statistiche["giorni_aggiunti"] == successivo.statistiche["giorni_rimossi"] == 0
+    assert successivo.value["NORD"] == risultato.value["NORD"]
@@ -0,0 +1,49 @@
+"""Test della corrispondenza tra periodi di mercato e istanti UTC."""
+
+from datetime import date, datetime, timedelta, timezone
+
+import pytest
+from pzo_sensor.utils import build_forecast, get_periodi_giorno
+
+
+@pytest.mark.parametrize(
+    ("giorno", "numero_periodi", "durata"),
+    [
+        (date(2026, 6, 1), 24, 60),
+        (date(2026, 3, 29), 23, 60),
+        (date(2026, 10, 25), 25, 60),
+        (date(2026, 3, 29), 92, 15),
+        (date(2026, 10, 25), 100, 15),
+    ],
+)
+def test_periodi_consecutivi(giorno: date, numero_periodi: int, durata: int) -> None:
+    """I periodi sono consecutivi dalla mezzanotte italiana e coprono tutto il giorno."""
+    istanti, slot = get_periodi_giorno(giorno, numero_periodi)
+
+    assert len(istanti) == len(slot) == numero_periodi
+    assert all(b - a == timedelta(minutes=durata) for a, b in zip(istanti, istanti[1:], strict=False))
+    fine_giorno = get_periodi_giorno(giorno + timedelta(days=1), 24)[0][0]
+    assert istanti[-1] + timedelta(minutes=durata) == fine_giorno
+
+
+def test_ora_ripetuta() -> None:
+    """Nel giorno di 25 ore le due 02:00 sono periodi distinti con la stessa posizione nel giorno."""
+    giorno = date(2026, 10, 25)
+    istanti, slot = get_periodi_giorno(giorno, 25)
+    assert list(slot[:5]) == [0, 1, 2, 2, 3]
+    assert istanti[2].astimezone(timezone.utc).hour == 0
+    assert istanti[3].astimezone(timezone.utc).hour == 1
+
+    # Il prezzo corrente è quello del periodo, non la media delle due 02:00
+    previsioni = build_forecast({giorno: [float(p) for p in range(25)]}, giorno)
+    for periodo in (2, 3):
+        istante = datetime(2026, 10, 25, periodo - 2, 30, tzinfo=timezone.utc).timestamp()
+        assert previsioni.price_at(istante) == periodo
+        assert previsioni.hour_price_at(istante) == periodo
+
+
+def test_ora_saltata() -> None:
+    """Nel giorno di 23 ore manca la posizione delle 02:00."""
+    _, slot = get_periodi_giorno(date(2026, 3, 29), 92)
+    assert 8 not in slot
+    assert list(slot[4:12]) == [4, 5, 6, 7, 12, 13, 14, 15]
@@ -0,0 +1,141 @@
+"""Test della curva dei prezzi e della ricerca dei periodi più economici."""
+
+from datetime import date, datetime, timedelta
+import random
+
+import pytest
+from pzo_sensor.utils import (
+    build_forecast,
+    day_ranks,
+    find_cheapest_window,
+    is_among_cheapest,
+    rank_percentile,
+    time_zone,
+)
+
+
+def _curva(giorno: date, ore: tuple[int, ...], quarti: tuple[bool, ...] | None = None, seed: int = 0):
+    """Prezzi casuali dei giorni consecutivi indicati (ore e risoluzione di ciascuno)."""
+    rng = random.Random(seed)
+    quarti = quarti or (False,) * len(ore)
+    return {
+        giorno + timedelta(days=n): [rng.uniform(0.05, 0.2) for _ in range(numero * (4 if q else 1))]
+        for n, (numero, q) in enumerate(zip(ore, quarti, strict=True))
+    }
+
+
+@pytest.mark.parametrize(
+    ("oggi", "ore", "quarti"),
+    [
+        (date(2026, 3, 29), (23, 24), (False, False)),
+        (date(2026, 10, 24), (24, 25), (False, True)),
+        (date(2026, 10, 25), (25, 24), (True, False)),
+    ],
+)
+def test_curva_cambio_ora(oggi: date, ore: tuple[int, int], quarti: tuple[bool, bool]) -> None:
+    """Nei giorni del cambio d'ora la curva copre esattamente le ore reali."""
+    giorni = _curva(oggi, ore, quarti)
+    previsioni = build_forecast(giorni, oggi)
+
+    inizio = datetime(oggi.year, oggi.month, oggi.day, tzinfo=time_zone).timestamp()
+    assert previsioni.istanti[0] == inizio
+    assert previsioni.fine - inizio == sum(ore) * 3600
+    assert list(previsioni.prezzi) == [prezzo for prezzi in giorni.values() for prezzo in prezzi]
+    assert len(previsioni.quarti) == sum(ore) * 4
+    assert previsioni.somme[-1] == pytest.approx(sum(previsioni.quarti))
+
+    # Ogni istante del periodo restituisce il prezzo del periodo
+    fine_periodi = (*previsioni.istanti[1:], previsioni.fine)
+    for inizio_periodo, fine_periodo, prezzo in zip(previsioni.istanti, fine_periodi, previsioni.prezzi, strict=True):
+        assert previsioni.price_at(inizio_periodo) == prezzo
+        assert previsioni.price_at(fine_periodo - 1) == prezzo
+
+    assert previsioni.price_at(previsioni.fine) is None
+    assert previsioni.price_at(inizio - 1) is None
+
+
+def test_curva_senza_domani() -> None:
+    """Senza i prezzi di domani la curva contiene solo oggi."""
+    oggi = date(2026, 6, 1)
+    previsioni = build_forecast(_curva(oggi, (24,)), oggi)
+    assert len(previsioni.prezzi) == 24
+    assert build_forecast({}, oggi).istanti == ()
+
+
+@pytest.mark.parametrize(
+    ("oggi", "ore", "quarti"),
+    [
+        (date(2026, 3, 29), (23, 24), (False, True)),
+        (date(2026, 10, 25), (25, 24), (True, False)),
+    ],
+)
+def test_classifica_cambio_ora(oggi: date, ore: tuple[int, int], quarti: tuple[bool, bool]) -> None:
+    """La posizione di ogni quarto d'ora è quella del suo periodo nella classifica del giorno."""
+    giorni = _curva(oggi, ore, quarti)
+    previsioni = build_forecast(giorni, oggi)
+
+    inizio = previsioni.istanti[0]
+    for indice, prezzo in enumerate(previsioni.quarti):
+        istante = inizio + indice * 900
+        rango, periodi = previsioni.rank_at(istante)
+        prezzi_giorno = giorni[datetime.fromtimestamp(istante, tz=time_zone).date()]
+        assert periodi == len(prezzi_giorno)
+        assert sorted(prezzi_giorno)[rango] == prezzo
+
+    assert previsioni.rank_at(inizio - 1) is None
+    assert previsioni.rank_at(previsioni.fine) is None
+
+
+def test_classifica_giorno() -> None:
+    """A parità di prezzo precede il periodo più vicino all'inizio del giorno."""
+    assert list(day_ranks([0.3, 0.1, 0.2, 0.1])) == [3, 0, 2, 1]
+    assert rank_percentile(0, 24) == 0
+    assert rank_percentile(23, 24) == 100
+    assert rank_percentile(0, 1) == 0
+    assert is_among_cheapest(2, 24, 3)
+    assert not is_among_cheapest(3, 24, 3)
+    assert is_among_cheapest(11, 96, 3)
+    assert not is_among_cheapest(12, 96, 3)
+
+
+def _migliore_contigua(quarti, primo: int, ultimo: int, numero: int) -> tuple[int, float]:
+    """Ricerca esaustiva della finestra contigua con la somma minima."""
+    return min(
+        ((i, sum(quarti[i : i + numero])) for i in range(primo, ultimo - numero + 1)),
+        key=lambda voce: voce[1],
+    )
+
+
+@pytest.mark.parametrize(
+    ("oggi", "ore", "quarti"),
+    [
+        (date(2026, 3, 29), (23, 24), (False, True)),
+        (date(2026, 10, 25), (25, 24), (True, True)),
+    ],
+)
+@pytest.mark.parametrize("numero", [1, 3, 8, 17])
+def test_finestra_piu_economica(oggi: date, ore: tuple[int, int], quarti: tuple[bool, bool], numero: int) -> None:
+    """La finestra trovata coincide con la ricerca esaustiva, anche a cavallo del cambio d'ora."""
+    previsioni = build_forecast(_curva(oggi, ore, quarti, seed=numero), oggi)
+    quarti_curva = previsioni.quarti
+    origine = previsioni.istanti[0]
+
+    for primo, ultimo in ((0, len(quarti_curva)), (5, 60), (90, 150)):
+        finestra = find_cheapest_window(previsioni, primo, ultimo, numero, contigua=True)
+        migliore, totale = _migliore_contigua(quarti_curva, primo, ultimo, numero)
+        assert finestra.prezzo_medio == pytest.approx(totale / numero, abs=1e-12)
+        assert finestra.inizio.timestamp() == origine + migliore * 900
+        assert finestra.fine.timestamp() - finestra.inizio.timestamp() == numero * 900
+
+        sparsa = find_cheapest_window(previsioni, primo, ultimo, numero, contigua=False)
+        assert sparsa.prezzo_medio == pytest.approx(sum(sorted(quarti_curva[primo:ultimo])[:numero]) / numero, abs=1e-12)
+        assert sum(fine.timestamp() - inizio.timestamp() for inizio, fine in sparsa.intervalli) == numero * 900
+        assert sparsa.prezzo_medio <= finestra.prezzo_medio + 1e-12
+
+
+def test_finestra_troppo_lunga() -> None:
+    """Se l'intervallo è più breve della durata richiesta non c'è risultato."""
+    oggi = date(2026, 6, 1)
+    previsioni = build_forecast(_curva(oggi, (24,)), oggi)
+    assert find_cheapest_window(previsioni, 90, 96, 8) is None
+    assert find_cheapest_window(previsioni, 0, 96, 0) is None
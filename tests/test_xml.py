@@ -0,0 +1,74 @@
+"""Test della lettura dei file XML e degli archivi ZIP del GME."""
+
+from datetime import date
+import io
+import random
+from zipfile import ZipFile
+
+import pytest
+from pzo_sensor.utils import (
+    extract_days,
+    parse_xml_archive,
+    parse_xml_stream,
+    parse_xml_tree,
+)
+
+ZONE = ["PUN", "NORD", "SICI"]
+
+
+def _prezzi(periodi: int, seed: int = 0) -> dict[str, list[float]]:
+    """Prezzi casuali (€/MWh, 6 decimali) per ciascuna zona."""
+    rng = random.Random(seed)
+    return {zona: [round(rng.uniform(-10, 300), 6) for _ in range(periodi)] for zona in ZONE}
+
+
+@pytest.mark.parametrize(
+    ("giorno", "periodi", "quarti"),
+    [
+        (date(2026, 6, 1), 24, False),
+        (date(2026, 6, 2), 96, True),
+        (date(2026, 3, 29), 23, False),
+        (date(2026, 10, 25), 100, True),
+    ],
+)
+def test_parser_streaming(build_xml, giorno: date, periodi: int, quarti: bool) -> None:
+    """Il parser a passaggio unico legge gli stessi prezzi dell'albero completo."""
+    prezzi = _prezzi(periodi)
+    xml = build_xml(giorno, prezzi, quarti)
+
+    risultato = parse_xml_stream(io.BytesIO(xml), ["NORD", "SICI", "XXXX"])
+    assert risultato == parse_xml_tree(io.BytesIO(xml), ["NORD", "SICI", "XXXX"])
+
+    dat_date, prezzi_giorno = risultato
+    assert dat_date == giorno
+    assert set(prezzi_giorno) == {"NORD", "SICI"}
+    assert prezzi_giorno["NORD"] == pytest.approx([p / 1000 for p in prezzi["NORD"]], abs=1e-12)
+
+
+def test_parser_zone_assenti(build_xml) -> None:
+    """Senza le zone richieste il file non è valido."""
+    xml = build_xml(date(2026, 6, 1), _prezzi(24))
+    assert parse_xml_stream(io.BytesIO(xml), ["CALA"]) is None
+    assert parse_xml_tree(io.BytesIO(xml), ["CALA"]) is None
+
+
+def test_archivio(build_xml) -> None:
+    """Gli archivi vengono letti per giorno, ignorando i file non validi."""
+    giorni = {date(2026, 3, 28): 24, date(2026, 3, 29): 23, date(2026, 3, 30): 96}
+    contenuto = io.BytesIO()
+    with ZipFile(contenuto, "w") as archivio:
+        for giorno, periodi in giorni.items():
+            archivio.writestr(
+                f"{giorno:%Y%m%d}MGPPrezzi.xml",
+                build_xml(giorno, _prezzi(periodi, giorno.day), periodi > 25),
+            )
+        archivio.writestr("20260331MGPPrezzi.xml", b"<NewDataSet><Prezzi>")
+
+    with ZipFile(contenuto) as archivio:
+        assert parse_xml_archive(archivio, ["PUN"]) == parse_xml_archive(archivio, ["PUN"], streaming=False)
+
+    estratti = extract_days(contenuto.getvalue())
+    assert {giorno: len(prezzi["NORD"]) for giorno, prezzi in estratti.items()} == giorni
+    assert estratti[date(2026, 3, 29)]["SICI"] == pytest.approx(
+        [p / 1000 for p in _prezzi(23, 29)["SICI"]], abs=1e-12
+    )